@@ -0,0 +1,6 @@
+"""
+Benchmarks for the contacts and users APIs.
+
+Run them from the project directory, e.g. ``python -m benchmarks.run`` or
+``python benchmarks/sqlite_concurrency.py``.
+"""
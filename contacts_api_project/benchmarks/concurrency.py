@@ -0,0 +1,173 @@
+"""
+Concurrent-connection throughput of the contact list under WSGI and ASGI.
+
+Opens ``--connections`` keep-alive HTTP/1.1 connections at once and has each
+one request a page of contacts, wait ``--think-ms`` and repeat for
+``--seconds``. Targets:
+
+* ``wsgi``: Django's threaded WSGI server, ``/contacts/api/``.
+* ``asgi``: uvicorn, the same synchronous view (``/contacts/api/``).
+* ``asgi-async``: uvicorn, the async view (``/contacts/api/async/``).
+
+The ASGI targets need uvicorn. The response cache is disabled unless
+``--cache`` is given, so every request reaches the database::
+
+    python -m benchmarks.concurrency --connections 10 100 500 --think-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import django
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
+    # Tokens must outlive the run.
+    os.environ.setdefault('JWT_ACCESS_TOKEN_MINUTES', '600')
+    django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from users.authentication import ClaimsRefreshToken  # noqa: E402
+
+from .run import percentile  # noqa: E402
+from .transports import ASGITransport, WSGITransport  # noqa: E402
+
+TARGETS = {
+    'wsgi': (WSGITransport, 'contact-api-list'),
+    'asgi': (ASGITransport, 'contact-api-list'),
+    'asgi-async': (ASGITransport, 'contact-async-list'),
+}
+
+
+async def _read_response(reader):
+    """Read one response; returns ``(status, keep_alive)``."""
+
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _connection(port, request, deadline, think, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        started = time.perf_counter()
+        try:
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(1)
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            writer = None
+        if think:
+            await asyncio.sleep(think)
+    if writer is not None:
+        writer.close()
+
+
+async def _load(port, requests, seconds, think):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(
+        _connection(port, request, deadline, think, latencies, errors) for request in requests
+    ))
+    return latencies, len(errors), time.perf_counter() - started
+
+
+def measure(target, tokens, connections, seconds, think_ms=0, page_size=50):
+    """Summary of ``connections`` concurrent clients against ``target`` for ``seconds``, or ``None``."""
+
+    transport_class, url_name = TARGETS[target]
+    if not transport_class.available():
+        return None
+    path = f'{reverse(url_name)}?page_size={page_size}'
+    requests = [
+        (
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            f'Authorization: Bearer {tokens[index % len(tokens)]}\r\n\r\n'
+        ).encode('ascii')
+        for index in range(connections)
+    ]
+    transport = transport_class()
+    transport.start()
+    try:
+        latencies, errors, elapsed = asyncio.run(_load(transport.port, requests, seconds, think_ms / 1000))
+    finally:
+        transport.stop()
+    ordered = sorted(latencies) or [0.0]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 1),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 1),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 1),
+    }
+
+
+def main():
+    from .datagen import generate, scratch_database
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--contacts', type=int, default=200, help='contacts per user')
+    parser.add_argument('--connections', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--think-ms', type=float, default=0, help='pause between requests on a connection')
+    parser.add_argument('--target', action='append', choices=list(TARGETS), help='repeatable; default: all')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.cache:
+        settings.CONTACTS_RESPONSE_CACHE_TIMEOUT = 0
+    with scratch_database():
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, '127.0.0.1']
+        users = generate(users=args.users, contacts_per_user=args.contacts, seed=args.seed)
+        tokens = [str(ClaimsRefreshToken.for_user(user).access_token) for user in users]
+        print(f'{"target":<12}{"conns":>7}{"requests":>10}{"errors":>8}{"req/s":>10}'
+              f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for target in args.target or list(TARGETS):
+            for connections in args.connections:
+                row = measure(target, tokens, connections, args.seconds, args.think_ms)
+                if row is None:
+                    print(f'Skipping {target}: uvicorn is not installed.')
+                    break
+                print(
+                    f'{target:<12}{connections:>7}{row["requests"]:>10}{row["errors"]:>8}'
+                    f'{row["throughput_rps"]:>10.1f}{row["p50_ms"]:>10.1f}{row["p95_ms"]:>10.1f}{row["p99_ms"]:>10.1f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
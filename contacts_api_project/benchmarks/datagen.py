@@ -0,0 +1,95 @@
+"""
+Synthetic users and contacts for benchmarks.
+
+``generate`` creates ``users`` confirmed accounts (all sharing one password)
+with ``contacts_per_user`` contacts each. Names, emails, phone numbers and
+addresses are drawn from a seeded generator, so the same arguments always
+produce the same data set.
+"""
+
+import os
+import random
+import tempfile
+import unicodedata
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from contacts.models import Contact
+from contacts.sharding import db_for_user
+
+FIRST_NAMES = [
+    'Ada', 'Alan', 'Amara', 'Ana', 'Arjun', 'Beatriz', 'Bob', 'Carlos', 'Chen', 'Chloé', 'Dmitri', 'Elena',
+    'Emma', 'Fatima', 'François', 'Grace', 'Hana', 'Hiroshi', 'Ingrid', 'Ivan', 'James', 'Jose', 'Joan',
+    'Kwame', 'Lars', 'Leila', 'Liam', 'Lucía', 'Mei', 'Mohammed', 'Nia', 'Noah', 'Olga', 'Omar', 'Priya',
+    'Rafael', 'Sakura', 'Sofia', 'Søren', 'Tariq', 'Thandiwe', 'Tomás', 'Uma', 'Wei', 'Yusuf', 'Zoë',
+]
+LAST_NAMES = [
+    'Abara', 'Andersen', 'Bauer', 'Chen', 'Costa', 'Dubois', 'Fernández', 'García', 'Hansen', 'Ivanova',
+    'Johnson', 'Kim', 'Kowalski', 'Lopez', 'Mensah', 'Müller', 'Nakamura', 'Nguyen', "O'Brien", 'Okafor',
+    'Patel', 'Rossi', 'Santos', 'Schmidt', 'Silva', 'Smith', 'Suzuki', 'Tanaka', 'Van der Berg', 'Wang',
+    'Williams', 'Yilmaz', 'Zhang',
+]
+DOMAINS = ['example.com', 'example.org', 'mail.example.net', 'corp.example.com']
+STREETS = ['Main St', 'Oak Ave', 'Elm St', 'Maple Rd', 'High St', 'Station Rd', 'Park Lane', 'Rue de la Paix']
+CITIES = ['Springfield', 'Riverside', 'Lisbon', 'Osaka', 'Accra', 'Hamburg', 'Toronto', 'Lyon']
+PHONE_FORMATS = ['{a}-{b}-{c}', '({a}) {b}-{c}', '+1 {a} {b} {c}', '{a}.{b}.{c}', '+44 {a} {b}{c}']
+
+BENCHMARK_PASSWORD = 'bench-password-1'
+
+
+def _ascii(value):
+    value = unicodedata.normalize('NFKD', value.replace('ø', 'o')).encode('ascii', 'ignore').decode()
+    return ''.join(char for char in value.lower() if char.isalnum())
+
+
+def fake_contact(rng):
+    """Field values for one realistic contact."""
+
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    phone = rng.choice(PHONE_FORMATS).format(
+        a=rng.randint(200, 999), b=rng.randint(100, 999), c=rng.randint(1000, 9999),
+    )
+    return {
+        'name': f'{first} {last}',
+        'email': f'{_ascii(first)}.{_ascii(last)}{rng.randint(1, 999)}@{rng.choice(DOMAINS)}' if rng.random() < 0.9 else None,
+        'phone': phone if rng.random() < 0.8 else None,
+        'address': f'{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}' if rng.random() < 0.5 else None,
+    }
+
+
+def generate(users=10, contacts_per_user=200, seed=0, prefix='bench', batch_size=1000):
+    """Create the data set; returns the created users."""
+
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    User = get_user_model()
+    usernames = [f'{prefix}{index}' for index in range(users)]
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', password=password, email_confirmed=True)
+        for username in usernames
+    ])
+    created = list(User.objects.filter(username__in=usernames).order_by('pk'))
+    for user in created:
+        contacts = [Contact(user_id=user.pk, **fake_contact(rng)) for _ in range(contacts_per_user)]
+        Contact.objects.db_manager(db_for_user(user.pk)).bulk_create(contacts, batch_size=batch_size)
+    return created
+
+
+@contextmanager
+def scratch_database():
+    """Run the block against a throwaway SQLite test database; the configured one is never touched."""
+
+    setup_test_environment(debug=False)
+    directory = tempfile.TemporaryDirectory()
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory.name, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        directory.cleanup()
+        teardown_test_environment()
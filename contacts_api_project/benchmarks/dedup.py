@@ -0,0 +1,64 @@
+"""
+Time duplicate detection over one large address book.
+
+Generates ``--contacts`` synthetic contacts for one user, re-adds every
+``--every``-th one with its name in capitals (as a second import of the same
+address book would), then times ``duplicate_groups`` from the database read
+to the finished groups::
+
+    python -m benchmarks.dedup --contacts 500000
+"""
+
+import argparse
+import os
+import time
+
+import django
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
+    django.setup()
+
+from django.core.cache import cache  # noqa: E402
+
+from contacts.dedup import duplicate_groups  # noqa: E402
+from contacts.models import Contact  # noqa: E402
+
+
+def add_duplicates(user_id, every, batch_size=1000):
+    """Copy every ``every``-th contact of ``user_id``; returns how many were added."""
+
+    copies = [
+        Contact(user_id=user_id, name=name.upper(), email=email, phone=phone, address=address)
+        for index, (name, email, phone, address) in enumerate(
+            Contact.objects.for_user(user_id).order_by('id').values_list('name', 'email', 'phone', 'address')
+        )
+        if index % every == 0
+    ]
+    Contact.objects.for_user(user_id).bulk_create(copies, batch_size=batch_size)
+    return len(copies)
+
+
+def main():
+    from .datagen import generate, scratch_database
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--every', type=int, default=50, help='duplicate every Nth contact')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with scratch_database():
+        user = generate(users=1, contacts_per_user=args.contacts, seed=args.seed)[0]
+        added = add_duplicates(user.pk, args.every)
+        cache.clear()
+        started = time.perf_counter()
+        groups = duplicate_groups(user.pk)
+        elapsed = time.perf_counter() - started
+
+    print(f'{args.contacts + added} contacts ({added} planted duplicates)')
+    print(f'{len(groups)} groups covering {sum(len(group["ids"]) for group in groups)} contacts in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
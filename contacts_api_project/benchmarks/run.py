@@ -0,0 +1,245 @@
+"""
+Benchmark and load test for the contacts and users APIs.
+
+Creates a scratch database (the configured one is never touched), fills it
+with synthetic users and contacts, then runs each scenario through each
+transport with ``--concurrency`` client threads. Reports p50/p95/p99
+latency and throughput, optionally writes them to JSON and compares them
+with an earlier run::
+
+    python -m benchmarks.run --users 20 --contacts 500 --output before.json
+    git checkout my-branch
+    python -m benchmarks.run --users 20 --contacts 500 --compare before.json
+
+``--compare`` exits with status 1 when a scenario's p95 latency grew, or its
+throughput fell, by more than ``--max-regression``.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import django
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
+    # Tokens must outlive the run.
+    os.environ.setdefault('JWT_ACCESS_TOKEN_MINUTES', '600')
+    django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+
+from .scenarios import SCENARIOS, Worker  # noqa: E402
+from .transports import TRANSPORTS  # noqa: E402
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def run_scenario(transport, scenario, users, iterations, concurrency=1, seed=0):
+    """Run ``scenario`` with ``concurrency`` workers; returns its summary."""
+
+    workers = [Worker(index, users[index % len(users)], seed) for index in range(concurrency)]
+    samples = [[] for _ in workers]
+    errors = [0] * len(workers)
+    failures = []
+    ready = threading.Barrier(len(workers) + 1) if concurrency > 1 else None
+
+    def work(worker):
+        session = transport.session()
+        try:
+            scenario.prepare(session, worker)
+        finally:
+            if ready is not None:
+                ready.wait()
+        try:
+            for iteration in range(scenario.iterations(iterations)):
+                started = time.perf_counter()
+                status = scenario.step(session, worker, iteration)
+                samples[worker.index].append(time.perf_counter() - started)
+                if status != scenario.expected:
+                    errors[worker.index] += 1
+        finally:
+            session.close()
+
+    if ready is None:
+        started = time.perf_counter()
+        work(workers[0])
+    else:
+        def run_in_thread(worker):
+            try:
+                work(worker)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run_in_thread, args=(worker,)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise failures[0]
+    return summarize([sample for worker in samples for sample in worker], sum(errors), elapsed)
+
+
+def run_benchmarks(users, transports=('client',), scenarios=tuple(SCENARIOS), iterations=100, concurrency=1,
+                   seed=0, log=None):
+    """Run every scenario through every transport; returns a list of result rows."""
+
+    results = []
+    for transport_name in transports:
+        transport = TRANSPORTS[transport_name]()
+        if not transport.available():
+            if log:
+                log(f'Skipping {transport_name}: its server is not installed.')
+            continue
+        transport.start()
+        try:
+            for name in scenarios:
+                summary = run_scenario(transport, SCENARIOS[name], users, iterations, concurrency, seed)
+                row = {'transport': transport_name, 'scenario': name, **summary}
+                results.append(row)
+                if log:
+                    log(_format_row(row))
+        finally:
+            transport.stop()
+    return results
+
+
+HEADER = f'{"transport":<10}{"scenario":<14}{"requests":>9}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}'
+
+
+def _format_row(row):
+    return (
+        f'{row["transport"]:<10}{row["scenario"]:<14}{row["requests"]:>9}{row["errors"]:>8}'
+        f'{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}{row["throughput_rps"] or 0:>10.1f}'
+    )
+
+
+def compare(results, baseline, max_regression):
+    """Print the change against ``baseline`` rows; returns the regressed ``(transport, scenario)`` pairs."""
+
+    previous = {(row['transport'], row['scenario']): row for row in baseline}
+    regressions = []
+    print(f'\n{"transport":<10}{"scenario":<14}{"p95 ms":>18}{"change":>9}{"req/s":>18}{"change":>9}')
+    for row in results:
+        key = (row['transport'], row['scenario'])
+        before = previous.get(key)
+        if before is None:
+            continue
+        p95_change = row['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+        rps_change = row['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        if regressed:
+            regressions.append(key)
+        print(
+            f'{key[0]:<10}{key[1]:<14}{before["p95_ms"]:>8.2f} -> {row["p95_ms"]:<8.2f}{p95_change:>+9.0%}'
+            f'{before["throughput_rps"]:>8.1f} -> {row["throughput_rps"]:<8.1f}{rps_change:>+9.0%}'
+            f'{"  REGRESSION" if regressed else ""}'
+        )
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    from django.core.cache import cache
+
+    from .datagen import generate, scratch_database
+
+    parser = argparse.ArgumentParser(description='Benchmark the contacts and users APIs.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--contacts', type=int, default=500, help='contacts per user')
+    parser.add_argument('--iterations', type=int, default=100, help='requests per worker and scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--transport', action='append', choices=sorted(TRANSPORTS),
+                        help='repeatable; default: client and wsgi (and asgi when uvicorn is installed)')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='repeatable; default: all')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with scratch_database():
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, '127.0.0.1', 'localhost']
+        cache.clear()
+        started = time.perf_counter()
+        users = generate(users=args.users, contacts_per_user=args.contacts, seed=args.seed)
+        print(f'Generated {args.users} users x {args.contacts} contacts in {time.perf_counter() - started:.1f}s')
+        print(HEADER)
+        results = run_benchmarks(
+            users,
+            transports=args.transport or ['client', 'wsgi', 'asgi'],
+            scenarios=args.scenario or list(SCENARIOS),
+            iterations=args.iterations,
+            concurrency=args.concurrency,
+            seed=args.seed,
+            log=print,
+        )
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database_engine': connection.settings_dict['ENGINE'],
+            'users': args.users,
+            'contacts_per_user': args.contacts,
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f'\nWrote {args.output}')
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline)['results'], args.max_regression)
+        if regressions:
+            print(f'\n{len(regressions)} scenario(s) regressed by more than {args.max_regression:.0%}.')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
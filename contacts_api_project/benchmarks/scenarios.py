@@ -0,0 +1,137 @@
+"""
+Benchmark scenarios.
+
+A scenario's ``prepare`` runs once per worker before timing starts (usually
+to get a JWT); ``step`` is one timed request and returns its status code.
+Repeated list and search requests may be answered from the response cache,
+as they would be in production.
+"""
+
+import json
+import random
+import uuid
+
+from django.urls import reverse
+
+from contacts.models import Contact
+
+from .datagen import BENCHMARK_PASSWORD, FIRST_NAMES, LAST_NAMES, fake_contact
+
+BULK_SIZE = 100
+REGISTER_PASSWORD = 'Tr0ub4dor&3-horse'
+
+
+class Worker:
+    """State of one concurrent benchmark client."""
+
+    def __init__(self, index, user, seed):
+        self.index = index
+        self.user = user
+        self.rng = random.Random(f'{seed}:{index}')
+        self.nonce = uuid.uuid4().hex[:8]
+        self.contact_ids = []
+
+
+class Scenario:
+
+    def __init__(self, name, step, prepare=None, expected=200, scale=1.0):
+        self.name = name
+        self.step = step
+        self.prepare = prepare or (lambda session, worker: None)
+        self.expected = expected
+        # Fraction of --iterations to run; keeps password-hashing flows short.
+        self.scale = scale
+
+    def iterations(self, requested):
+        return max(1, int(requested * self.scale))
+
+
+def authenticate(session, worker):
+    status, body = session.post(
+        reverse('token-obtain'),
+        json_body={'username': worker.user.username, 'password': BENCHMARK_PASSWORD},
+    )
+    if status != 200:
+        raise RuntimeError(f'Could not get a token for {worker.user.username}: {status} {body[:200]!r}')
+    session.set_token(json.loads(body)['access'])
+
+
+def authenticate_and_load_ids(session, worker):
+    authenticate(session, worker)
+    worker.contact_ids = list(
+        Contact.objects.for_user(worker.user.pk).order_by('id').values_list('id', flat=True)[:1000]
+    )
+
+
+def _prefix(worker):
+    word = worker.rng.choice(FIRST_NAMES + LAST_NAMES).split()[0]
+    return word[:worker.rng.randint(2, 4)]
+
+
+def list_contacts(session, worker, iteration):
+    return session.get(reverse('contact-api-list'), {'page_size': 50})[0]
+
+
+def list_large_page(session, worker, iteration):
+    return session.get(reverse('contact-api-list'), {'page_size': 500})[0]
+
+
+def search_contacts(session, worker, iteration):
+    return session.get(reverse('contact-api-list'), {'search': _prefix(worker)})[0]
+
+
+def autocomplete(session, worker, iteration):
+    return session.get(reverse('contact-api-autocomplete'), {'q': _prefix(worker)})[0]
+
+
+def create_contact(session, worker, iteration):
+    return session.post(reverse('contact-api-list'), json_body=fake_contact(worker.rng))[0]
+
+
+def bulk_create(session, worker, iteration):
+    items = [fake_contact(worker.rng) for _ in range(BULK_SIZE)]
+    return session.post(reverse('contact-api-bulk'), json_body=items)[0]
+
+
+def bulk_update(session, worker, iteration):
+    ids = worker.rng.sample(worker.contact_ids, min(BULK_SIZE, len(worker.contact_ids)))
+    items = [{'id': pk, 'phone': f'555-{worker.rng.randint(100, 999)}-{worker.rng.randint(1000, 9999)}'} for pk in ids]
+    return session.patch(reverse('contact-api-bulk'), json_body=items)[0]
+
+
+def login(session, worker, iteration):
+    return session.post(
+        reverse('token-obtain'),
+        json_body={'username': worker.user.username, 'password': BENCHMARK_PASSWORD},
+    )[0]
+
+
+def open_register_form(session, worker):
+    # Sets the CSRF cookie that real-server sessions send back.
+    session.get(reverse('register'))
+
+
+def register(session, worker, iteration):
+    username = f'new-{worker.nonce}-{worker.index}-{iteration}'
+    return session.post(reverse('register'), form={
+        'username': username,
+        'email': f'{username}@example.com',
+        'phone': '',
+        'password1': REGISTER_PASSWORD,
+        'password2': REGISTER_PASSWORD,
+    })[0]
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario('list', list_contacts, authenticate),
+        Scenario('list-large', list_large_page, authenticate),
+        Scenario('search', search_contacts, authenticate),
+        Scenario('autocomplete', autocomplete, authenticate),
+        Scenario('login', login, scale=0.2),
+        Scenario('create', create_contact, authenticate, expected=201),
+        Scenario('bulk-create', bulk_create, authenticate, expected=201, scale=0.2),
+        Scenario('bulk-update', bulk_update, authenticate_and_load_ids, scale=0.2),
+        Scenario('register', register, open_register_form, expected=302, scale=0.2),
+    )
+}
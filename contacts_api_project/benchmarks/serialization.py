@@ -0,0 +1,87 @@
+"""
+Compare the two ways the contact list can be serialized.
+
+``model-serializer`` is the generic DRF path: model instances through
+``ContactSerializer(many=True)`` and the stock ``JSONRenderer``.
+``values-rows`` is the path ``ContactViewSet.list`` takes: ``values()`` rows
+through a ``RowSerializer`` and ``FastJSONRenderer``. Both include the query.
+The script checks that the two produce identical bytes, then prints the best
+of ``--repeat`` timings::
+
+    python -m benchmarks.serialization --contacts 10000
+"""
+
+import argparse
+import os
+import time
+
+import django
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
+    django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from contacts.models import Contact  # noqa: E402
+from contacts.rows import RowSerializer  # noqa: E402
+from contacts.serializers import ContactSerializer  # noqa: E402
+from contacts_api.renderers import FastJSONRenderer  # noqa: E402
+
+
+def model_serializer(queryset):
+    return JSONRenderer().render(ContactSerializer(queryset, many=True).data)
+
+
+def values_rows(queryset):
+    rows = RowSerializer.for_serializer(ContactSerializer)
+    return FastJSONRenderer().render(rows.to_representation(queryset.values(*rows.columns)))
+
+
+PATHS = {
+    'model-serializer': model_serializer,
+    'values-rows': values_rows,
+}
+
+
+def measure(user_id, repeat=5):
+    """Best time in seconds per path for serializing all of ``user_id``'s contacts."""
+
+    queryset = Contact.objects.for_user(user_id).order_by('name', 'id')
+    outputs = {name: path(queryset) for name, path in PATHS.items()}
+    if len(set(outputs.values())) != 1:
+        raise AssertionError('The serialization paths produced different output.')
+    timings = {}
+    for name, path in PATHS.items():
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            path(queryset)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def main():
+    from .datagen import generate, scratch_database
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--contacts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with scratch_database():
+        user = generate(users=1, contacts_per_user=args.contacts, seed=args.seed)[0]
+        timings = measure(user.pk, args.repeat)
+
+    baseline = timings['model-serializer']
+    print(f'{args.contacts} contacts, best of {args.repeat}')
+    print(f'{"path":<18}{"ms":>10}{"rows/s":>12}{"speedup":>9}')
+    for name, seconds in timings.items():
+        print(f'{name:<18}{seconds * 1000:>10.1f}{args.contacts / seconds:>12.0f}{baseline / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Compare Django's stock SQLite backend with ``contacts_api.sqlite_backend``
+under concurrent load.
+
+Each thread runs a contacts-like mix against a scratch database: mostly
+indexed reads, plus read-then-write transactions and single-statement
+writes. Operations that fail (``database is locked``) are counted, not
+retried. Run from the project directory::
+
+    python benchmarks/sqlite_concurrency.py --threads 8 --seconds 5
+    python benchmarks/sqlite_concurrency.py --processes 4 --threads 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connections, transaction  # noqa: E402
+from django.db.utils import load_backend  # noqa: E402
+
+BACKENDS = {
+    'stock': 'django.db.backends.sqlite3',
+    'production': 'contacts_api.sqlite_backend',
+}
+ALIAS = 'benchmark'
+USERS = 50
+CONTACTS_PER_USER = 200
+
+
+def open_connection(engine, path):
+    settings_dict = dict(connections['default'].settings_dict, ENGINE=engine, NAME=path, OPTIONS={})
+    return load_backend(engine).DatabaseWrapper(settings_dict, ALIAS)
+
+
+def prepare(engine, path):
+    connection = open_connection(engine, path)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE contact (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, '
+            'email TEXT, updated INTEGER)'
+        )
+        cursor.execute('CREATE INDEX contact_user ON contact (user_id, name)')
+        cursor.executemany(
+            'INSERT INTO contact (user_id, name, email, updated) VALUES (%s, %s, %s, 0)',
+            [
+                (user, f'Contact {index}', f'c{index}@example.com')
+                for user in range(USERS) for index in range(CONTACTS_PER_USER)
+            ],
+        )
+    connection.close()
+
+
+def worker(engine, path, deadline, write_ratio, results):
+    connections[ALIAS] = open_connection(engine, path)
+    done = failed = 0
+    try:
+        while time.monotonic() < deadline:
+            user = random.randrange(USERS)
+            roll = random.random()
+            try:
+                if roll < write_ratio / 2:
+                    with transaction.atomic(using=ALIAS), connections[ALIAS].cursor() as cursor:
+                        cursor.execute('SELECT max(updated) FROM contact WHERE user_id = %s', [user])
+                        latest = cursor.fetchone()[0]
+                        cursor.execute(
+                            'UPDATE contact SET updated = %s WHERE id = (SELECT min(id) FROM contact WHERE user_id = %s)',
+                            [latest + 1, user],
+                        )
+                elif roll < write_ratio:
+                    with connections[ALIAS].cursor() as cursor:
+                        cursor.execute(
+                            'INSERT INTO contact (user_id, name, email, updated) VALUES (%s, %s, %s, 0)',
+                            [user, 'New contact', 'new@example.com'],
+                        )
+                else:
+                    with connections[ALIAS].cursor() as cursor:
+                        cursor.execute(
+                            'SELECT id, name, email FROM contact WHERE user_id = %s ORDER BY name LIMIT 20',
+                            [user],
+                        )
+                        cursor.fetchall()
+                done += 1
+            except Exception:
+                failed += 1
+    finally:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+    results.append((done, failed))
+
+
+def run_process(engine, path, threads, seconds, write_ratio):
+    results = []
+    deadline = time.monotonic() + seconds
+    pool = [
+        threading.Thread(target=worker, args=(engine, path, deadline, write_ratio, results))
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return [sum(column) for column in zip(*results)]
+
+
+def run(name, args):
+    engine = BACKENDS[name]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        prepare(engine, path)
+        started = time.monotonic()
+        job = (engine, path, args.threads, args.seconds, args.write_ratio)
+        if args.processes > 1:
+            with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+                totals = pool.starmap(run_process, [job] * args.processes)
+        else:
+            totals = [run_process(*job)]
+        elapsed = time.monotonic() - started
+    done = sum(total[0] for total in totals)
+    failed = sum(total[1] for total in totals)
+    return done / elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), action='append')
+    args = parser.parse_args()
+
+    print(f'{args.processes} process(es) x {args.threads} thread(s), {args.seconds:g}s, '
+          f'{args.write_ratio:.0%} writes')
+    print(f'{"backend":<12}{"ops/s":>12}{"failed":>10}')
+    for name in args.backend or ['stock', 'production']:
+        throughput, failed = run(name, args)
+        print(f'{name:<12}{throughput:>12.0f}{failed:>10}')
+
+
+if __name__ == '__main__':
+    main()
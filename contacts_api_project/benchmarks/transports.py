@@ -0,0 +1,205 @@
+"""
+Ways of sending benchmark requests to the project.
+
+Every transport hands out ``Session`` objects with the same small API
+(``get``, ``post``, ``patch``, ``delete`` returning ``(status, body)``), so
+scenarios do not care whether a request goes through the Django test client
+or over a socket to a real server:
+
+* ``client``: ``rest_framework.test.APIClient``, in-process, no sockets.
+* ``wsgi``: Django's threaded WSGI server on a free local port.
+* ``asgi``: uvicorn serving ``contacts_api.asgi`` (only if uvicorn is installed).
+
+Servers run in a background thread of the benchmark process, so they see the
+same database as the data generator.
+"""
+
+import http.client
+import json
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from rest_framework.test import APIClient
+
+
+class ClientSession:
+
+    def __init__(self):
+        # Server errors (e.g. "database is locked") are counted, not raised.
+        self.client = APIClient(raise_request_exception=False)
+
+    def set_token(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def _request(self, method, path, params=None, json_body=None, form=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        call = getattr(self.client, method)
+        if json_body is not None:
+            response = call(path, json_body, format='json')
+        elif form is not None:
+            response = call(path, form)
+        else:
+            response = call(path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, body
+
+    def get(self, path, params=None):
+        return self._request('get', path, params=params)
+
+    def post(self, path, json_body=None, form=None):
+        return self._request('post', path, json_body=json_body, form=form)
+
+    def patch(self, path, json_body=None):
+        return self._request('patch', path, json_body=json_body)
+
+    def delete(self, path, json_body=None):
+        return self._request('delete', path, json_body=json_body)
+
+    def close(self):
+        pass
+
+
+class HTTPSession:
+    """Persistent HTTP/1.1 connection with a minimal cookie jar."""
+
+    def __init__(self, host, port):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookies = {}
+        self.token = None
+
+    def set_token(self, token):
+        self.token = token
+
+    def _request(self, method, path, params=None, json_body=None, form=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            if 'csrftoken' in self.cookies:
+                headers['X-CSRFToken'] = self.cookies['csrftoken']
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        self.connection.request(method.upper(), path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        content = response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, content
+
+    def get(self, path, params=None):
+        return self._request('get', path, params=params)
+
+    def post(self, path, json_body=None, form=None):
+        return self._request('post', path, json_body=json_body, form=form)
+
+    def patch(self, path, json_body=None):
+        return self._request('patch', path, json_body=json_body)
+
+    def delete(self, path, json_body=None):
+        return self._request('delete', path, json_body=json_body)
+
+    def close(self):
+        self.connection.close()
+
+
+class Transport:
+    name = None
+
+    @staticmethod
+    def available():
+        return True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class ClientTransport(Transport):
+    name = 'client'
+
+    def session(self):
+        return ClientSession()
+
+
+class _QuietHandler(WSGIRequestHandler):
+    # Without this, Nagle's algorithm and delayed ACKs add ~40ms per response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGITransport(Transport):
+    name = 'wsgi'
+
+    def start(self):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+        self.server.set_app(get_wsgi_application())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def session(self):
+        return HTTPSession('127.0.0.1', self.port)
+
+
+class ASGITransport(Transport):
+    name = 'asgi'
+
+    @staticmethod
+    def available():
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def start(self):
+        import socket
+
+        import uvicorn
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        config = uvicorn.Config('contacts_api.asgi:application', host='127.0.0.1', port=self.port, log_level='warning')
+        self.server = uvicorn.Server(config)
+        # Signal handlers can only be installed from the main thread.
+        self.server.install_signal_handlers = lambda: None
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError('uvicorn did not start within 10 seconds')
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+    def session(self):
+        return HTTPSession('127.0.0.1', self.port)
+
+
+TRANSPORTS = {transport.name: transport for transport in (ClientTransport, WSGITransport, ASGITransport)}
@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import Contact
+from .models import Contact, ContactImport, ContactShardAssignment
 
-admin.site.register(Contact)
\ No newline at end of file
+admin.site.register(Contact)
+admin.site.register(ContactImport)
+admin.site.register(ContactShardAssignment)
\ No newline at end of file
@@ -2,4 +2,12 @@ from django.apps import AppConfig
 
 class ContactsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'contacts'
\ No newline at end of file
+    name = 'contacts'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .sharding import seed_id_range
+
+        post_migrate.connect(seed_id_range, sender=self)
@@ -0,0 +1,158 @@
+"""
+Async contact API for ASGI deployments.
+
+``/contacts/api/async/`` serves the list (with ``search``, keyset pagination
+and ``fields``/``exclude``), create and retrieve operations of the DRF
+contact API as coroutine views returning the same JSON. A request is handled
+on the event loop and only its ORM work goes to the ``run_orm`` thread
+pool (token authentication included, since it checks the revocation
+table), so idle or slow connections hold no thread.
+
+These views accept bearer tokens only (no session authentication, so CSRF
+does not apply) and do not answer conditional requests; the DRF API still
+does both. Response cache lookups run on the event loop, so use an
+in-memory or network cache rather than ``DatabaseCache``.
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from contacts_api.asyncdb import run_orm
+from contacts_api.db_routing import read_from_replica
+from contacts_api.metrics import mark_render_started
+from contacts_api.projection import requested_fields
+from contacts_api.renderers import FastJSONRenderer
+from users.authentication import StatelessJWTAuthentication
+
+from .caching import RESPONSE_KEY, get_generation
+from .models import Contact
+from .pagination import ContactCursorPagination
+from .rows import RowSerializer, select_rows
+from .search import ContactSearchFilter
+from .serializers import ContactSerializer
+from .views import ContactViewSet
+
+_authentication = StatelessJWTAuthentication()
+
+
+def render(request, data, status_code=status.HTTP_200_OK, headers=None):
+    mark_render_started(request)
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status_code)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def authenticate(request):
+    result = _authentication.authenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+def async_api_view(*methods):
+    """Bearer-token authentication and DRF-style error responses for a coroutine view."""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                # Also lets ReadReplicaMiddleware pin this user after a write.
+                request.user = await run_orm(authenticate, request)
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                headers = {}
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    headers['WWW-Authenticate'] = _authentication.authenticate_header(request)
+                elif isinstance(exc, exceptions.MethodNotAllowed):
+                    headers['Allow'] = ', '.join(methods)
+                return render(request, data, exc.status_code, headers)
+
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+def _rows(request):
+    rows = RowSerializer.for_serializer(ContactSerializer)
+    names = requested_fields(request.GET, ContactSerializer)
+    return rows if names is None else rows.project(names)
+
+
+async def _cached(request, action, build):
+    """Serve ``build()`` (run on the ORM pool) through the per-user response cache."""
+
+    user_id = request.user.pk
+    timeout = getattr(settings, 'CONTACTS_RESPONSE_CACHE_TIMEOUT', 300)
+    key = None
+    if timeout:
+        digest = hashlib.md5(f'async:{action}:{request.get_full_path()}'.encode('utf-8')).hexdigest()
+        key = RESPONSE_KEY.format(user_id=user_id, generation=get_generation(user_id), digest=digest)
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content, content_type='application/json')
+
+    read_from_replica(request, user_id)
+    response = render(request, await run_orm(build))
+    if key is not None:
+        cache.set(key, response.content, timeout)
+    return response
+
+
+def _list_page(request, rows):
+    drf_request = Request(request)
+    drf_request.user = request.user
+    queryset = Contact.objects.for_user(request.user.pk)
+    queryset = ContactSearchFilter().filter_queryset(drf_request, queryset, ContactViewSet)
+    paginator = ContactCursorPagination()
+    page = paginator.paginate_queryset(select_rows(rows, queryset, paginator, drf_request), drf_request)
+    return paginator.get_paginated_response(rows.to_representation(page)).data
+
+
+def _contact(user_id, pk, rows):
+    found = rows.to_representation(Contact.objects.for_user(user_id).filter(pk=pk).values(*rows.columns))
+    if not found:
+        raise exceptions.NotFound()
+    return found[0]
+
+
+async def _create(request):
+    if request.content_type != 'application/json':
+        raise exceptions.UnsupportedMediaType(request.content_type)
+    try:
+        data = json.loads(request.body)
+    except ValueError as exc:
+        raise exceptions.ParseError(f'JSON parse error - {exc}')
+    serializer = ContactSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    await run_orm(serializer.save, user_id=request.user.pk)
+    return render(request, serializer.data, status.HTTP_201_CREATED)
+
+
+@async_api_view('GET', 'POST')
+async def contact_list(request):
+    """List (``GET``, with ``search``/``cursor``/``page_size``) or create (``POST``) contacts."""
+
+    if request.method == 'POST':
+        return await _create(request)
+    rows = _rows(request)
+    return await _cached(request, 'list', lambda: _list_page(request, rows))
+
+
+@async_api_view('GET')
+async def contact_detail(request, pk):
+    """Retrieve one contact."""
+
+    rows = _rows(request)
+    return await _cached(request, 'retrieve', lambda: _contact(request.user.pk, pk, rows))
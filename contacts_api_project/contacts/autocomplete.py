@@ -0,0 +1,121 @@
+"""
+Typeahead lookups over contact names and emails.
+
+Each user gets a ``PrefixIndex``: a sorted array of normalized keys (every
+name/email token plus the full name and email) that is searched with
+``bisect``, so a keystroke costs a binary search plus ``limit`` steps instead
+of a query. Indexes are held in a small per-process LRU and are tagged with
+the user's cache generation (see ``contacts.caching``); a write anywhere in
+the deployment bumps the generation and the next lookup rebuilds from the
+database. Without a shared cache (``CACHE_IS_SHARED``) other workers never
+see the bump, so every lookup builds a fresh index instead.
+"""
+
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .caching import get_generation
+from .models import Contact
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(value):
+    """Casefold, strip accents and collapse whitespace."""
+
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.split())
+
+
+def index_keys(name, email):
+    keys = set()
+    for value in (normalize(name), normalize(email)):
+        if not value:
+            continue
+        keys.add(value)
+        keys.update(value.replace('@', ' ').replace('.', ' ').split())
+    return keys
+
+
+class PrefixIndex:
+    """Immutable sorted prefix index for one user's contacts."""
+
+    def __init__(self, rows, generation):
+        self.generation = generation
+        self.contacts = {}
+        pairs = []
+        for pk, name, email in rows:
+            self.contacts[pk] = (name, email)
+            pairs.extend((key, pk) for key in index_keys(name, email))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [pk for _, pk in pairs]
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(results) < limit:
+            if not self.keys[position].startswith(prefix):
+                break
+            pk = self.ids[position]
+            if pk not in seen:
+                seen.add(pk)
+                name, email = self.contacts[pk]
+                results.append({'id': pk, 'name': name, 'email': email})
+            position += 1
+        return results
+
+
+class PrefixIndexCache:
+    """Bounded LRU of ``PrefixIndex`` objects keyed by user id."""
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if not getattr(settings, 'CACHE_IS_SHARED', True):
+            return self.build(user_id, None)
+        generation = get_generation(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.generation == generation:
+                self._indexes.move_to_end(user_id)
+                return index
+        index = self.build(user_id, generation)
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def build(self, user_id, generation):
+        rows = Contact.objects.for_user(user_id).values_list('id', 'name', 'email').iterator()
+        return PrefixIndex(rows, generation)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+index_cache = PrefixIndexCache(getattr(settings, 'CONTACTS_AUTOCOMPLETE_MAX_USERS', 256))
+
+
+def autocomplete(user_id, prefix, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` ``{id, name, email}`` matches for ``prefix``."""
+
+    return index_cache.get(user_id).lookup(prefix, limit)
@@ -0,0 +1,153 @@
+"""
+Per-user cache generations for contact data, and the API response cache
+built on them.
+
+Every write to a user's contacts bumps that user's generation number in the
+shared Django cache. Anything derived from the contact set (the autocomplete
+index, for example) is tagged with the generation it was built from and is
+simply ignored once the number moves on, so invalidation is one cheap
+``incr`` regardless of how many derived entries exist.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+GENERATION_KEY = 'contacts:generation:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the current generation number for ``user_id``'s contacts."""
+
+    key = GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed with the clock rather than 0 so an evicted counter never
+        # repeats a generation that derived entries were already tagged with.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id, using=None):
+    """
+    Invalidate everything derived from ``user_id``'s contacts.
+
+    ``using`` is the database the write went to; it defaults to the user's
+    shard.
+    """
+
+    _incr(user_id)
+    if using is None:
+        # sharding imports this module.
+        from .sharding import shard_for_user
+        using = shard_for_user(user_id)
+    # A reader may rebuild from the pre-commit state after the first bump;
+    # bumping again once the data is visible discards that entry as well.
+    transaction.on_commit(lambda: _incr(user_id), using=using)
+
+
+def _incr(user_id):
+    key = GENERATION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+RESPONSE_KEY = 'contacts:response:{user_id}:{generation}:{digest}'
+FRAGMENT_KEY = 'contacts:fragment:{user_id}:{generation}:{digest}'
+
+
+def cached_fragment(user_id, name, build, timeout=None):
+    """
+    Return ``build()`` from the cache, computing and storing it on a miss.
+
+    ``name`` identifies the fragment among ``user_id``'s (template and
+    parameters, say); entries are tagged with the user's generation, so any
+    write to their contacts discards them.
+    """
+
+    if timeout is None:
+        timeout = getattr(settings, 'CONTACTS_FRAGMENT_CACHE_TIMEOUT', 300)
+    if not timeout:
+        return build()
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    key = FRAGMENT_KEY.format(user_id=user_id, generation=get_generation(user_id), digest=digest)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _detach(data):
+    """Copy serializer output into plain containers that pickle without the serializer."""
+
+    if isinstance(data, dict):
+        return OrderedDict((key, _detach(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return [_detach(value) for value in data]
+    return data
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list``/``retrieve`` responses per user, query string and format.
+
+    Keys embed the user's current generation, so a write makes every cached
+    response for that user unreachable at once; stale entries then age out
+    through ``CONTACTS_RESPONSE_CACHE_TIMEOUT`` or the cache's own culling.
+    Cached entries keep their ``ETag``/``Last-Modified`` headers so
+    conditional requests can be answered from the cache alone.
+    """
+
+    cached_actions = ('list', 'retrieve')
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def response_cache_key(self, request):
+        generation = get_generation(request.user.pk)
+        digest = hashlib.md5(
+            f'{self.action}:{request.accepted_renderer.format}:{request.get_full_path()}'.encode('utf-8')
+        ).hexdigest()
+        return RESPONSE_KEY.format(user_id=request.user.pk, generation=generation, digest=digest)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        timeout = getattr(settings, 'CONTACTS_RESPONSE_CACHE_TIMEOUT', 300)
+        if not timeout or request.method != 'GET':
+            return handler(request, *args, **kwargs)
+
+        key = self.response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            data, headers = entry
+            last_modified = headers.get('Last-Modified')
+            response = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+            )
+            if response is None:
+                response = Response(data)
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, Response):
+            headers = {name: response[name] for name in self.cached_headers if response.has_header(name)}
+            cache.set(key, (_detach(response.data), headers), timeout)
+        return response
@@ -0,0 +1,102 @@
+"""
+Conditional request support (ETag / Last-Modified) for the contact API.
+
+List responses are tagged from the user's cache generation (see
+``contacts.caching``), which every write bumps, plus the request path and
+negotiated format; they go untagged without a shared cache
+(``CACHE_IS_SHARED``), where a worker would miss other workers' bumps. Detail responses are tagged from the contact's
+``updated_at``. Both tags are computed before any serialization, so an
+unchanged resource is answered with ``304 Not Modified`` for the price of a
+cache read (list) or a single-row lookup (detail).
+
+Unsafe methods honor ``If-Match``/``If-Unmodified-Since`` and answer ``412``
+when the client's copy is stale, giving optimistic concurrency control.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .caching import get_generation
+
+
+def _quote(value):
+    return '"%s"' % hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def collection_etag(request):
+    generation = get_generation(request.user.pk)
+    return _quote(f'{request.user.pk}:{generation}:{request.accepted_renderer.format}:{request.get_full_path()}')
+
+
+def object_etag(request, instance):
+    return _quote(f'{instance.pk}:{instance.updated_at.isoformat()}:{request.accepted_renderer.format}')
+
+
+class ConditionalRequestMixin:
+    """Adds ETag/Last-Modified handling to a ``ModelViewSet`` over contacts."""
+
+    locking_actions = ('update', 'partial_update', 'destroy')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.locking_actions:
+            # Hold the row between the precondition check and the write.
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'CACHE_IS_SHARED', True):
+            return super().list(request, *args, **kwargs)
+        etag = collection_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        response = self.check_preconditions(request, instance)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.tag_response(response, instance)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic(using=self.get_queryset().db):
+            instance = self.get_object()
+            response = self.check_preconditions(request, instance)
+            if response is not None:
+                return self.tag_response(response, instance)
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        return self.tag_response(Response(serializer.data), serializer.instance)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic(using=self.get_queryset().db):
+            instance = self.get_object()
+            response = self.check_preconditions(request, instance)
+            if response is not None:
+                return self.tag_response(response, instance)
+            self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def check_preconditions(self, request, instance):
+        """Return a 304/412 response if the request's conditions say so, else ``None``."""
+        return get_conditional_response(
+            request,
+            etag=object_etag(request, instance),
+            last_modified=int(instance.updated_at.timestamp()),
+        )
+
+    def tag_response(self, response, instance):
+        response['ETag'] = object_etag(self.request, instance)
+        response['Last-Modified'] = http_date(instance.updated_at.timestamp())
+        return response
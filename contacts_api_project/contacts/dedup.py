@@ -0,0 +1,269 @@
+"""
+Duplicate detection and merging for a user's contacts.
+
+``find_duplicates`` reads the user's contacts once and files each one under
+its blocking keys: the last nine digits of its phone number, its casefolded
+email and a phonetic key of its name (the Soundex code of every name token,
+sorted, so "Smith, John" and "Jon Smith" meet). Only contacts that share a
+key are compared, so the cost follows the number of candidate pairs instead
+of growing with the square of the address book. A key shared by more than
+``CONTACTS_DEDUP_MAX_BLOCK`` contacts (a company switchboard, a very common
+name) says little about identity and is not expanded into pairs. Pairs
+scoring at least ``CONTACTS_DEDUP_MIN_SCORE`` are joined into groups.
+
+Groups are cached per user and tagged with the cache generation (see
+``contacts.caching``), so paging through them does not redo the work and
+any write to the user's contacts discards them.
+
+``merge_contacts`` folds each group into the contact being kept: its empty
+fields are filled from the duplicates, which are then deleted with
+tombstones so sync clients drop them too.
+"""
+
+import re
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .autocomplete import normalize
+from .caching import bump_generation, get_generation
+from .models import Contact
+from .normalization import normalize_email
+from .sharding import db_for_user
+from .sync import delete_contacts
+
+DUPLICATES_KEY = 'contacts:duplicates:{user_id}:{generation}'
+# Fields filled on the kept contact when it has no value of its own.
+MERGE_FIELDS = ('email', 'phone', 'address')
+# Weight of each signal in a pair's score; the name weight scales with similarity.
+NAME_WEIGHT = 0.6
+EMAIL_WEIGHT = 0.4
+PHONE_WEIGHT = 0.4
+# Subtracted for each of email and phone that both contacts have but differ in.
+CONFLICT_PENALTY = 0.2
+
+_SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in (('1', 'bfpv'), ('2', 'cgjkqsxz'), ('3', 'dt'), ('4', 'l'), ('5', 'mn'), ('6', 'r'))
+    for letter in letters
+}
+_WORD = re.compile(r'\w+')
+_NON_DIGITS = re.compile(r'[^0-9]')
+
+
+def soundex(token):
+    """American Soundex code of a normalized token, or ``''`` if it has no ASCII letters."""
+
+    letters = [char for char in token if 'a' <= char <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # Vowels separate repeated codes; h and w do not.
+        if char not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_tokens(name):
+    return sorted(_WORD.findall(normalize(name)))
+
+
+def name_key(tokens):
+    """Phonetic key of a name; tokens without a Soundex code (non-Latin scripts) are kept as they are."""
+
+    return ' '.join(sorted(soundex(token) or token for token in tokens))
+
+
+def phone_key(phone):
+    """The last nine digits: the subscriber number without country code or trunk prefix in most numbering plans."""
+
+    digits = _NON_DIGITS.sub('', phone or '')
+    return digits[-9:] if len(digits) >= 7 else None
+
+
+class _Candidate:
+
+    __slots__ = ('pk', 'name', 'email', 'phone')
+
+    def __init__(self, pk, name, email, phone):
+        self.pk = pk
+        self.name = name
+        self.email = email
+        self.phone = phone
+
+
+def _match(first, second):
+    # 1 when both values are present and equal, -1 when both are present and differ.
+    if not first or not second:
+        return 0
+    return 1 if first == second else -1
+
+
+def score_pair(first, second, min_score=0.0):
+    """
+    ``(score, reasons)`` for two candidates.
+
+    A shared email or phone adds to the name similarity and a different one
+    (both present) subtracts from it, so two people who merely share a name
+    stay apart. Returns ``(0.0, [])`` early once ``min_score`` is out of reach.
+    """
+
+    email = _match(first.email, second.email)
+    phone = _match(first.phone, second.phone)
+    score = 0.0
+    for match, weight in ((email, EMAIL_WEIGHT), (phone, PHONE_WEIGHT)):
+        if match > 0:
+            score += weight
+        elif match < 0:
+            score -= CONFLICT_PENALTY
+    if score + NAME_WEIGHT < min_score:
+        return 0.0, []
+    reasons = []
+    if first.name and second.name:
+        similarity = 1.0 if first.name == second.name else SequenceMatcher(None, first.name, second.name).ratio()
+        score += NAME_WEIGHT * similarity
+        if similarity >= 0.8:
+            reasons.append('name')
+    if email > 0:
+        reasons.append('email')
+    if phone > 0:
+        reasons.append('phone')
+    return max(0.0, min(score, 1.0)), reasons
+
+
+def _find_root(parents, index):
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def find_duplicates(rows, min_score=None, max_block=None):
+    """
+    Group likely duplicates among ``(id, name, email, phone)`` rows.
+
+    Returns ``[{'ids': [...], 'score': ..., 'reasons': [...]}]`` ordered by
+    each group's lowest id; ``score`` is the best pair score in the group.
+    """
+
+    if min_score is None:
+        min_score = getattr(settings, 'CONTACTS_DEDUP_MIN_SCORE', 0.7)
+    if max_block is None:
+        max_block = getattr(settings, 'CONTACTS_DEDUP_MAX_BLOCK', 100)
+
+    candidates = []
+    blocks = {}
+    # Names repeat a lot within an address book; normalize each one once.
+    names = {}
+    for pk, name, email, phone in rows:
+        if name not in names:
+            tokens = name_tokens(name)
+            names[name] = (' '.join(tokens), 'n:' + name_key(tokens) if tokens else None)
+        normalized, name_block = names[name]
+        candidate = _Candidate(pk, normalized, normalize_email(email), phone_key(phone))
+        index = len(candidates)
+        candidates.append(candidate)
+        for key in (name_block, candidate.email and 'e:' + candidate.email, candidate.phone and 'p:' + candidate.phone):
+            if key:
+                blocks.setdefault(key, []).append(index)
+
+    parents = list(range(len(candidates)))
+    best = {}
+    reasons = {}
+    for members in blocks.values():
+        if not 1 < len(members) <= max_block:
+            continue
+        # A pair sharing several keys is scored once per block; the result is the same.
+        for first, second in combinations(members, 2):
+            score, why = score_pair(candidates[first], candidates[second], min_score)
+            if score < min_score:
+                continue
+            parents[_find_root(parents, first)] = _find_root(parents, second)
+            for index in (first, second):
+                best[index] = max(best.get(index, 0.0), score)
+                reasons.setdefault(index, set()).update(why)
+
+    groups = {}
+    for index in best:
+        groups.setdefault(_find_root(parents, index), []).append(index)
+    result = []
+    for members in groups.values():
+        result.append({
+            'ids': sorted(candidates[index].pk for index in members),
+            'score': round(max(best[index] for index in members), 2),
+            'reasons': sorted(set().union(*(reasons[index] for index in members))),
+        })
+    result.sort(key=lambda group: group['ids'][0])
+    return result
+
+
+def duplicate_groups(user_id):
+    """``find_duplicates`` over ``user_id``'s contacts, cached until their next write."""
+
+    timeout = getattr(settings, 'CONTACTS_DEDUP_CACHE_TIMEOUT', 3600)
+    key = DUPLICATES_KEY.format(user_id=user_id, generation=get_generation(user_id)) if timeout else None
+    groups = cache.get(key) if key else None
+    if groups is None:
+        rows = Contact.objects.for_user(user_id).values_list('id', 'name', 'email', 'phone').iterator(
+            chunk_size=getattr(settings, 'CONTACTS_EXPORT_CHUNK_SIZE', 2000),
+        )
+        groups = find_duplicates(rows)
+        if key:
+            cache.set(key, groups, timeout)
+    return groups
+
+
+class MergeConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Some of these contacts were changed or deleted meanwhile. Reload the duplicates and retry.'
+    default_code = 'merge_conflict'
+
+
+def merge_contacts(user_id, merges):
+    """
+    Apply ``[(keep_id, [duplicate_id, ...]), ...]`` for ``user_id`` in one transaction.
+
+    The caller has checked that every id belongs to the user and appears
+    once. Raises ``MergeConflict`` (and writes nothing) if a contact was
+    deleted since. Returns the kept contacts, updated.
+    """
+
+    contacts = Contact.objects.for_user(user_id)
+    with transaction.atomic(using=db_for_user(user_id)):
+        ids = [pk for keep, duplicates in merges for pk in (keep, *duplicates)]
+        instances = contacts.select_for_update().in_bulk(ids)
+        if len(instances) != len(set(ids)):
+            raise MergeConflict()
+        now = timezone.now()
+        kept = []
+        for keep, duplicates in merges:
+            contact = instances[keep]
+            for field in MERGE_FIELDS:
+                if not getattr(contact, field):
+                    for pk in duplicates:
+                        value = getattr(instances[pk], field)
+                        if value:
+                            setattr(contact, field, value)
+                            break
+            # bulk_update() bypasses auto_now.
+            contact.updated_at = now
+            kept.append(contact)
+        contacts.bulk_update(
+            kept, [*MERGE_FIELDS, 'updated_at'], batch_size=getattr(settings, 'CONTACTS_BULK_BATCH_SIZE', 500),
+        )
+        delete_contacts(contacts.filter(id__in=[pk for _, duplicates in merges for pk in duplicates]))
+    bump_generation(user_id)
+    return kept
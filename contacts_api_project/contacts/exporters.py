@@ -0,0 +1,165 @@
+"""
+Streaming serializers for exporting a user's contacts.
+
+Each exporter turns an iterable of ``EXPORT_FIELDS`` tuples into an iterable
+of ``bytes`` chunks. Rows come from ``values_list().iterator()``, so no
+``Contact`` instances are built and nothing holds more than one chunk of
+rows or output in memory, however large the address book is.
+"""
+
+import csv
+import json
+import zlib
+
+EXPORT_FIELDS = ('id', 'name', 'email', 'phone', 'address')
+CHUNK_SIZE = 2000
+# Flush output to the client in blocks of roughly this many bytes.
+BUFFER_SIZE = 64 * 1024
+
+VCARD_VERSIONS = ('3.0', '4.0')
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, chunk_size=CHUNK_SIZE):
+    return queryset.order_by('name', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def buffered(pieces, size=BUFFER_SIZE):
+    """Join small ``str`` pieces into UTF-8 blocks of about ``size`` bytes."""
+
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an ``Accept-Encoding`` header allows gzip.
+
+    ``gzip`` (or ``x-gzip``) counts unless its ``q`` is 0; otherwise ``*``
+    does, with the same rule.
+    """
+
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def gzip_stream(chunks, level=6):
+    """Compress an iterable of ``bytes`` into a gzip stream on the fly."""
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def _vcard_escape(value):
+    return (
+        value.replace('\\', '\\\\')
+        .replace('\r\n', '\n')
+        .replace('\n', '\\n')
+        .replace(',', '\\,')
+        .replace(';', '\\;')
+    )
+
+
+def _vcard_fold(line):
+    """Fold a content line at 75 octets as required by RFC 6350 / RFC 2425."""
+
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte character.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def vcard_lines(rows, version='3.0'):
+    v3 = version == '3.0'
+    for pk, name, email, phone, address in rows:
+        lines = ['BEGIN:VCARD', f'VERSION:{version}', f'FN:{_vcard_escape(name)}']
+        if v3:
+            # N is mandatory in 3.0; the name is stored as a single string.
+            lines.append(f'N:{_vcard_escape(name)};;;;')
+        if email:
+            lines.append(f'EMAIL;TYPE=INTERNET:{_vcard_escape(email)}' if v3 else f'EMAIL:{_vcard_escape(email)}')
+        if phone:
+            lines.append(f'TEL;TYPE=VOICE:{_vcard_escape(phone)}' if v3 else f'TEL;VALUE=text:{_vcard_escape(phone)}')
+        if address:
+            lines.append(f'ADR:;;{_vcard_escape(address)};;;;')
+        lines.append('END:VCARD')
+        yield ''.join(_vcard_fold(line) for line in lines)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'vcard': ('text/vcard; charset=utf-8', 'vcf'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def export_stream(queryset, export_format, version='3.0', chunk_size=CHUNK_SIZE):
+    """Return an iterator of ``bytes`` for ``queryset`` in ``export_format``."""
+
+    if export_format == 'vcard' and version not in VCARD_VERSIONS:
+        raise ValueError(f'Unsupported vCard version: {version}')
+    rows = iter_export_rows(queryset, chunk_size)
+    if export_format == 'csv':
+        lines = csv_lines(rows)
+    elif export_format == 'vcard':
+        lines = vcard_lines(rows, version)
+    elif export_format == 'ndjson':
+        lines = ndjson_lines(rows)
+    else:
+        raise ValueError(f'Unsupported export format: {export_format}')
+    return buffered(lines)
@@ -1,11 +1,31 @@
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 from .models import Contact
+from .normalization import AmbiguousPhoneNumber, normalize_email, phone_lookup_filter
 
 class ContactFilter(filters.FilterSet):
+    """``?name=`` substring match; exact ``?email=`` and ``?phone=`` matches on the normalized, indexed columns."""
+
     name = filters.CharFilter(lookup_expr='icontains')
-    email = filters.CharFilter(lookup_expr='icontains')
-    phone = filters.CharFilter(lookup_expr='icontains')
+    email = filters.CharFilter(method='filter_email')
+    phone = filters.CharFilter(method='filter_phone')
 
     class Meta:
         model = Contact
-        fields = ['name', 'email', 'phone']
\ No newline at end of file
+        fields = ['name', 'email', 'phone']
+
+    def filter_email(self, queryset, name, value):
+        normalized = normalize_email(value)
+        if normalized is None:
+            return queryset.none()
+        return queryset.filter(email_normalized=normalized)
+
+    def filter_phone(self, queryset, name, value):
+        # Without CONTACTS_DEFAULT_COUNTRY_CODE this also matches national forms of the number.
+        try:
+            condition = phone_lookup_filter(value)
+        except AmbiguousPhoneNumber as exc:
+            raise ValidationError({name: [str(exc)]})
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
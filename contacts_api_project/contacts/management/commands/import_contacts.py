@@ -0,0 +1,69 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.importers import guess_format, run_import
+from contacts.models import ContactImport
+
+
+class Command(BaseCommand):
+    help = (
+        'Import contacts from a CSV or vCard file, resume a failed import with '
+        '--job, or process every queued upload with --pending.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV or vCard file to import.')
+        parser.add_argument('--user', help='Username that will own the imported contacts.')
+        parser.add_argument('--format', choices=[choice for choice, _ in ContactImport.FORMAT_CHOICES])
+        parser.add_argument('--job', type=int, help='Resume the import with this id.')
+        parser.add_argument('--pending', action='store_true', help='Process all pending imports.')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['job']:
+            jobs = [self._get_job(options['job'])]
+        elif options['pending']:
+            jobs = list(ContactImport.objects.filter(status=ContactImport.PENDING).order_by('created_at'))
+        elif options['path']:
+            jobs = [self._create_job(options)]
+        else:
+            raise CommandError('Pass a file path with --user, --job ID or --pending.')
+
+        for job in jobs:
+            self.stdout.write(f'Importing #{job.pk} for {job.user}...')
+            try:
+                run_import(job, batch_size=options['batch_size'])
+            except Exception as exc:
+                raise CommandError(
+                    f'Import #{job.pk} failed after {job.rows_processed} rows: {exc}. '
+                    f'Resume with --job {job.pk}.'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Import #{job.pk}: {job.rows_imported} imported, {job.rows_failed} rejected.'
+            ))
+
+    def _get_job(self, pk):
+        try:
+            return ContactImport.objects.get(pk=pk)
+        except ContactImport.DoesNotExist:
+            raise CommandError(f'Import #{pk} does not exist.')
+
+    def _create_job(self, options):
+        if not options['user']:
+            raise CommandError('--user is required when importing a file.')
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" does not exist.')
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} is not a file.')
+        job = ContactImport(user=user, format=options['format'] or guess_format(path))
+        with open(path, 'rb') as handle:
+            job.file.save(os.path.basename(path), File(handle), save=False)
+        job.bytes_total = job.file.size
+        job.save()
+        return job
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.sharding import get_shards, move_user, pin_users, rebalance, shard_for_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a user's contacts to another shard while they stay online, or "
+        "prepare for and apply a change to CONTACT_SHARDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', nargs='?', type=int, help='User whose contacts to move.')
+        parser.add_argument('target', nargs='?', help='Database alias of the destination shard.')
+        parser.add_argument(
+            '--pin-all',
+            metavar='ALIASES',
+            help='Before changing CONTACT_SHARDS: pin users to where the given comma-separated '
+                 'shard list places them.',
+        )
+        parser.add_argument(
+            '--rebalance',
+            action='store_true',
+            help='After changing CONTACT_SHARDS: move pinned users to their ring shard.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows copied per statement.')
+        parser.add_argument(
+            '--grace',
+            type=float,
+            default=1.0,
+            help='Seconds writes are paused before the final copy.',
+        )
+
+    def handle(self, *args, **options):
+        if options['pin_all']:
+            shards = [alias.strip() for alias in options['pin_all'].split(',') if alias.strip()]
+            pinned = pin_users(shards)
+            self.stdout.write(self.style.SUCCESS(f'Pinned {pinned} users.'))
+            return
+
+        if options['rebalance']:
+            for user_id, target, moved in rebalance(options['batch_size'], options['grace']):
+                self.stdout.write(f'Moved {moved} contacts of user {user_id} to {target}.')
+            self.stdout.write(self.style.SUCCESS('Rebalance complete.'))
+            return
+
+        user_id, target = options['user_id'], options['target']
+        if user_id is None or target is None:
+            raise CommandError('Give a user id and a target shard, or --pin-all / --rebalance.')
+        if target not in get_shards():
+            raise CommandError(f'Unknown shard {target!r}; choose from {", ".join(get_shards())}.')
+        source = shard_for_user(user_id)
+        moved = move_user(user_id, target, batch_size=options['batch_size'], grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} contacts of user {user_id} from {source} to {target}.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.models import Contact
+from contacts.normalization import backfill
+from contacts.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill in the normalized email and phone columns of contacts written before they existed, '
+        'in batches. Safe to stop and rerun.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', help='Shard alias to process (repeatable); default: all.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Recompute every row, e.g. after changing CONTACTS_DEFAULT_COUNTRY_CODE.',
+        )
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        aliases = options['database'] or shards
+        unknown = [alias for alias in aliases if alias not in shards]
+        if unknown:
+            raise CommandError(f'Not in CONTACT_SHARDS: {", ".join(unknown)}.')
+
+        for alias in aliases:
+            updated = 0
+            for count in backfill(
+                Contact._base_manager.using(alias), batch_size=options['batch_size'], refresh=options['refresh'],
+            ):
+                updated += count
+                self.stdout.write(f'{alias}: {updated} contacts updated...')
+            self.stdout.write(self.style.SUCCESS(f'{alias}: {updated} contacts normalized.'))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contacts.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete contact tombstones older than the sync retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'CONTACTS_TOMBSTONE_RETENTION_DAYS', 90),
+            help='Keep tombstones from the last N days.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones.'))
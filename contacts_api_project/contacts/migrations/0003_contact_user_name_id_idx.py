@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0002_contact_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'name', 'id'], name='contact_user_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:09
+
+from django.db import migrations
+
+FTS_TABLE = 'contacts_contact_fts'
+
+# Strip the usual phone punctuation so "5551234" also matches "555-1234".
+PHONE_DIGITS = (
+    "REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE("
+    "COALESCE({row}.phone, ''), '-', ''), ' ', ''), '(', ''), ')', ''), '+', ''), '.', ''), '/', '')"
+)
+
+FTS_VALUES = (
+    "{row}.id, 'u' || {row}.user_id, {row}.name, COALESCE({row}.email, ''), "
+    "COALESCE({row}.phone, ''), " + PHONE_DIGITS
+)
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "owner, name, email, phone, phone_digits, tokenize = 'unicode61 remove_diacritics 2')",
+    f"INSERT INTO {FTS_TABLE} (rowid, owner, name, email, phone, phone_digits) "
+    f"SELECT {FTS_VALUES.format(row='contacts_contact')} FROM contacts_contact",
+    f"CREATE TRIGGER contacts_contact_fts_insert AFTER INSERT ON contacts_contact BEGIN "
+    f"INSERT INTO {FTS_TABLE} (rowid, owner, name, email, phone, phone_digits) "
+    f"VALUES ({FTS_VALUES.format(row='new')}); END",
+    f"CREATE TRIGGER contacts_contact_fts_update AFTER UPDATE OF user_id, name, email, phone "
+    f"ON contacts_contact BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+    f"INSERT INTO {FTS_TABLE} (rowid, owner, name, email, phone, phone_digits) "
+    f"VALUES ({FTS_VALUES.format(row='new')}); END",
+    f"CREATE TRIGGER contacts_contact_fts_delete AFTER DELETE ON contacts_contact BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS contacts_contact_fts_insert',
+    'DROP TRIGGER IF EXISTS contacts_contact_fts_update',
+    'DROP TRIGGER IF EXISTS contacts_contact_fts_delete',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _postgres_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(SearchVector('name', 'email', 'phone', config='simple'), name='contact_search_vector_idx'),
+        GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='contact_name_trgm_idx'),
+        GinIndex(fields=['email'], opclasses=['gin_trgm_ops'], name='contact_email_trgm_idx'),
+    ]
+
+
+def _sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds load FTS5 without reporting the compile option.
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp._fts5_probe')
+        except Exception:
+            return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        if not _sqlite_has_fts5(schema_editor):
+            # contacts.search falls back to icontains lookups without the table.
+            return
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        Contact = apps.get_model('contacts', 'Contact')
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in _postgres_indexes():
+            schema_editor.add_index(Contact, index)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_BACKWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        Contact = apps.get_model('contacts', 'Contact')
+        for index in _postgres_indexes():
+            schema_editor.remove_index(Contact, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0003_contact_user_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
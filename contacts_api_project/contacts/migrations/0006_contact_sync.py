@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contacts', '0005_contactimport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contact_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='contact_user_updated_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='contacttombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contact_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='contacttombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:29
+
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+search_index = importlib.import_module('contacts.migrations.0004_contact_search_index')
+
+
+def restore_search_triggers(apps, schema_editor):
+    """SQLite rebuilds contacts_contact to drop the constraint, which drops its FTS triggers."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [search_index.FTS_TABLE],
+        )
+        if cursor.fetchone() is None:
+            return
+    for statement in search_index.SQLITE_FORWARD:
+        if statement.startswith('CREATE TRIGGER'):
+            schema_editor.execute(statement.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS', 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contacts', '0006_contact_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='contacttombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='contact_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ContactShardAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='contact_shard', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
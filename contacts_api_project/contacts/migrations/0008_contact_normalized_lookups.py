@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:11
+
+import importlib
+
+from django.db import migrations, models
+
+# SQLite rebuilds contacts_contact to add the columns, which drops its FTS triggers.
+restore_search_triggers = importlib.import_module('contacts.migrations.0007_contact_sharding').restore_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0007_contact_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'email_normalized', 'name', 'id'], name='contact_user_email_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'phone_normalized', 'name', 'id'], name='contact_user_phone_norm_idx'),
+        ),
+    ]
@@ -1,17 +1,151 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from .normalization import NORMALIZED_FIELDS, normalize_instance, with_normalized_fields
+from .sharding import ShardedQuerySet
+
+
+class ContactQuerySet(ShardedQuerySet):
+    """Keeps the normalized email/phone columns in step on bulk writes (see ``contacts.normalization``)."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            normalize_instance(obj)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if any(field in NORMALIZED_FIELDS for field in fields):
+            objs = list(objs)
+            for obj in objs:
+                normalize_instance(obj)
+            fields = with_normalized_fields(fields)
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        for field, (column, normalizer) in NORMALIZED_FIELDS.items():
+            if field in kwargs and column not in kwargs and not hasattr(kwargs[field], 'resolve_expression'):
+                kwargs[column] = normalizer(kwargs[field])
+        return super().update(**kwargs)
+
 
 class Contact(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contacts')
+    # No database constraint: contacts may live on a shard without the users table rows.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contacts', db_constraint=False,
+    )
     name = models.CharField(max_length=255)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Derived from email and phone on every write; used for exact lookups.
+    email_normalized = models.CharField(max_length=254, blank=True, null=True, editable=False)
+    phone_normalized = models.CharField(max_length=16, blank=True, null=True, editable=False)
+
+    objects = ContactQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        normalize_instance(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = with_normalized_fields(kwargs['update_fields'])
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ['name']
\ No newline at end of file
+        ordering = ['name']
+        indexes = [
+            # Serves keyset pagination: WHERE user_id = ? AND (name, id) > (?, ?).
+            models.Index(fields=['user', 'name', 'id'], name='contact_user_name_id_idx'),
+            # Serves delta sync: WHERE user_id = ? AND (updated_at, id) > (?, ?).
+            models.Index(fields=['user', 'updated_at', 'id'], name='contact_user_updated_id_idx'),
+            # Serve exact lookups, WHERE user_id = ? AND email_normalized = ?, in
+            # keyset order, so the planner has no reason to prefer the name index.
+            models.Index(fields=['user', 'email_normalized', 'name', 'id'], name='contact_user_email_norm_idx'),
+            models.Index(fields=['user', 'phone_normalized', 'name', 'id'], name='contact_user_phone_norm_idx'),
+        ]
+
+
+class ContactTombstone(models.Model):
+    """Record of a deleted contact, so sync clients can drop their copy."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contact_tombstones', db_constraint=False,
+    )
+    contact_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = ShardedQuerySet.as_manager()
+
+    def __str__(self):
+        return f'Contact {self.contact_id} deleted at {self.deleted_at}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_id_idx'),
+        ]
+
+
+class ContactImport(models.Model):
+    """A bulk import of contacts from an uploaded CSV or vCard file."""
+
+    CSV = 'csv'
+    VCARD = 'vcard'
+    FORMAT_CHOICES = [(CSV, 'CSV'), (VCARD, 'vCard')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contact_imports')
+    file = models.FileField(upload_to='imports/%Y/%m/')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=CSV)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Checkpoint: records consumed from the file and committed so far. A
+    # resumed import skips this many records before writing again.
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    bytes_total = models.PositiveBigIntegerField(default=0)
+    bytes_read = models.PositiveBigIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.get_format_display()} import #{self.pk} ({self.status})'
+
+    @property
+    def progress(self):
+        """Approximate completion in percent, based on bytes consumed."""
+        if self.status == self.COMPLETED:
+            return 100.0
+        if not self.bytes_total:
+            return 0.0
+        return round(min(self.bytes_read / self.bytes_total, 1.0) * 100, 1)
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class ContactShardAssignment(models.Model):
+    """Pins a user's contacts to a shard other than the one the hash ring picks."""
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contact_shard')
+    alias = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.alias}'
@@ -0,0 +1,164 @@
+"""
+Normalized copies of contact emails and phone numbers for exact lookups.
+
+``Contact.email`` and ``Contact.phone`` are stored as typed, so equality on
+them misses ``John@Example.com`` vs ``john@example.com`` and
+``(555) 010-0199`` vs ``+1 555 010 0199``. Each contact also keeps
+``email_normalized`` (stripped and casefolded) and ``phone_normalized``
+(E.164-style ``+<country code><number>``), both indexed per user.
+``Contact.save()`` and ``ContactQuerySet``'s ``bulk_create``,
+``bulk_update`` and ``update`` fill them in. Rows written before the
+columns existed are filled in by ``manage.py normalize_contacts``.
+
+Phone numbers written without a country code are read as national numbers
+of ``CONTACTS_DEFAULT_COUNTRY_CODE`` (a leading trunk ``0`` is dropped).
+Without a default they are kept as national digits, and
+``phone_lookup_filter`` also matches them against international queries;
+a national query is then ambiguous and raises ``AmbiguousPhoneNumber``.
+"""
+
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+_EXTENSION = re.compile(r'\s*(?:ext\.?|x|#|;|,).*$', re.IGNORECASE)
+_NON_DIGITS = re.compile(r'[^0-9]')
+# E.164 numbers have at most 15 digits.
+MAX_PHONE_DIGITS = 15
+# Country calling codes have one to three digits.
+MAX_COUNTRY_CODE_DIGITS = 3
+# Shorter digit strings are not taken as national numbers.
+MIN_NATIONAL_DIGITS = 7
+
+
+class AmbiguousPhoneNumber(ValueError):
+    """A number without a country code looked up with no ``CONTACTS_DEFAULT_COUNTRY_CODE``."""
+
+
+def normalize_email(value):
+    """Stripped, casefolded email, or ``None`` when empty."""
+
+    value = (value or '').strip().casefold()
+    return value or None
+
+
+def normalize_phone(value, country_code=None):
+    """
+    ``+<digits>`` for an international number, national digits when the country is unknown.
+
+    Extensions (``x12``, ``ext. 12``) are dropped. Returns ``None`` for
+    values without digits or with more digits than E.164 allows.
+    """
+
+    value = _EXTENSION.sub('', (value or '').strip())
+    digits = _NON_DIGITS.sub('', value)
+    if not digits:
+        return None
+    if country_code is None:
+        country_code = getattr(settings, 'CONTACTS_DEFAULT_COUNTRY_CODE', '')
+    if value.startswith('+'):
+        international = True
+    elif digits.startswith('00'):
+        digits, international = digits[2:], True
+    elif country_code:
+        if country_code == '1' and len(digits) == 11 and digits.startswith('1'):
+            # North American numbers are often written with their 1 prefix.
+            digits = digits[1:]
+        elif digits.startswith('0'):
+            digits = digits[1:]
+        digits, international = country_code + digits, True
+    else:
+        international = False
+    if not digits or len(digits) > MAX_PHONE_DIGITS:
+        return None
+    return f'+{digits}' if international else digits
+
+
+def phone_lookup_filter(value, country_code=None):
+    """
+    ``Q`` for contacts whose ``phone_normalized`` can be the number ``value``, or ``None`` if it has none.
+
+    With a default country code every stored number is international and
+    this is an exact match. Without one, numbers saved without a country
+    code are stored as national digits, so an international query also
+    matches its possible national forms (the digits after a one- to
+    three-digit country code, with or without a trunk ``0``). A national
+    query cannot say which country it is in and raises
+    ``AmbiguousPhoneNumber``.
+    """
+
+    if country_code is None:
+        country_code = getattr(settings, 'CONTACTS_DEFAULT_COUNTRY_CODE', '')
+    normalized = normalize_phone(value, country_code)
+    if normalized is None:
+        return None
+    if country_code:
+        return Q(phone_normalized=normalized)
+    if normalized.startswith('+'):
+        candidates = {normalized}
+        for length in range(1, MAX_COUNTRY_CODE_DIGITS + 1):
+            national = normalized[1 + length:]
+            if len(national) >= MIN_NATIONAL_DIGITS:
+                candidates.update((national, '0' + national))
+        return Q(phone_normalized__in=sorted(candidates))
+    raise AmbiguousPhoneNumber('Include the country code (+<country code> <number>).')
+
+
+# Source field -> (normalized column, normalizer).
+NORMALIZED_FIELDS = {
+    'email': ('email_normalized', normalize_email),
+    'phone': ('phone_normalized', normalize_phone),
+}
+
+
+def normalize_instance(contact):
+    for field, (column, normalizer) in NORMALIZED_FIELDS.items():
+        setattr(contact, column, normalizer(getattr(contact, field)))
+
+
+def with_normalized_fields(fields):
+    """``fields`` plus the normalized columns derived from any of them."""
+
+    fields = list(fields)
+    for field, (column, _) in NORMALIZED_FIELDS.items():
+        if field in fields and column not in fields:
+            fields.append(column)
+    return fields
+
+
+def stale_filter():
+    """Rows with an email or phone but no normalized copy of it."""
+
+    return (
+        Q(email__isnull=False, email_normalized__isnull=True) & ~Q(email='')
+    ) | (
+        Q(phone__isnull=False, phone_normalized__isnull=True) & ~Q(phone='')
+    )
+
+
+def backfill(queryset, batch_size=1000, refresh=False):
+    """
+    Fill in the normalized columns of ``queryset``'s rows in id order.
+
+    Only rows missing a value are touched unless ``refresh`` is set (after
+    changing ``CONTACTS_DEFAULT_COUNTRY_CODE``, say). Each batch is its own
+    ``bulk_update``, so the command can be stopped and rerun. Yields the
+    number of rows updated per batch.
+    """
+
+    if not refresh:
+        queryset = queryset.filter(stale_filter())
+    last = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last).order_by('id').only('id', 'email', 'phone')[:batch_size])
+        if not batch:
+            return
+        for contact in batch:
+            normalize_instance(contact)
+        # bulk_update() leaves updated_at alone, so sync clients see no change.
+        queryset.model._base_manager.using(queryset.db).bulk_update(
+            batch, [column for column, _ in NORMALIZED_FIELDS.values()],
+        )
+        last = batch[-1].id
+        yield len(batch)
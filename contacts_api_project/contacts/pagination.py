@@ -0,0 +1,166 @@
+import base64
+import json
+import operator
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import SEARCH_RANK
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on a compound, unique ordering.
+
+    Unlike DRF's ``CursorPagination`` (which keys on the first ordering field
+    and falls back to an OFFSET for ties), every field of ``ordering`` is
+    encoded in the cursor, so the next page is fetched with a plain
+    ``(a, b) > (x, y)`` predicate that an index on the same columns can
+    satisfy. Page 1000 costs the same as page one.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    # The last field must be unique so that the ordering is total.
+    ordering = ('name', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        position, self.reverse = self.decode_cursor(request)
+        order_by = self.ordering
+        if self.reverse:
+            order_by = [self._invert(field) for field in self.ordering]
+        queryset = queryset.order_by(*order_by)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.seek_filter(position, self.reverse))
+            except (TypeError, ValueError, ValidationError):
+                # A tampered cursor: values of the wrong type for the ordering fields.
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        if self.reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.first_position = self.get_position(rows[0]) if rows else position
+        self.last_position = self.get_position(rows[-1]) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                return self.page_size
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(self.ordering)
+
+    def seek_filter(self, position, reverse=False):
+        """Build ``(f1, f2, ...) > (v1, v2, ...)`` as an OR of prefix equalities."""
+
+        clauses = []
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            ascending = not field.startswith('-')
+            lookup = 'gt' if ascending != reverse else 'lt'
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': value}))
+            equal[name] = value
+        return reduce(operator.or_, clauses)
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_position is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class ContactCursorPagination(KeysetPagination):
+    """Keyset pagination for contacts, backed by the ``(user, name, id)`` index."""
+
+    ordering = ('name', 'id')
+    search_ordering = (f'-{SEARCH_RANK}', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        # Ranked search results page by relevance rather than by name.
+        if SEARCH_RANK in queryset.query.annotations:
+            return self.search_ordering
+        return super().get_ordering(request, queryset, view)
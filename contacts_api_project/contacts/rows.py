@@ -0,0 +1,133 @@
+"""
+A fast read path for list endpoints.
+
+``ModelSerializer(many=True)`` builds a model instance per row and then runs
+every DRF field's ``get_attribute``/``to_representation`` on it. For plain
+column fields that work is redundant: ``RowSerializer`` is compiled once per
+serializer class into ``(key, column, converter)`` triples and turns
+``values()`` rows straight into the same dicts, in the same key order, with
+the same values. Fields that are not a single model column (method fields,
+dotted sources, nested serializers, hyperlinks) make the serializer
+unsupported, and ``ValuesListMixin`` then falls back to the regular path.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from contacts_api.projection import FieldProjectionMixin
+
+from .pagination import KeysetPagination
+
+# DRF fields whose ``to_representation`` returns database values unchanged
+# (``str(value)``/``int(value)``), so no converter needs to run.
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField)
+
+_compiled = {}
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def _compile_field(model, field):
+    if field.source == '*' or '.' in field.source:
+        raise UnsupportedField(field.field_name)
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        raise UnsupportedField(field.field_name)
+    if model_field.is_relation:
+        if not (model_field.many_to_one and type(field) is serializers.PrimaryKeyRelatedField
+                and field.pk_field is None):
+            raise UnsupportedField(field.field_name)
+        return model_field.attname, None
+    if not model_field.concrete:
+        raise UnsupportedField(field.field_name)
+    converter = None if isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation
+    return model_field.attname, converter
+
+
+class RowSerializer:
+    """Serializes ``values()`` rows exactly as ``serializer_class`` serializes instances."""
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.fields = []
+        for field in serializer._readable_fields:
+            column, converter = _compile_field(model, field)
+            self.fields.append((field.field_name, column, converter))
+        self._finish()
+
+    def _finish(self):
+        self.columns = list(dict.fromkeys(column for _, column, _ in self.fields))
+        self.passthrough = all(converter is None for _, _, converter in self.fields)
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        """The compiled ``RowSerializer`` for ``serializer_class``, or ``None`` if unsupported."""
+
+        if serializer_class not in _compiled:
+            try:
+                _compiled[serializer_class] = cls(serializer_class)
+            except UnsupportedField:
+                _compiled[serializer_class] = None
+        return _compiled[serializer_class]
+
+    def project(self, names):
+        """A copy that only outputs (and only needs the columns for) ``names``."""
+
+        projected = object.__new__(type(self))
+        projected.fields = [field for field in self.fields if field[0] in names]
+        projected._finish()
+        return projected
+
+    def to_representation(self, rows):
+        if self.passthrough:
+            pairs = [(key, column) for key, column, _ in self.fields]
+            return [{key: row[column] for key, column in pairs} for row in rows]
+        fields = self.fields
+        return [
+            {
+                key: value if converter is None or value is None else converter(value)
+                for key, column, converter in fields
+                for value in (row[column],)
+            }
+            for row in rows
+        ]
+
+
+class ValuesListMixin:
+    """
+    Serve ``list`` from ``values()`` rows through a ``RowSerializer``.
+
+    Only the serialized columns (narrowed further by ``?fields=`` on a
+    ``FieldProjectionMixin`` view) are fetched, plus whatever a
+    ``KeysetPagination`` ordering needs for its cursors (``search_rank``
+    for ranked searches).
+    """
+
+    def list(self, request, *args, **kwargs):
+        rows = RowSerializer.for_serializer(self.get_serializer_class())
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        if isinstance(self, FieldProjectionMixin) and self.projected_fields() is not None:
+            rows = rows.project(self.projected_fields())
+
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = select_rows(rows, queryset, self.paginator, request, self)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
+
+
+def select_rows(rows, queryset, paginator=None, request=None, view=None):
+    """``queryset.values()`` for ``rows``' columns and the columns a keyset ``paginator`` orders on."""
+
+    columns = list(rows.columns)
+    if isinstance(paginator, KeysetPagination):
+        ordering = paginator.get_ordering(request, queryset, view)
+        columns += [field.lstrip('-') for field in ordering if field.lstrip('-') not in columns]
+    return queryset.values(*columns)
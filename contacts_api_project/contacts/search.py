@@ -0,0 +1,148 @@
+"""
+Indexed full-text search over a user's contacts.
+
+``ContactSearchFilter`` replaces DRF's ``SearchFilter`` on the contact API.
+Instead of OR-ing ``icontains`` lookups (a ``LIKE '%x%'`` scan over every
+row the user owns) it asks a per-database search backend to match the
+query against an index and annotate each hit with ``search_rank``, where a
+higher rank is a better match.
+
+* SQLite uses the ``contacts_contact_fts`` FTS5 table. Migration 0004 creates
+  it together with the triggers that keep it in sync with
+  ``contacts_contact``, so ``bulk_create``/``update()`` stay covered too.
+* PostgreSQL uses a GIN-indexed ``tsvector`` expression plus ``pg_trgm``
+  similarity on names and emails.
+* Any other database (or SQLite built without FTS5) falls back to the plain
+  ``SearchFilter`` behaviour.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Greatest
+from rest_framework import filters
+
+SEARCH_RANK = 'search_rank'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_backends = {}
+
+
+class BaseSearchBackend:
+    """Interface shared by the database-specific search backends."""
+
+    def search(self, queryset, query, user_id=None):
+        """Filter ``queryset`` to matches of ``query`` and annotate ``search_rank``."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Prefix token search against the FTS5 shadow table."""
+
+    table = 'contacts_contact_fts'
+    # bm25 column weights: owner, name, email, phone, phone_digits.
+    weights = (0.0, 10.0, 5.0, 2.0, 2.0)
+
+    def match_expression(self, query, user_id=None):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = ' AND '.join(f'"{token}"*' for token in tokens)
+        expression = f'{{name email phone phone_digits}} : ({terms})'
+        if user_id is not None:
+            # Restricting on the owner token keeps the match inside the FTS
+            # index instead of intersecting with every user's hits.
+            expression = f'owner : "u{int(user_id)}" AND {expression}'
+        return expression
+
+    def search(self, queryset, query, user_id=None):
+        expression = self.match_expression(query, user_id)
+        if expression is None:
+            return queryset.none()
+        table = self.table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        model_table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f'SELECT -bm25({table}, {weights}) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = "{model_table}"."id"',
+            [expression],
+            output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+        return queryset.filter(id__in=matches).annotate(**{SEARCH_RANK: rank})
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """``tsvector`` ranking with trigram similarity for typo-tolerant matches."""
+
+    config = 'simple'
+
+    def __init__(self):
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.db.models import CharField
+
+        # Normally registered by django.contrib.postgres' AppConfig, which
+        # would require psycopg2 to be importable on SQLite deployments too.
+        CharField.register_lookup(TrigramSimilar)
+
+    def search(self, queryset, query, user_id=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+        query = query.strip()
+        if not query:
+            return queryset.none()
+        # Must stay identical to the expression indexed in migration 0004.
+        vector = SearchVector('name', 'email', 'phone', config=self.config)
+        search_query = SearchQuery(query, config=self.config)
+        queryset = queryset.annotate(_search_vector=vector).filter(
+            Q(_search_vector=search_query)
+            | Q(name__trigram_similar=query)
+            | Q(email__trigram_similar=query)
+        )
+        # Cast to double precision so ranks survive the round trip through
+        # pagination cursors without float4 rounding.
+        rank = Cast(
+            Greatest(SearchRank(vector, search_query), TrigramSimilarity('name', query)),
+            FloatField(),
+        )
+        return queryset.annotate(**{SEARCH_RANK: rank})
+
+
+def _sqlite_has_fts_table(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [SQLiteFTSBackend.table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_search_backend(using='default'):
+    """Return the search backend for a database alias, or ``None`` if unsupported."""
+
+    if using not in _backends:
+        connection = connections[using]
+        backend = None
+        if connection.vendor == 'sqlite' and _sqlite_has_fts_table(connection):
+            backend = SQLiteFTSBackend()
+        elif connection.vendor == 'postgresql':
+            backend = PostgresSearchBackend()
+        _backends[using] = backend
+    return _backends[using]
+
+
+class ContactSearchFilter(filters.SearchFilter):
+    """``?search=`` filter that uses the indexed backend and ranks results."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        user_id = request.user.pk if request.user.is_authenticated else None
+        return backend.search(queryset, ' '.join(terms), user_id=user_id)
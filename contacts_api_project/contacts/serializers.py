@@ -1,13 +1,70 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import Contact
+from .models import Contact, ContactImport
+from .sharding import db_for_user, fetch_inserted_pks
+
+
+class ContactListSerializer(serializers.ListSerializer):
+    """Writes many contacts with batched ``bulk_create`` instead of one INSERT each."""
+
+    def create(self, validated_data):
+        batch_size = getattr(settings, 'CONTACTS_BULK_BATCH_SIZE', 500)
+        contacts = [self.child.Meta.model(**attrs) for attrs in validated_data]
+        if not contacts:
+            return []
+        # Every item belongs to the requesting user, so one shard takes them all.
+        user_id = contacts[0].user_id
+        objects = self.child.Meta.model.objects.for_user(user_id)
+        alias = db_for_user(user_id)
+        with transaction.atomic(using=alias):
+            for start in range(0, len(contacts), batch_size):
+                batch = objects.bulk_create(contacts[start:start + batch_size])
+                if batch[0].pk is None:
+                    fetch_inserted_pks(batch, alias)
+        return contacts
+
+    @property
+    def item_errors(self):
+        """Validation errors as ``[{'index': i, 'errors': {...}}]`` for the invalid items only."""
+        return [
+            {'index': index, 'errors': errors}
+            for index, errors in enumerate(self.errors)
+            if errors
+        ]
+
 
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ['id', 'user', 'name', 'email', 'phone', 'address']  # Add any other fields as necessary
+        read_only_fields = ['user']  # Always the requesting user, set by the view
+        list_serializer_class = ContactListSerializer
+
+    def create(self, validated_data):
+        return Contact.objects.for_user(validated_data['user_id']).create(**validated_data)
 
 class ContactUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ['name', 'email', 'phone', 'address']  # Fields that can be updated, excluding user field
-        read_only_fields = ['user']  # Ensure user field is read-only during updates
\ No newline at end of file
+        read_only_fields = ['user']  # Ensure user field is read-only during updates
+
+
+class ContactImportSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ContactImport
+        fields = [
+            'id', 'file', 'format', 'status', 'progress', 'rows_processed', 'rows_imported',
+            'rows_failed', 'errors', 'last_error', 'created_at', 'updated_at',
+        ]
+        read_only_fields = [
+            'status', 'rows_processed', 'rows_imported', 'rows_failed', 'errors',
+            'last_error', 'created_at', 'updated_at',
+        ]
+        extra_kwargs = {
+            'file': {'write_only': True},
+            'format': {'required': False},
+        }
\ No newline at end of file
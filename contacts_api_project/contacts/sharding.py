@@ -0,0 +1,370 @@
+"""
+Horizontal sharding of contact data by owning user.
+
+``CONTACT_SHARDS`` lists the database aliases holding contacts; the first is
+always ``default``. Each user's ``Contact`` and ``ContactTombstone`` rows live
+on exactly one shard. The shard is chosen by a consistent hash ring over the
+user id, unless a ``ContactShardAssignment`` row overrides it. Moved users
+get an override, so adding a shard only relocates the users the operator
+decides to move.
+
+Queries opt in through ``Contact.objects.for_user(user_id)``, which tags the
+queryset with the user id for ``ShardRouter``. Saved instances are routed by
+their ``user_id``. Users on ``default`` are left to the next router, so read
+replicas keep working for them. Lookups are cached in the shared cache, so
+sharded deployments need a cache that every process can see.
+
+Each non-default shard hands out ids from its own range
+(``CONTACT_SHARD_ID_STRIDE`` apart), so new ids are unique across shards.
+``move_user`` therefore gives the rows it copies new ids from the target's
+range: keeping them would put ids from another shard's range into the
+target table, and SQLite's ``AUTOINCREMENT`` would continue from there. The
+old contact ids get tombstones, so sync clients replace their copies.
+"""
+
+import bisect
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .caching import bump_generation
+
+logger = logging.getLogger(__name__)
+
+SHARD_KEY = 'contacts:shard:{user_id}'
+MOVING_KEY = 'contacts:shard-moving:{user_id}'
+SHARDED_MODELS = ('contacts.contact', 'contacts.contacttombstone')
+# Rows changed this long before a move started are re-copied in its final
+# pass, to cover writes that committed while the bulk copy was running.
+MOVE_CLOCK_MARGIN = timedelta(seconds=5)
+
+
+class ShardMoveInProgress(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your contacts are being moved. Please retry in a few seconds.'
+    default_code = 'shard_move_in_progress'
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring with ``points`` virtual nodes per shard."""
+
+    def __init__(self, nodes, points=128):
+        ring = sorted((_hash(f'{node}#{index}'), node) for node in nodes for index in range(points))
+        self._keys = [key for key, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def get(self, key):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+
+@lru_cache(maxsize=8)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def get_shards():
+    return list(getattr(settings, 'CONTACT_SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def ring_shard(user_id, shards=None):
+    """The shard the hash ring places ``user_id`` on, ignoring overrides."""
+
+    return _ring(tuple(shards or get_shards())).get(user_id)
+
+
+def _assignments():
+    return apps.get_model('contacts', 'ContactShardAssignment').objects.using(DEFAULT_DB_ALIAS)
+
+
+def shard_for_user(user_id):
+    """Return the database alias holding ``user_id``'s contacts."""
+
+    shards = get_shards()
+    if len(shards) == 1:
+        return shards[0]
+    key = SHARD_KEY.format(user_id=user_id)
+    alias = cache.get(key)
+    if alias not in shards:
+        alias = _assignments().filter(user_id=user_id).values_list('alias', flat=True).first()
+        if alias not in shards:
+            alias = ring_shard(user_id, shards)
+        cache.set(key, alias, None)
+    return alias
+
+
+def set_shard_override(user_id, alias):
+    """Pin ``user_id`` to ``alias``; an override matching the ring is dropped."""
+
+    if alias == ring_shard(user_id):
+        _assignments().filter(user_id=user_id).delete()
+    else:
+        _assignments().update_or_create(user_id=user_id, defaults={'alias': alias})
+    cache.set(SHARD_KEY.format(user_id=user_id), alias, None)
+
+
+def db_for_user(user_id):
+    """Alias that writes to ``user_id``'s contacts go to."""
+
+    return router.db_for_write(apps.get_model('contacts', 'Contact'), user_id=user_id)
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    Queries without ``for_user()`` go to ``default`` (or a replica), whatever
+    shard holds the rows, and so do ``bulk_create``, ``update`` and
+    ``delete`` on them. ``create()`` is routed by its ``user``/``user_id``.
+    """
+
+    def for_user(self, user_id):
+        """Restrict to ``user_id``'s rows and route the query to their shard."""
+        queryset = self.filter(user_id=user_id)
+        queryset._hints = dict(queryset._hints, user_id=user_id)
+        return queryset
+
+    def create(self, **kwargs):
+        if self._db is None and 'user_id' not in self._hints:
+            user_id = kwargs['user'].pk if kwargs.get('user') is not None else kwargs.get('user_id')
+            if user_id is not None:
+                return self.for_user(user_id).create(**kwargs)
+        return super().create(**kwargs)
+
+
+class ShardRouter:
+    """Route sharded models to the owning user's shard."""
+
+    def _shard(self, model, hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        user_id = hints.get('user_id')
+        instance = hints.get('instance')
+        if user_id is None and isinstance(instance, model):
+            user_id = instance.user_id
+        if user_id is None:
+            return None
+        return user_id, shard_for_user(user_id)
+
+    def db_for_read(self, model, **hints):
+        shard = self._shard(model, hints)
+        if shard is None or shard[1] == DEFAULT_DB_ALIAS:
+            return None
+        return shard[1]
+
+    def db_for_write(self, model, **hints):
+        shard = self._shard(model, hints)
+        if shard is None:
+            return None
+        user_id, alias = shard
+        if len(get_shards()) > 1 and cache.get(MOVING_KEY.format(user_id=user_id)):
+            raise ShardMoveInProgress()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels & set(SHARDED_MODELS) and settings.AUTH_USER_MODEL.lower() in labels:
+            return True
+        return None
+
+
+def seed_id_range(using, **kwargs):
+    """``post_migrate`` hook: start a shard's id sequences at its own offset."""
+
+    shards = get_shards()
+    if using not in shards or shards.index(using) == 0:
+        return
+    offset = shards.index(using) * getattr(settings, 'CONTACT_SHARD_ID_STRIDE', 10 ** 12)
+    connection = connections[using]
+    for label in SHARDED_MODELS:
+        table = apps.get_model(label)._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, offset - 1])
+                elif row[0] < offset - 1:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [offset - 1, table])
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f'SELECT last_value FROM {sequence}')
+                if cursor.fetchone()[0] < offset:
+                    cursor.execute('SELECT setval(%s, %s, false)', [sequence, offset])
+            else:
+                logger.warning('Cannot seed id range for %s on %s; ids may collide across shards.', table, using)
+
+
+def _created_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+
+
+def fetch_inserted_pks(objs, alias):
+    """Set the pks of rows just bulk-inserted on a backend that cannot return them (SQLite)."""
+
+    # The open transaction holds the database's write lock, so the batch's
+    # rows are the newest in the table, numbered in insertion order.
+    model = type(objs[0])
+    pks = list(model._base_manager.using(alias).order_by('-pk').values_list('pk', flat=True)[:len(objs)])
+    for obj, pk in zip(objs, reversed(pks)):
+        obj.pk = pk
+
+
+def _replace_rows(model, rows, target, user_id, ids):
+    """
+    Write ``user_id``'s ``rows`` (``values()`` dicts) to ``target``, keeping their creation times.
+
+    ``ids`` maps source ids to target ids. Rows copied before are
+    overwritten in place; the others are inserted with ids from the target's
+    range and added to ``ids``. ``auto_now`` fields are left at the copy
+    time, so sync clients pick the rows up under their new ids.
+    """
+
+    if not rows:
+        return
+    manager = model._base_manager.db_manager(target)
+    with transaction.atomic(using=target):
+        recopied = [model(**dict(row, id=ids[row['id']])) for row in rows if row['id'] in ids]
+        if recopied:
+            manager.filter(user_id=user_id, pk__in=[obj.pk for obj in recopied]).delete()
+            manager.bulk_create(recopied)
+        fresh_rows = [row for row in rows if row['id'] not in ids]
+        fresh = [model(**dict(row, id=None)) for row in fresh_rows]
+        if fresh:
+            manager.bulk_create(fresh)
+            if fresh[0].pk is None:
+                fetch_inserted_pks(fresh, target)
+            ids.update((row['id'], obj.pk) for row, obj in zip(fresh_rows, fresh))
+        timestamps = _created_fields(model)
+        if timestamps:
+            # bulk_create() applies auto_now_add; put the originals back.
+            created = {ids[row['id']]: row for row in rows}
+            objs = [model(pk=pk, **{name: created[pk][name] for name in timestamps}) for pk in created]
+            manager.bulk_update(objs, timestamps)
+
+
+def _copy(model, queryset, target, batch_size, user_id, ids):
+    copied, last = 0, None
+    while True:
+        page = queryset.order_by('id')
+        if last is not None:
+            page = page.filter(id__gt=last)
+        rows = list(page.values()[:batch_size])
+        if not rows:
+            return copied
+        _replace_rows(model, rows, target, user_id, ids)
+        copied += len(rows)
+        last = rows[-1]['id']
+
+
+def move_user(user_id, target, batch_size=500, grace=1.0):
+    """
+    Move ``user_id``'s contacts and tombstones to the ``target`` shard online.
+
+    Rows are bulk-copied while the user keeps working. Then writes are paused
+    for ``grace`` seconds plus a final catch-up copy, the user is switched to
+    ``target``, and the source rows are removed. Moved contacts get new ids
+    and their old ids get tombstones. Returns the number of contacts moved.
+    """
+
+    contact_model = apps.get_model('contacts', 'Contact')
+    tombstone_model = apps.get_model('contacts', 'ContactTombstone')
+    if target not in get_shards():
+        raise ValueError(f'{target!r} is not in CONTACT_SHARDS.')
+    source = shard_for_user(user_id)
+    if source == target:
+        return 0
+
+    contacts = contact_model._base_manager.using(source).filter(user_id=user_id)
+    tombstones = tombstone_model._base_manager.using(source).filter(user_id=user_id)
+    started = timezone.now() - MOVE_CLOCK_MARGIN
+    # Source id -> target id, per model.
+    contact_ids, tombstone_ids = {}, {}
+    _copy(contact_model, contacts, target, batch_size, user_id, contact_ids)
+    _copy(tombstone_model, tombstones, target, batch_size, user_id, tombstone_ids)
+
+    moving_key = MOVING_KEY.format(user_id=user_id)
+    cache.set(moving_key, True, 300)
+    try:
+        # Let requests that were routed before the pause finish their writes.
+        time.sleep(grace)
+        _copy(contact_model, contacts.filter(updated_at__gte=started), target, batch_size, user_id, contact_ids)
+        recent = tombstones.filter(deleted_at__gte=started)
+        _copy(tombstone_model, recent, target, batch_size, user_id, tombstone_ids)
+        deleted = set(recent.values_list('contact_id', flat=True))
+        contact_model._base_manager.using(target).filter(
+            user_id=user_id, id__in=[contact_ids[pk] for pk in deleted if pk in contact_ids],
+        ).delete()
+        now = timezone.now()
+        tombstone_model._base_manager.db_manager(target).bulk_create(
+            [
+                tombstone_model(user_id=user_id, contact_id=pk, deleted_at=now)
+                for pk in contact_ids if pk not in deleted
+            ],
+            batch_size=batch_size,
+        )
+        moved = contact_model._base_manager.using(target).filter(user_id=user_id).count()
+        set_shard_override(user_id, target)
+    finally:
+        cache.delete(moving_key)
+
+    with transaction.atomic(using=source):
+        tombstones.delete()
+        contacts.delete()
+    bump_generation(user_id)
+    return moved
+
+
+def pin_users(previous_shards):
+    """
+    Record overrides for users the current ring would place elsewhere than
+    ``previous_shards`` did. Run before changing ``CONTACT_SHARDS`` so no data
+    is stranded; returns the number of users pinned.
+    """
+
+    model = apps.get_model('contacts', 'ContactShardAssignment')
+    users = apps.get_model(settings.AUTH_USER_MODEL)._base_manager.using(DEFAULT_DB_ALIAS)
+    pinned = set(_assignments().values_list('user_id', flat=True))
+    overrides = []
+    for user_id in users.values_list('pk', flat=True).iterator():
+        if user_id in pinned:
+            continue
+        alias = ring_shard(user_id, previous_shards)
+        if alias != ring_shard(user_id):
+            overrides.append(model(user_id=user_id, alias=alias))
+    _assignments().bulk_create(overrides, batch_size=500)
+    for override in overrides:
+        cache.set(SHARD_KEY.format(user_id=override.user_id), override.alias, None)
+    return len(overrides)
+
+
+def rebalance(batch_size=500, grace=1.0):
+    """Move every pinned user whose ring shard differs; yields ``(user_id, target, moved)``."""
+
+    for user_id, alias in list(_assignments().values_list('user_id', 'alias')):
+        target = ring_shard(user_id)
+        if alias != target:
+            yield user_id, target, move_user(user_id, target, batch_size=batch_size, grace=grace)
+
+
+def delete_user_rows(user_id):
+    """Remove a user's sharded rows that database cascades cannot reach."""
+
+    alias = shard_for_user(user_id)
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    for label in SHARDED_MODELS:
+        apps.get_model(label)._base_manager.using(alias).filter(user_id=user_id).delete()
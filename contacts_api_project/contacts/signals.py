@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_generation
+from .models import Contact
+from .sharding import delete_user_rows
+
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+def invalidate_contact_caches(sender, instance, using, **kwargs):
+    """Bump the owner's cache generation whenever one of their contacts changes."""
+
+    bump_generation(instance.user_id, using=using)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_contacts(sender, instance, **kwargs):
+    """Cascade a user's deletion to contacts kept on another shard."""
+
+    delete_user_rows(instance.pk)
@@ -0,0 +1,146 @@
+"""
+Delta sync for mobile clients.
+
+A sync cursor holds two keyset positions: ``(updated_at, id)`` of the last
+changed contact the client has seen and ``(deleted_at, id)`` of the last
+tombstone. Each request returns what changed after those positions, so the
+cost of a sync follows the churn since the previous one rather than the size
+of the address book.
+
+Rows committed slightly out of timestamp order could slip behind a cursor,
+so the final page of a sync never advances past ``now - CONTACTS_SYNC_LAG``;
+the next sync may resend a few rows, which clients apply idempotently.
+"""
+
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ContactTombstone
+from .sharding import get_shards
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorExpired(ValueError):
+    """The cursor predates the oldest retained tombstone; a full resync is needed."""
+
+
+def delete_contacts(queryset):
+    """Delete the contacts in ``queryset``, leaving a tombstone for each."""
+
+    with transaction.atomic(using=queryset.db):
+        rows = list(queryset.values_list('id', 'user_id'))
+        if not rows:
+            return 0
+        now = timezone.now()
+        ContactTombstone.objects.using(queryset.db).bulk_create(
+            [ContactTombstone(user_id=user_id, contact_id=pk, deleted_at=now) for pk, user_id in rows],
+            batch_size=getattr(settings, 'CONTACTS_BULK_BATCH_SIZE', 500),
+        )
+        queryset.model.objects.using(queryset.db).filter(id__in=[pk for pk, _ in rows]).delete()
+    return len(rows)
+
+
+def encode_cursor(changed, deleted):
+    payload = {
+        'c': [changed[0].isoformat(), changed[1]] if changed else None,
+        'd': [deleted[0].isoformat(), deleted[1]] if deleted else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(value):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+        return tuple(_decode_position(payload.get(key)) for key in ('c', 'd'))
+    except (TypeError, ValueError, AttributeError, UnicodeEncodeError):
+        raise InvalidCursor('Invalid sync cursor.')
+
+
+def _decode_position(position):
+    if position is None:
+        return None
+    timestamp, pk = position
+    parsed = parse_datetime(timestamp)
+    if parsed is None or not isinstance(pk, int):
+        raise ValueError(timestamp)
+    return parsed, pk
+
+
+def _page(queryset, time_field, position, limit):
+    queryset = queryset.order_by(time_field, 'id')
+    if position is not None:
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__gt': timestamp}) | Q(**{time_field: timestamp, 'id__gt': pk})
+        )
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def _advance(position, rows, time_field, has_more, horizon):
+    if rows:
+        last = rows[-1]
+        position = (getattr(last, time_field), last.pk)
+    if not has_more and (position is None or position[0] > horizon):
+        # Final page: stay behind the lag window (see module docstring).
+        position = (horizon, 0)
+    return position
+
+
+def changes_since(contacts, user_id, cursor=None, limit=500):
+    """
+    Return the contacts changed and deleted since ``cursor``.
+
+    ``contacts`` is the user's contact queryset. The result is a dict with the
+    ``changed`` contacts, ``deleted`` contact ids, the ``cursor`` to send next
+    time and ``has_more`` when another page is waiting.
+    """
+
+    lag = timedelta(seconds=getattr(settings, 'CONTACTS_SYNC_LAG', 2))
+    horizon = timezone.now() - lag
+    tombstones = ContactTombstone.objects.for_user(user_id)
+
+    if cursor:
+        changed_position, deleted_position = decode_cursor(cursor)
+        retention = getattr(settings, 'CONTACTS_TOMBSTONE_RETENTION_DAYS', None)
+        if retention and deleted_position is not None:
+            if deleted_position[0] < timezone.now() - timedelta(days=retention):
+                raise CursorExpired('This sync cursor is too old; perform a full sync.')
+    else:
+        # A full sync returns every live contact, so past deletions are moot.
+        changed_position, deleted_position = None, (horizon, 0)
+
+    changed, more_changed = _page(contacts, 'updated_at', changed_position, limit)
+    deleted, more_deleted = _page(tombstones, 'deleted_at', deleted_position, limit)
+
+    next_cursor = encode_cursor(
+        _advance(changed_position, changed, 'updated_at', more_changed, horizon),
+        _advance(deleted_position, deleted, 'deleted_at', more_deleted, horizon),
+    )
+    return {
+        'changed': changed,
+        'deleted': [tombstone.contact_id for tombstone in deleted],
+        'cursor': next_cursor,
+        'has_more': more_changed or more_deleted,
+    }
+
+
+def prune_tombstones(days):
+    """Delete tombstones older than ``days``; returns the number removed."""
+
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    for alias in get_shards():
+        count, _ = ContactTombstone.objects.using(alias).filter(deleted_at__lt=cutoff).delete()
+        deleted += count
+    return deleted
@@ -1,7 +1,46 @@
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from urllib.parse import urlencode
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Contact
+from django.utils.module_loading import import_string
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from benchmarks.datagen import generate
+from benchmarks.run import compare, run_benchmarks
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.serialization import measure
+from contacts_api import db_routing, metrics
+from contacts_api.db_routing import choose_replica
+from contacts_api.renderers import FastJSONRenderer
+from contacts_api.sqlite_backend.base import DatabaseWrapper
+from users.authentication import ClaimsRefreshToken
+from . import async_views, caching, dedup, importers, normalization, sharding, sync
+from .importers import guess_format, run_import
+from .models import Contact, ContactImport, ContactShardAssignment, ContactTombstone
+from .rows import RowSerializer
+from .serializers import ContactSerializer
+from .sharding import HashRing, ShardRouter, move_user, pin_users, ring_shard, set_shard_override, shard_for_user
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -57,4 +96,1259 @@ class ContactTests(APITestCase):
         url = reverse('contact-list') + '?search=John'
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data), 1)
+
+class ContactPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='testpass')
+        self.client.force_authenticate(self.user)
+        # Duplicate names exercise the id tie-breaker.
+        for name in ['Alice', 'Bob', 'Bob', 'Bob', 'Carol', 'Dave', 'Eve']:
+            Contact.objects.create(user=self.user, name=name)
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_cursor_walk_returns_every_contact_once_in_order(self):
+        expected = list(Contact.objects.filter(user=self.user).order_by('name', 'id').values_list('id', flat=True))
+        seen = self._walk(reverse('contact-api-list') + '?page_size=2')
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(reverse('contact-api-list') + '?page_size=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']],
+        )
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('contact-api-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_is_rejected(self):
+        for payload in ({'p': ['N1', 'abc'], 'r': 1}, {'p': [None, None]}, {'p': ['Bob', [1]]}):
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+            response = self.client.get(reverse('contact-api-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, payload)
+
+
+class ContactSearchTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.john = Contact.objects.create(user=self.user, name='John Doe', email='jd@example.com', phone='555-123-4567')
+        self.johanna = Contact.objects.create(user=self.user, name='Johanna Smith', email='john@other.org')
+        Contact.objects.create(user=self.user, name='Mary Major', email='mary@example.com')
+        other = User.objects.create_user(username='other', password='testpass')
+        Contact.objects.create(user=other, name='John Other')
+
+    def _search(self, term):
+        response = self.client.get(reverse('contact-api-list'), {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_prefix_search_is_scoped_to_the_user(self):
+        self.assertEqual(sorted(self._search('joh')), sorted([self.john.id, self.johanna.id]))
+
+    def test_name_matches_rank_above_email_matches(self):
+        self.assertEqual(self._search('john')[0], self.john.id)
+
+    def test_phone_digits_match_regardless_of_punctuation(self):
+        self.assertEqual(self._search('5551234'), [self.john.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.john.name = 'Jonathan Doe'
+        self.john.save()
+        self.assertEqual(self._search('jonathan'), [self.john.id])
+        self.john.delete()
+        self.assertEqual(self._search('jonathan'), [])
+
+    def test_ranked_results_paginate_without_gaps(self):
+        ranked = self._search('joh')
+        url = reverse('contact-api-list') + '?search=joh&page_size=1'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, ranked)
+
+    def test_name_filter_matches_substrings(self):
+        response = self.client.get(reverse('contact-api-list'), {'name': 'OH'})
+        self.assertEqual(sorted(item['id'] for item in response.data['results']), sorted([self.john.id, self.johanna.id]))
+
+
+class ContactAutocompleteTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='typer', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.jose = Contact.objects.create(user=self.user, name='José Álvarez', email='jose@example.com')
+        self.joan = Contact.objects.create(user=self.user, name='Joan Baez', email='baez@music.org')
+        Contact.objects.create(user=self.user, name='Mary Major')
+        self.url = reverse('contact-api-autocomplete')
+
+    def _complete(self, prefix, **params):
+        response = self.client.get(self.url, {'q': prefix, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_matches_name_and_email_token_prefixes(self):
+        self.assertEqual({item['id'] for item in self._complete('jo')}, {self.jose.id, self.joan.id})
+        self.assertEqual([item['id'] for item in self._complete('music')], [self.joan.id])
+
+    def test_matching_ignores_case_and_accents(self):
+        self.assertEqual(self._complete('ALVA'), [{'id': self.jose.id, 'name': 'José Álvarez', 'email': 'jose@example.com'}])
+
+    def test_limit_caps_results(self):
+        self.assertEqual(len(self._complete('jo', limit=1)), 1)
+
+    def test_index_is_invalidated_on_save_and_delete(self):
+        self.assertEqual(self._complete('zed'), [])
+        zed = Contact.objects.create(user=self.user, name='Zed Shaw')
+        self.assertEqual([item['id'] for item in self._complete('zed')], [zed.id])
+        zed.delete()
+        self.assertEqual(self._complete('zed'), [])
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_writes_from_other_workers_are_seen_without_a_shared_cache(self):
+        self.assertEqual(self._complete('zed'), [])
+        # update() sends no signal: like a write on a worker whose generation bump this cache never sees.
+        Contact.objects.filter(pk=self.joan.pk).update(name='Zed Shaw')
+        self.assertEqual([item['id'] for item in self._complete('zed')], [self.joan.id])
+
+
+class ContactBulkTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulker', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('contact-api-bulk')
+
+    def test_bulk_create_uses_batched_inserts(self):
+        payload = [{'name': f'Contact {i}', 'email': f'c{i}@example.com'} for i in range(1200)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # A handful of multi-row INSERTs (SQLite caps parameters per statement), not 1200.
+        self.assertLess(len(queries), 20)
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 1200)
+        ids = [item['id'] for item in response.data]
+        self.assertEqual(len(set(ids)), 1200)
+        stored = dict(Contact.objects.filter(user=self.user).values_list('id', 'name'))
+        self.assertEqual([stored[pk] for pk in ids], [item['name'] for item in payload])
+
+    def test_bulk_create_reports_item_errors_and_writes_nothing(self):
+        payload = [{'name': 'Valid'}, {'email': 'missing-name@example.com'}, {'name': 'Bad', 'email': 'nope'}]
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        self.assertFalse(Contact.objects.exists())
+
+    def test_bulk_update_touches_only_own_contacts(self):
+        mine = Contact.objects.create(user=self.user, name='Mine')
+        other_user = User.objects.create_user(username='someoneelse', password='testpass')
+        theirs = Contact.objects.create(user=other_user, name='Theirs')
+        response = self.client.patch(self.url, [{'id': mine.id, 'phone': '123'}, {'id': theirs.id, 'name': 'Hijacked'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'id': ['Not found.']}}])
+
+        before = mine.updated_at
+        response = self.client.patch(self.url, [{'id': mine.id, 'phone': '123'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mine.refresh_from_db()
+        self.assertEqual(mine.phone, '123')
+        self.assertGreater(mine.updated_at, before)
+
+    def test_bulk_delete(self):
+        contacts = [Contact.objects.create(user=self.user, name=f'C{i}') for i in range(3)]
+        response = self.client.delete(self.url, {'ids': [contacts[0].id, contacts[1].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(list(Contact.objects.filter(user=self.user)), [contacts[2]])
+
+    def test_single_create_is_bound_to_requesting_user(self):
+        response = self.client.post(reverse('contact-api-list'), {'name': 'Solo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['user'], self.user.id)
+
+
+class ContactDeduplicationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='deduper', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.john = Contact.objects.create(user=self.user, name='John Smith', email='John@Example.com')
+        self.copy = Contact.objects.create(
+            user=self.user, name='smith, jon', email='john@example.com ', phone='+1 (555) 010-0199', address='1 Main St',
+        )
+        # Same name, different person: their emails differ and nothing else matches.
+        self.namesake = Contact.objects.create(user=self.user, name='John Smith', email='js@other.org')
+        Contact.objects.create(user=self.user, name='Mary Major', phone='555-010-0100')
+        self.url = reverse('contact-api-duplicates')
+
+    def test_soundex(self):
+        codes = [dedup.soundex(name) for name in ('robert', 'rupert', 'ashcraft', 'tymczak', 'pfister', 'li')]
+        self.assertEqual(codes, ['R163', 'R163', 'A261', 'T522', 'P236', 'L000'])
+
+    def test_blocking_keys_ignore_formatting(self):
+        self.assertEqual(dedup.phone_key('+1 (555) 010-0199'), dedup.phone_key('555.010.0199'))
+        self.assertIsNone(dedup.phone_key('12-34'))
+        self.assertEqual(dedup.name_key(dedup.name_tokens('Smith, Jon')), dedup.name_key(dedup.name_tokens('john smith')))
+
+    def test_groups_likely_duplicates_only(self):
+        groups = dedup.find_duplicates([
+            (1, 'Ana García', 'ana@example.com', None),
+            (2, 'Ana Garcia', None, '+34 600 000 001'),
+            (3, 'ANA GARCIA', 'ana@example.com', '600 000 001'),
+            (4, 'Ana García', 'ana.g@example.org', '+34 699 999 999'),
+            (5, 'Pedro Alves', None, '600 000 001'),
+        ])
+        self.assertEqual([group['ids'] for group in groups], [[1, 2, 3]])
+        self.assertEqual(groups[0]['reasons'], ['email', 'name', 'phone'])
+
+    def test_large_blocks_are_not_expanded(self):
+        rows = [(pk, 'Same Name', None, '555 010 0000') for pk in range(5)]
+        self.assertEqual(len(dedup.find_duplicates(rows)), 1)
+        self.assertEqual(dedup.find_duplicates(rows, max_block=4), [])
+
+    def test_duplicates_endpoint(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        group = response.data['results'][0]
+        self.assertEqual([contact['id'] for contact in group['contacts']], [self.john.id, self.copy.id])
+        self.assertEqual(group['contacts'][1]['phone'], '+1 (555) 010-0199')
+        self.assertIn('email', group['reasons'])
+        self.assertIsNone(response.data['next_offset'])
+        # Scores are floats, so they are not rendered with orjson.
+        self.assertIs(type(response.accepted_renderer), JSONRenderer)
+        self.assertEqual(self.client.get(self.url, {'offset': 1}).data['results'], [])
+        self.assertEqual(self.client.get(self.url, {'limit': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CONTACTS_DEDUP_CACHE_TIMEOUT=3600)
+    def test_groups_are_cached_until_the_next_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(len(queries), 1)
+        Contact.objects.create(user=self.user, name='Mary Major', phone='(555) 010-0100')
+        self.assertEqual(self.client.get(self.url).data['count'], 2)
+
+    def test_merge_fills_empty_fields_and_deletes_duplicates(self):
+        response = self.client.post(
+            reverse('contact-api-merge'), [{'keep': self.john.id, 'duplicates': [self.copy.id]}], format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['phone'], '+1 (555) 010-0199')
+        self.john.refresh_from_db()
+        self.assertEqual((self.john.name, self.john.email, self.john.address), ('John Smith', 'John@Example.com', '1 Main St'))
+        self.assertFalse(Contact.objects.filter(pk=self.copy.pk).exists())
+        self.assertTrue(ContactTombstone.objects.filter(contact_id=self.copy.pk).exists())
+        self.assertEqual(self.client.get(self.url).data['count'], 0)
+
+    def test_merge_validates_every_item_first(self):
+        other = User.objects.create_user(username='other-deduper', password='testpass')
+        theirs = Contact.objects.create(user=other, name='John Smith')
+        response = self.client.post(reverse('contact-api-merge'), [
+            {'keep': self.john.id, 'duplicates': [self.copy.id]},
+            {'keep': self.namesake.id, 'duplicates': [theirs.id]},
+            {'keep': self.namesake.id, 'duplicates': [self.copy.id]},
+            {'keep': self.namesake.id},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'], [
+            {'index': 1, 'errors': {'duplicates': ['Not found.']}},
+            {'index': 2, 'errors': {'duplicates': ['Each contact can only appear once.']}},
+            {'index': 3, 'errors': {'duplicates': ['Expected a non-empty list of contact ids.']}},
+        ])
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 4)
+
+    def test_merge_conflicts_when_a_contact_is_deleted_meanwhile(self):
+        def delete_then_merge(user_id, merges):
+            Contact.objects.filter(pk=self.copy.pk).delete()
+            return dedup.merge_contacts(user_id, merges)
+
+        with mock.patch('contacts.views.merge_contacts', delete_then_merge):
+            response = self.client.post(
+                reverse('contact-api-merge'), [{'keep': self.john.id, 'duplicates': [self.copy.id]}], format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.john.refresh_from_db()
+        self.assertIsNone(self.john.phone)
+
+
+@override_settings(CONTACTS_DEFAULT_COUNTRY_CODE='1')
+class ContactNormalizedLookupTests(APITestCase):
+    # normalize_contacts visits every shard.
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='caller', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.alice = Contact.objects.create(user=self.user, name='Alice', email='Alice@Example.com ', phone='(555) 010-0199')
+        self.bob = Contact.objects.create(user=self.user, name='Bob', phone='+44 20 7946 0000 ext. 12')
+        other = User.objects.create_user(username='other-caller', password='testpass')
+        Contact.objects.create(user=other, name='Not Alice', phone='555-010-0199')
+
+    def test_normalize_phone(self):
+        cases = {
+            '(555) 010-0199': '+15550100199',
+            '1-555-010-0199': '+15550100199',
+            '+1 555 010 0199': '+15550100199',
+            '0044 20 7946 0000': '+442079460000',
+            '555 0100 x23': '+15550100',
+            'n/a': None,
+            '': None,
+        }
+        for value, expected in cases.items():
+            self.assertEqual(normalization.normalize_phone(value), expected, value)
+        self.assertEqual(normalization.normalize_phone('020 7946 0000', country_code='44'), '+442079460000')
+        self.assertEqual(normalization.normalize_phone('020 7946 0000', country_code=''), '02079460000')
+
+    def test_columns_follow_every_write_path(self):
+        self.assertEqual((self.alice.email_normalized, self.alice.phone_normalized), ('alice@example.com', '+15550100199'))
+        self.assertEqual(self.bob.phone_normalized, '+442079460000')
+        contacts = Contact.objects.for_user(self.user.pk)
+        contacts.bulk_create([Contact(user_id=self.user.pk, name='Carol', email='CAROL@example.com')])
+        carol = contacts.get(name='Carol')
+        self.assertEqual(carol.email_normalized, 'carol@example.com')
+        carol.phone = '555.010.0123'
+        contacts.bulk_update([carol], ['phone'])
+        self.assertEqual(contacts.get(pk=carol.pk).phone_normalized, '+15550100123')
+        contacts.filter(pk=carol.pk).update(email='Carol@Work.example')
+        self.assertEqual(contacts.get(pk=carol.pk).email_normalized, 'carol@work.example')
+        self.alice.phone = None
+        self.alice.save(update_fields=['phone'])
+        self.assertIsNone(contacts.get(pk=self.alice.pk).phone_normalized)
+
+    def test_exact_filters(self):
+        url = reverse('contact-api-list')
+        response = self.client.get(url, {'phone': '+1 (555) 010 0199'})
+        self.assertEqual([contact['id'] for contact in response.data['results']], [self.alice.id])
+        response = self.client.get(url, {'email': 'ALICE@example.COM'})
+        self.assertEqual([contact['id'] for contact in response.data['results']], [self.alice.id])
+        self.assertEqual(self.client.get(url, {'phone': '0199'}).data['results'], [])
+
+    def test_lookup_without_default_country_code_needs_international_numbers(self):
+        url = reverse('contact-api-lookup')
+        with self.settings(CONTACTS_DEFAULT_COUNTRY_CODE=''):
+            dana = Contact.objects.create(user=self.user, name='Dana', phone='(555) 010-0142')
+            erin = Contact.objects.create(user=self.user, name='Erin', phone='020 7946 0123')
+            self.assertEqual((dana.phone_normalized, erin.phone_normalized), ('5550100142', '02079460123'))
+            for phone, name in [
+                ('+1 555 010 0142', 'Dana'),
+                ('+44 20 7946 0123', 'Erin'),
+                ('+15550100199', 'Alice'),
+            ]:
+                response = self.client.get(url, {'phone': phone})
+                self.assertEqual([contact['name'] for contact in response.data], [name], phone)
+            # Without a country code a national number could be in any country.
+            for phone in ('555-010-0142', '555 010 0199', '010 0142'):
+                response = self.client.get(url, {'phone': phone})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, phone)
+                self.assertIn('phone', response.data)
+
+    def test_lookup_endpoint_uses_the_index(self):
+        url = reverse('contact-api-lookup')
+        response = self.client.get(url, {'phone': '+15550100199'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([contact['name'] for contact in response.data], ['Alice'])
+        self.assertEqual(self.client.get(url, {'email': 'nobody@example.com'}).data, [])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'phone': '+15550100199'})
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {queries[-1]["sql"]}')
+            self.assertIn('contact_user_phone_norm_idx', str(cursor.fetchall()))
+
+    def test_backfill_command_fills_missing_values_in_batches(self):
+        Contact._base_manager.update(email_normalized=None, phone_normalized=None)
+        before = Contact.objects.get(pk=self.alice.pk).updated_at
+        out = io.StringIO()
+        call_command('normalize_contacts', '--batch-size', '1', stdout=out)
+        self.assertIn('default: 3 contacts normalized.', out.getvalue())
+        alice = Contact.objects.get(pk=self.alice.pk)
+        self.assertEqual((alice.email_normalized, alice.phone_normalized), ('alice@example.com', '+15550100199'))
+        self.assertEqual(alice.updated_at, before)
+        call_command('normalize_contacts', stdout=out)
+        self.assertIn('default: 0 contacts normalized.', out.getvalue())
+
+
+class ContactHTMLListTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='browser', password='testpass')
+        self.client.force_login(self.user)
+        Contact.objects.for_user(self.user.pk).bulk_create(
+            [Contact(user_id=self.user.pk, name=f'Contact {index:03}') for index in range(120)]
+        )
+        self.url = reverse('contact-list')
+
+    def _names(self, response):
+        return [line.strip()[4:-5] for line in response.content.decode().splitlines() if '<td>Contact ' in line]
+
+    def test_pages_follow_keyset_links(self):
+        names = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names += self._names(response)
+            url = response.context['page']['next_url']
+        self.assertEqual(names, [f'Contact {index:03}' for index in range(120)])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'bogus'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CONTACTS_FRAGMENT_CACHE_TIMEOUT=300)
+    def test_rendered_pages_are_cached_until_a_contact_changes(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(self._names(response)), 50)
+        self.assertFalse([query for query in queries if 'contacts_contact' in query['sql']])
+
+        Contact.objects.create(user=self.user, name='Aaron')
+        self.assertContains(self.client.get(self.url), '<td>Aaron</td>')
+
+    def test_infinite_scroll_requests_get_rows_only(self):
+        response = self.client.get(self.url, {'page_size': 100}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertNotContains(response, '<table')
+        self.assertEqual(len(self._names(response)), 100)
+        response = self.client.get(response['X-Next-Page'], HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(len(self._names(response)), 20)
+        self.assertFalse(response.has_header('X-Next-Page'))
+        self.assertIn('X-Requested-With', response['Vary'])
+
+
+class ContactExportTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(
+            user=self.user,
+            name='Doe, John',
+            email='john@example.com',
+            phone='555-0100',
+            address='1 Main St\nSpringfield',
+        )
+        Contact.objects.create(user=self.user, name='Ann')
+        other = User.objects.create_user(username='private', password='testpass')
+        Contact.objects.create(user=other, name='Not Mine')
+        self.url = reverse('contact-api-export')
+
+    def _export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_csv_export(self):
+        response = self._export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'name', 'email', 'phone', 'address'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Ann', 'Doe, John'])
+        self.assertEqual(rows[2][4], '1 Main St\nSpringfield')
+
+    def test_ndjson_export(self):
+        body = b''.join(self._export(type='ndjson').streaming_content).decode('utf-8')
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(records[1], {
+            'id': self.contact.id,
+            'name': 'Doe, John',
+            'email': 'john@example.com',
+            'phone': '555-0100',
+            'address': '1 Main St\nSpringfield',
+        })
+
+    def test_vcard_export_escapes_values(self):
+        body = b''.join(self._export(type='vcard', version='4.0').streaming_content).decode('utf-8')
+        self.assertEqual(body.count('BEGIN:VCARD'), 2)
+        self.assertIn('VERSION:4.0\r\n', body)
+        self.assertIn('FN:Doe\\, John\r\n', body)
+        self.assertIn('ADR:;;1 Main St\\nSpringfield;;;;\r\n', body)
+
+    def test_gzip_export(self):
+        response = self.client.get(self.url, {'type': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_gzip_refused_by_q_value_is_not_used(self):
+        for header in ('gzip;q=0, deflate', 'deflate, gzip; q=0.0', '*;q=0', 'br, *;q=1, gzip;q=0', 'identity'):
+            response = self.client.get(self.url, {'type': 'ndjson'}, HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+        for header in ('GZIP;q=0.5', '*', 'br;q=1, *;q=0.1'):
+            response = self.client.get(self.url, {'type': 'ndjson'}, HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response['Content-Encoding'], 'gzip', header)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(self.url, {'type': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContactImportTests(APITestCase):
+
+    CSV = (
+        'Full Name,E-mail,Phone Number,Address\n'
+        'Ann Lee,ann@example.com,555-0101,\n'
+        ',nobody@example.com,,\n'
+        'Bob Ray,not-an-email,,\n'
+        'Cy Twombly,cy@example.com,,"Rome, Italy"\n'
+    )
+    VCARD = (
+        'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Dana Scully\r\nN:Scully;Dana;;;\r\n'
+        'EMAIL;TYPE=INTERNET:dana@fbi.gov\r\nTEL;TYPE=VOICE:555-0199\r\n'
+        'ADR:;;935 Pennsylvania\r\n  Ave\\, NW;Washington;;;\r\nEND:VCARD\r\n'
+        'BEGIN:VCARD\r\nVERSION:4.0\r\nN:Mulder;Fox;;;\r\nEND:VCARD\r\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def _job(self, content, name='contacts.csv'):
+        job = ContactImport(user=self.user, format=guess_format(name))
+        job.file.save(name, ContentFile(content.encode('utf-8')), save=True)
+        return job
+
+    def test_csv_import_validates_rows_and_reports_errors(self):
+        job = run_import(self._job(self.CSV), batch_size=2)
+        self.assertEqual(job.status, ContactImport.COMPLETED)
+        self.assertEqual((job.rows_processed, job.rows_imported, job.rows_failed), (4, 2, 2))
+        self.assertEqual([error['row'] for error in job.errors], [2, 3])
+        self.assertEqual(
+            list(Contact.objects.filter(user=self.user).values_list('name', 'address')),
+            [('Ann Lee', ''), ('Cy Twombly', 'Rome, Italy')],
+        )
+
+    def test_vcard_import(self):
+        run_import(self._job(self.VCARD, name='contacts.vcf'))
+        dana, fox = Contact.objects.filter(user=self.user).order_by('name')
+        self.assertEqual((dana.name, dana.email, dana.phone), ('Dana Scully', 'dana@fbi.gov', '555-0199'))
+        self.assertEqual(dana.address, '935 Pennsylvania Ave, NW, Washington')
+        self.assertEqual(fox.name, 'Fox Mulder')
+
+    def test_failed_import_resumes_from_checkpoint(self):
+        job = self._job(self.CSV)
+        original_flush = importers._flush
+        calls = []
+
+        def crash_on_second_batch(*args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return original_flush(*args)
+
+        with mock.patch.object(importers, '_flush', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                run_import(job, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed), (ContactImport.FAILED, 2))
+
+        run_import(job, batch_size=2)
+        self.assertEqual(job.rows_processed, 4)
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 2)
+
+    def test_interrupted_import_can_be_resumed(self):
+        job = self._job(self.CSV)
+        with mock.patch.object(importers, '_flush', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                run_import(job, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (ContactImport.FAILED, 'KeyboardInterrupt'))
+        run_import(job)
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 2)
+
+    def test_running_import_is_taken_over_after_its_lease(self):
+        job = self._job(self.CSV)
+        ContactImport.objects.filter(pk=job.pk).update(status=ContactImport.RUNNING, updated_at=timezone.now())
+        with self.assertRaisesMessage(ValueError, 'is already running'):
+            run_import(job)
+        # The worker was killed: no checkpoint for longer than the lease.
+        ContactImport.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        job = run_import(ContactImport.objects.get(pk=job.pk))
+        self.assertEqual((job.status, job.rows_imported), (ContactImport.COMPLETED, 2))
+
+    @override_settings(CONTACTS_IMPORT_RUN_INLINE=True)
+    def test_upload_endpoint_returns_job_progress(self):
+        upload = SimpleUploadedFile('book.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('contact-import-list'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], ContactImport.COMPLETED)
+
+        detail = self.client.get(reverse('contact-import-detail', args=[response.data['id']]))
+        self.assertEqual(detail.data['progress'], 100.0)
+        self.assertEqual(detail.data['rows_imported'], 2)
+
+    def test_upload_is_queued_by_default(self):
+        upload = SimpleUploadedFile('book.vcf', self.VCARD.encode('utf-8'))
+        response = self.client.post(reverse('contact-import-list'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['format'], ContactImport.VCARD)
+
+        call_command('import_contacts', '--pending', stdout=io.StringIO())
+        self.assertEqual(Contact.objects.filter(user=self.user).count(), 2)
+
+
+@override_settings(CONTACTS_SYNC_LAG=0)
+class ContactSyncTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='syncer', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('contact-api-sync')
+        self.ann = Contact.objects.create(user=self.user, name='Ann')
+        self.bob = Contact.objects.create(user=self.user, name='Bob')
+
+    def _sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_then_only_changes(self):
+        first = self._sync()
+        self.assertEqual({item['id'] for item in first['changed']}, {self.ann.id, self.bob.id})
+        self.assertEqual(first['deleted'], [])
+
+        self.assertEqual(self._sync(first['cursor'])['changed'], [])
+
+        self.ann.phone = '555'
+        self.ann.save()
+        carol = Contact.objects.create(user=self.user, name='Carol')
+        delta = self._sync(first['cursor'])
+        self.assertEqual([item['id'] for item in delta['changed']], [self.ann.id, carol.id])
+
+    def test_deletions_from_every_delete_path_are_synced(self):
+        cursor = self._sync()['cursor']
+        carol = Contact.objects.create(user=self.user, name='Carol')
+        self.client.delete(reverse('contact-api-detail', args=[self.ann.id]))
+        self.client.delete(reverse('contact-api-bulk'), {'ids': [self.bob.id]}, format='json')
+        self.client.force_login(self.user)
+        self.client.post(reverse('contact-delete', args=[carol.id]))
+        delta = self._sync(cursor)
+        self.assertEqual(delta['changed'], [])
+        self.assertEqual(sorted(delta['deleted']), sorted([self.ann.id, self.bob.id, carol.id]))
+        self.assertFalse(Contact.objects.filter(user=self.user).exists())
+
+    def test_changes_are_paged(self):
+        page = self._sync(limit=1)
+        self.assertTrue(page['has_more'])
+        second = self._sync(page['cursor'], limit=1)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [item['id'] for item in page['changed'] + second['changed']],
+            [self.ann.id, self.bob.id],
+        )
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'junk'}).status_code, status.HTTP_400_BAD_REQUEST)
+        stale = sync.encode_cursor(None, (timezone.now() - timedelta(days=365), 0))
+        self.assertEqual(self.client.get(self.url, {'cursor': stale}).status_code, status.HTTP_410_GONE)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ContactConditionalRequestTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(user=self.user, name='Ann')
+        self.list_url = reverse('contact-api-list')
+        self.detail_url = reverse('contact-api-detail', args=[self.contact.id])
+
+    def test_unchanged_list_returns_304_without_queries(self):
+        etag = self.client.get(self.list_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_after_any_write(self):
+        etag = self.client.get(self.list_url)['ETag']
+        Contact.objects.create(user=self.user, name='Bob')
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_and_304(self):
+        response = self.client.get(self.detail_url)
+        self.assertIn('Last-Modified', response)
+        again = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_match_guards_updates_and_deletes(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        updated = self.client.patch(self.detail_url, {'phone': '1'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(updated['ETag'], etag)
+
+        stale = self.client.patch(self.detail_url, {'phone': '2'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        stale_delete = self.client.delete(self.detail_url, HTTP_IF_MATCH=etag)
+        self.assertEqual(stale_delete.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.contact.refresh_from_db()
+        self.assertEqual(self.contact.phone, '1')
+
+        deleted = self.client.delete(self.detail_url, HTTP_IF_MATCH=updated['ETag'])
+        self.assertEqual(deleted.status_code, status.HTTP_204_NO_CONTENT)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_lists_are_not_tagged_without_a_shared_cache(self):
+        self.assertNotIn('ETag', self.client.get(self.list_url))
+
+
+@override_settings(CACHE_IS_SHARED=True, CONTACTS_RESPONSE_CACHE_TIMEOUT=300)
+class ContactResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(user=self.user, name='Ann')
+
+    def test_repeated_list_and_detail_are_served_from_cache(self):
+        for url in (reverse('contact-api-list'), reverse('contact-api-detail', args=[self.contact.id])):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.data, first.data)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_cache_is_keyed_by_query_string(self):
+        Contact.objects.create(user=self.user, name='Bob')
+        self.assertEqual(len(self.client.get(reverse('contact-api-list')).data['results']), 2)
+        self.assertEqual(len(self.client.get(reverse('contact-api-list'), {'page_size': 1}).data['results']), 1)
+
+    def test_writes_invalidate_cached_responses(self):
+        url = reverse('contact-api-detail', args=[self.contact.id])
+        self.client.get(url)
+        self.client.patch(url, {'name': 'Annie'}, format='json')
+        self.assertEqual(self.client.get(url).data['name'], 'Annie')
+
+        self.client.get(reverse('contact-api-list'))
+        self.client.post(reverse('contact-api-bulk'), [{'name': 'Zed'}], format='json')
+        names = [item['name'] for item in self.client.get(reverse('contact-api-list')).data['results']]
+        self.assertEqual(names, ['Annie', 'Zed'])
+
+    @override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        url = reverse('contact-api-list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['default'], CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class ContactReplicaRoutingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replica', password='testpass')
+        self.client.force_authenticate(self.user)
+        Contact.objects.create(user=self.user, name='Ann')
+        patcher = mock.patch.object(db_routing, 'choose_replica', return_value='default')
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get(reverse('contact-api-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.choose_replica.called)
+
+    def test_writes_pin_client_to_primary(self):
+        response = self.client.post(reverse('contact-api-list'), {'name': 'Bob'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(db_routing.STICKY_COOKIE, response.cookies)
+        self.assertFalse(self.choose_replica.called)
+
+        self.assertEqual(len(self.client.get(reverse('contact-api-list')).data['results']), 2)
+        self.assertFalse(self.choose_replica.called)
+
+        # Clients without cookies stay pinned through the cache.
+        self.client.cookies.clear()
+        self.client.get(reverse('contact-api-list'))
+        self.assertFalse(self.choose_replica.called)
+
+        cache.clear()
+        self.client.get(reverse('contact-api-list'))
+        self.assertTrue(self.choose_replica.called)
+
+    @override_settings(DATABASE_REPLICAS=['broken'], DATABASE_REPLICA_RETRY_SECONDS=30)
+    def test_unreachable_replica_falls_back_to_primary(self):
+        broken = mock.Mock()
+        broken.ensure_connection.side_effect = OperationalError('unable to open database file')
+        self.addCleanup(db_routing._down_until.clear)
+        with mock.patch.object(db_routing, 'connections', {'broken': broken}):
+            self.assertIsNone(choose_replica())
+            self.assertIsNone(choose_replica())
+        # The failed replica is not retried until the retry window passes.
+        self.assertEqual(broken.ensure_connection.call_count, 1)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'set DATABASE_REPLICAS to run against real replicas')
+class ContactConfiguredReplicaTests(APITransactionTestCase):
+    # Replicas mirror the test database; committed data is visible through them.
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replica', password='testpass')
+        self.client.force_authenticate(self.user)
+        Contact.objects.create(user=self.user, name='Ann')
+
+    def test_reads_are_served_by_a_replica(self):
+        chosen = []
+
+        def record():
+            alias = choose_replica()
+            chosen.append(alias)
+            return alias
+
+        with mock.patch.object(db_routing, 'choose_replica', side_effect=record):
+            response = self.client.get(reverse('contact-api-list'))
+        self.assertEqual([row['name'] for row in response.data['results']], ['Ann'])
+        self.assertTrue(chosen)
+        self.assertIn(chosen[0], settings.DATABASE_REPLICAS)
+
+
+@override_settings(CONTACT_SHARDS=['default', 'shard_x'])
+class ContactShardingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='sharded', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def test_growing_the_ring_moves_only_users_to_the_new_shard(self):
+        before = HashRing(['default', 'a', 'b'])
+        after = HashRing(['default', 'a', 'b', 'c'])
+        moved = [key for key in range(2000) if before.get(key) != after.get(key)]
+        self.assertTrue(all(after.get(key) == 'c' for key in moved))
+        self.assertLess(len(moved), 2000 * 0.35)
+
+    def test_override_routes_queries_to_pinned_shard(self):
+        set_shard_override(self.user.pk, 'shard_x')
+        self.assertEqual(shard_for_user(self.user.pk), 'shard_x')
+        self.assertEqual(Contact.objects.for_user(self.user.pk).db, 'shard_x')
+        self.assertEqual(ShardRouter().db_for_write(Contact, instance=Contact(user_id=self.user.pk)), 'shard_x')
+        # Models that are not sharded are left to the other routers.
+        self.assertIsNone(ShardRouter().db_for_read(ContactImport, user_id=self.user.pk))
+
+        set_shard_override(self.user.pk, ring_shard(self.user.pk))
+        self.assertFalse(ContactShardAssignment.objects.exists())
+
+    def test_create_is_routed_by_its_user(self):
+        set_shard_override(self.user.pk, 'shard_x')
+        with mock.patch('django.db.models.QuerySet.create', autospec=True) as create:
+            Contact.objects.create(user=self.user, name='Ann')
+            Contact.objects.create(user_id=self.user.pk, name='Bob')
+        self.assertEqual([call.args[0].db for call in create.call_args_list], ['shard_x', 'shard_x'])
+
+    def test_generation_bump_waits_for_the_shard_transaction(self):
+        set_shard_override(self.user.pk, 'shard_x')
+        with mock.patch('contacts.caching.transaction.on_commit') as on_commit:
+            caching.bump_generation(self.user.pk)
+            caching.bump_generation(self.user.pk, using='default')
+        self.assertEqual([call.kwargs['using'] for call in on_commit.call_args_list], ['shard_x', 'default'])
+
+    def test_writes_are_paused_while_moving(self):
+        set_shard_override(self.user.pk, 'default')
+        cache.set(sharding.MOVING_KEY.format(user_id=self.user.pk), True)
+        response = self.client.post(reverse('contact-api-list'), {'name': 'Ann'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_200_OK)
+
+    def test_pin_users_keeps_existing_placement(self):
+        users = [User.objects.create_user(username=f'user{index}') for index in range(20)]
+        expected = {user.pk for user in users + [self.user] if ring_shard(user.pk) != 'default'}
+        self.assertEqual(pin_users(['default']), len(expected))
+        self.assertEqual(set(ContactShardAssignment.objects.values_list('user_id', flat=True)), expected)
+        for user in users:
+            self.assertEqual(shard_for_user(user.pk), 'default')
+
+
+@skipUnless(len(settings.CONTACT_SHARDS) > 1, 'set CONTACT_SHARD_DATABASES to run against real shards')
+class ContactShardMoveTests(APITransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shard = settings.CONTACT_SHARDS[1]
+        self.user = User.objects.create_user(username='mover', password='testpass')
+        self.client.force_authenticate(self.user)
+        set_shard_override(self.user.pk, self.shard)
+
+    def test_contacts_live_on_the_users_shard_and_move_online(self):
+        for name in ('Ann', 'Bob', 'Cy'):
+            self.client.post(reverse('contact-api-list'), {'name': name}, format='json')
+        on_shard = Contact.objects.using(self.shard).filter(user_id=self.user.pk)
+        self.assertEqual(on_shard.count(), 3)
+        self.assertFalse(Contact.objects.using('default').exists())
+        self.assertTrue(all(pk >= settings.CONTACT_SHARD_ID_STRIDE for pk in on_shard.values_list('id', flat=True)))
+
+        before = self.client.get(reverse('contact-api-list')).data['results']
+        self.client.delete(reverse('contact-api-detail', args=[before[2]['id']]))
+        call_command('move_user_shard', self.user.pk, 'default', grace=0, stdout=io.StringIO())
+
+        self.assertEqual(shard_for_user(self.user.pk), 'default')
+        self.assertFalse(Contact.objects.using(self.shard).filter(user_id=self.user.pk).exists())
+        after = self.client.get(reverse('contact-api-list')).data['results']
+        self.assertEqual([row['name'] for row in after], ['Ann', 'Bob'])
+        # Moved contacts get ids from the target's range.
+        self.assertTrue(all(row['id'] < settings.CONTACT_SHARD_ID_STRIDE for row in after))
+        # Tombstones moved along, and the old ids got new ones, so clients
+        # learn about the deletion and swap their copies for the new ids.
+        cursor = sync.encode_cursor(None, (timezone.now() - timedelta(minutes=1), 0))
+        with self.settings(CONTACTS_SYNC_LAG=0):
+            response = self.client.get(reverse('contact-api-sync'), {'cursor': cursor})
+        self.assertEqual(sorted(response.data['deleted']), sorted(row['id'] for row in before))
+
+    def test_moving_back_and_forth_keeps_ids_unique_and_other_users_rows(self):
+        other = User.objects.create_user(username='stayer', password='testpass')
+        set_shard_override(other.pk, self.shard)
+        Contact.objects.for_user(other.pk).create(user=other, name='Theirs')
+        for name in ('Ann', 'Bob'):
+            Contact.objects.for_user(self.user.pk).create(user=self.user, name=name)
+
+        move_user(self.user.pk, 'default', grace=0)
+        neighbour = User.objects.create_user(username='neighbour', password='testpass')
+        set_shard_override(neighbour.pk, 'default')
+        created = Contact.objects.for_user(neighbour.pk).create(user=neighbour, name='New on default')
+        self.assertLess(created.pk, settings.CONTACT_SHARD_ID_STRIDE)
+        move_user(self.user.pk, self.shard, grace=0)
+        move_user(self.user.pk, 'default', grace=0)
+
+        everywhere = []
+        for alias in settings.CONTACT_SHARDS:
+            everywhere += Contact.objects.using(alias).values_list('id', 'user_id', 'name')
+        self.assertEqual(len({pk for pk, _, _ in everywhere}), len(everywhere))
+        self.assertEqual(
+            sorted((user_id, name) for _, user_id, name in everywhere),
+            sorted([(self.user.pk, 'Ann'), (self.user.pk, 'Bob'), (other.pk, 'Theirs'), (neighbour.pk, 'New on default')]),
+        )
+
+
+class ContactSQLiteBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/contacts.sqlite3'
+
+    def _connection(self):
+        settings_dict = dict(connection.settings_dict, NAME=self.path, OPTIONS={}, CONN_MAX_AGE=0)
+        return DatabaseWrapper(settings_dict, alias='sqlite_backend_test')
+
+    def _query(self, sql):
+        wrapper = self._connection()
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute(sql)
+                return cursor.fetchone()
+        finally:
+            wrapper.close()
+
+    def test_new_connections_apply_pragmas(self):
+        self.assertEqual(self._query('PRAGMA journal_mode'), ('wal',))
+        self.assertEqual(self._query('PRAGMA synchronous'), (1,))
+        self.assertEqual(self._query('PRAGMA busy_timeout'), (5000,))
+
+    def test_concurrent_read_modify_write_transactions_do_not_fail(self):
+        self._query('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)')
+        self._query('INSERT INTO counter (id, value) VALUES (1, 0)')
+        errors = []
+
+        def work():
+            connections['sqlite_backend_test'] = self._connection()
+            try:
+                for _ in range(25):
+                    # Reads first, then writes: the pattern that deadlocks a deferred BEGIN.
+                    with transaction.atomic(using='sqlite_backend_test'):
+                        with connections['sqlite_backend_test'].cursor() as cursor:
+                            cursor.execute('SELECT value FROM counter WHERE id = 1')
+                            value = cursor.fetchone()[0]
+                            cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+                    with connections['sqlite_backend_test'].cursor() as cursor:
+                        cursor.execute('UPDATE counter SET value = value + 1 WHERE id = 1')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections['sqlite_backend_test'].close()
+                del connections['sqlite_backend_test']
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self._query('SELECT value FROM counter WHERE id = 1'), (6 * 25 * 2,))
+
+
+@override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class RequestMetricsTests(APITestCase):
+
+    def setUp(self):
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+        self.user = User.objects.create_user(username='metrics', password='testpass')
+        self.client.force_authenticate(self.user)
+        Contact.objects.create(user=self.user, name='Ann')
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.get(reverse('contact-api-list'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('contact-api-list'))
+        per_request = len(queries)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{view="contact-api-list",method="GET",status="200"} 2', body,
+        )
+        self.assertIn('http_request_db_queries_count{view="contact-api-list",method="GET"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{view="contact-api-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn(f'http_request_db_queries_sum{{view="contact-api-list",method="GET"}} {2 * per_request}', body)
+        self.assertIn('# TYPE http_request_serialization_duration_seconds histogram', body)
+
+    @override_settings(QUERY_BUDGETS={'contact-api-list': 0}, QUERY_BUDGETS_STRICT=True)
+    def test_exceeding_the_query_budget_fails_loudly(self):
+        with self.assertRaisesMessage(metrics.QueryBudgetExceeded, 'budget is 0'):
+            self.client.get(reverse('contact-api-list'))
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class BenchmarkSuiteTests(APITestCase):
+    # Keeps the benchmark scenarios working as the API evolves.
+
+    def test_every_scenario_runs_without_errors(self):
+        users = generate(users=2, contacts_per_user=20, seed=1)
+        self.assertEqual(Contact.objects.for_user(users[0].pk).count(), 20)
+
+        results = run_benchmarks(users, transports=['client'], iterations=3)
+
+        self.assertEqual([row['scenario'] for row in results], list(SCENARIOS))
+        for row in results:
+            self.assertEqual(row['errors'], 0, row['scenario'])
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        baseline = [{'transport': 'client', 'scenario': 'list', 'p95_ms': 10.0, 'throughput_rps': 100.0}]
+        slower = [{'transport': 'client', 'scenario': 'list', 'p95_ms': 13.0, 'throughput_rps': 95.0}]
+        with mock.patch('builtins.print'):
+            self.assertEqual(compare(slower, baseline, 0.2), [('client', 'list')])
+            self.assertEqual(compare(baseline, baseline, 0.2), [])
+
+
+@override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class ContactFastListTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='fast', password='testpass')
+        self.client.force_authenticate(self.user)
+        Contact.objects.create(user=self.user, name='Zoë \u2028 "Q"', email='zoe@example.com', phone='555', address='A\nB')
+        Contact.objects.create(user=self.user, name='Ann', email=None, phone=None, address=None)
+        Contact.objects.create(user=self.user, name='Ann', email='ann@example.com')
+
+    def test_list_output_is_byte_identical_to_the_model_serializer(self):
+        response = self.client.get(reverse('contact-api-list'))
+        contacts = Contact.objects.for_user(self.user.pk).order_by('name', 'id')
+        expected = JSONRenderer().render({
+            'next': None,
+            'previous': None,
+            'results': ContactSerializer(contacts, many=True).data,
+        })
+        self.assertEqual(response.content, expected)
+
+    def test_list_fetches_only_serialized_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('contact-api-list'))
+        select = next(query['sql'] for query in queries if 'FROM "contacts_contact"' in query['sql'])
+        self.assertNotIn('created_at', select)
+
+    def test_search_and_pages_still_work(self):
+        page = self.client.get(reverse('contact-api-list'), {'page_size': 2})
+        self.assertEqual([item['name'] for item in page.data['results']], ['Ann', 'Ann'])
+        rest = self.client.get(page.data['next'])
+        self.assertEqual(len(rest.data['results']), 1)
+        found = self.client.get(reverse('contact-api-list'), {'search': 'zoe'})
+        self.assertEqual(list(found.data['results'][0]), ['id', 'user', 'name', 'email', 'phone', 'address'])
+
+    def test_unsupported_serializers_fall_back(self):
+        class WithMethodField(ContactSerializer):
+            initial = serializers.SerializerMethodField()
+
+            class Meta(ContactSerializer.Meta):
+                fields = ContactSerializer.Meta.fields + ['initial']
+
+        self.assertIsNone(RowSerializer.for_serializer(WithMethodField))
+        self.assertEqual(RowSerializer.for_serializer(ContactSerializer).columns,
+                         ['id', 'user_id', 'name', 'email', 'phone', 'address'])
+
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            'text': 'a\x00\x1f\x7f\u2028\u2029"\\/é😀',
+            'when': timezone.now(),
+            'numbers': [1, -2, None, True],
+            1: 'int key',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({'n': 2 ** 70}), b'{"n":1180591620717411303424}')
+        indented = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(indented, JSONRenderer().render({'a': 1}, 'application/json; indent=2'))
+
+    def test_benchmark_compares_identical_output(self):
+        self.assertEqual(set(measure(self.user.pk, repeat=1)), {'model-serializer', 'values-rows'})
+
+
+@override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class ContactFieldProjectionTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sparse', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.contact = Contact.objects.create(user=self.user, name='Ann', email='ann@example.com', address='Long')
+
+    def _select(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        sql = next(query['sql'] for query in queries if 'FROM "contacts_contact"' in query['sql'])
+        return response, sql
+
+    def test_list_returns_and_reads_only_requested_fields(self):
+        response, sql = self._select(reverse('contact-api-list'), {'fields': 'id,name'})
+        self.assertEqual(response.data['results'], [{'id': self.contact.id, 'name': 'Ann'}])
+        self.assertNotIn('"address"', sql.split(' FROM ')[0])
+        self.assertNotIn('"email"', sql.split(' FROM ')[0])
+
+    def test_exclude_on_detail(self):
+        url = reverse('contact-api-detail', args=[self.contact.id])
+        response, sql = self._select(url, {'exclude': 'address,user'})
+        self.assertEqual(list(response.data), ['id', 'name', 'email', 'phone'])
+        self.assertNotIn('"address"', sql.split(' FROM ')[0])
+        self.assertIn('ETag', response)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('contact-api-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', response.data['fields'][0])
+
+    def test_writes_ignore_projection(self):
+        url = reverse('contact-api-detail', args=[self.contact.id])
+        response = self.client.patch(f'{url}?fields=id', {'address': 'Short'}, format='json')
+        self.assertEqual(response.data['address'], 'Short')
+
+
+@override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class ContactAsyncAPITests(TransactionTestCase):
+    # Transactional: run_orm queries from its own threads and connections.
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+        self.user = User.objects.create_user(username='async', password='testpass')
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        # Django 3.2's AsyncClient takes headers by their HTTP names.
+        self.async_auth = {'authorization': f'Bearer {token}'}
+        self.contact = Contact.objects.create(user=self.user, name='Zoë', email='zoe@example.com', address='Here')
+        Contact.objects.create(user=self.user, name='Ann')
+
+    async def sync_get(self, url, params=None):
+        return await sync_to_async(self.client.get)(url, params, **self.auth)
+
+    def test_every_middleware_can_run_async(self):
+        # One sync-only middleware would make Django run async views in a thread.
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+        self.assertTrue(asyncio.iscoroutinefunction(async_views.contact_list))
+
+    async def test_list_and_detail_match_the_drf_api(self):
+        for params in ({}, {'page_size': 1}, {'search': 'zoe'}, {'fields': 'id,name'}):
+            # Django 3.2's AsyncClient ignores GET data; put it in the URL.
+            response = await self.async_client.get(f'{reverse("contact-async-list")}?{urlencode(params)}', **self.async_auth)
+            expected = await self.sync_get(reverse('contact-api-list'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['results'], json.loads(expected.content)['results'])
+
+        url = reverse('contact-async-detail', args=[self.contact.pk])
+        response = await self.async_client.get(url, **self.async_auth)
+        expected = await self.sync_get(reverse('contact-api-detail', args=[self.contact.pk]))
+        self.assertEqual(response.content, expected.content)
+
+    async def test_next_page_is_served_by_the_async_view(self):
+        first = await self.async_client.get(f'{reverse("contact-async-list")}?page_size=1', **self.async_auth)
+        next_url = json.loads(first.content)['next']
+        self.assertIn(reverse('contact-async-list'), next_url)
+        second = await self.async_client.get(next_url, **self.async_auth)
+        self.assertEqual([item['name'] for item in json.loads(second.content)['results']], ['Zoë'])
+
+    async def test_create(self):
+        response = await self.async_client.post(
+            reverse('contact-async-list'), {'name': 'Bob', 'email': 'bob@example.com'},
+            content_type='application/json', **self.async_auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        body = json.loads(response.content)
+        self.assertEqual((body['name'], body['user']), ('Bob', self.user.pk))
+        exists = await sync_to_async(Contact.objects.for_user(self.user.pk).filter(name='Bob').exists)()
+        self.assertTrue(exists)
+
+        invalid = await self.async_client.post(
+            reverse('contact-async-list'), {'email': 'nope'}, content_type='application/json', **self.async_auth,
+        )
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(set(json.loads(invalid.content)), {'name', 'email'})
+
+    async def test_errors_look_like_drf_errors(self):
+        anonymous = await self.async_client.get(reverse('contact-async-list'))
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertIn('WWW-Authenticate', anonymous)
+        missing = await self.async_client.get(reverse('contact-async-detail', args=[0]), **self.async_auth)
+        self.assertEqual((missing.status_code, json.loads(missing.content)), (404, {'detail': 'Not found.'}))
+        wrong = await self.async_client.delete(reverse('contact-async-detail', args=[self.contact.pk]), **self.async_auth)
+        self.assertEqual((wrong.status_code, wrong['Allow']), (405, 'GET'))
+        unknown = await self.async_client.get(f'{reverse("contact-async-list")}?fields=secret', **self.async_auth)
+        self.assertEqual(unknown.status_code, 400)
+
+    @override_settings(CONTACTS_RESPONSE_CACHE_TIMEOUT=60)
+    async def test_cached_responses_only_authenticate_on_the_database_pool(self):
+        url = reverse('contact-async-list')
+        first = await self.async_client.get(url, **self.async_auth)
+        with mock.patch.object(async_views, 'run_orm', wraps=async_views.run_orm) as run_orm:
+            second = await self.async_client.get(url, **self.async_auth)
+        self.assertEqual([call.args[0] for call in run_orm.call_args_list], [async_views.authenticate])
+        self.assertEqual(second.content, first.content)
+
+    async def test_queries_on_the_pool_are_recorded_in_metrics(self):
+        await self.async_client.get(reverse('contact-async-list'), **self.async_auth)
+        body = metrics.render_metrics()
+        self.assertIn('http_request_db_queries_sum{view="contact-async-list",method="GET"} 2', body)
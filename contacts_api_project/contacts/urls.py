@@ -1,15 +1,20 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
+
 from .views import (
 	ContactCreateView,
 	ContactDeleteView,
+	ContactImportViewSet,
 	ContactListView,
 	ContactUpdateView,
 	ContactViewSet,
 )
 
 router = DefaultRouter()
+# Registered before the contact routes so 'imports/' is not read as a contact pk.
+router.register(r'imports', ContactImportViewSet, basename='contact-import')
 # API endpoints now live under /contacts/api/.
 router.register(r'', ContactViewSet, basename='contact-api')
 
@@ -18,5 +23,8 @@ urlpatterns = [
 	path('create/', ContactCreateView.as_view(), name='contact-create'),
 	path('<int:pk>/edit/', ContactUpdateView.as_view(), name='contact-edit'),
 	path('<int:pk>/delete/', ContactDeleteView.as_view(), name='contact-delete'),
+	# Before the router, whose detail route would read 'async' as a contact pk.
+	path('api/async/', async_views.contact_list, name='contact-async-list'),
+	path('api/async/<int:pk>/', async_views.contact_detail, name='contact-async-detail'),
 	path('api/', include(router.urls)),
 ]
\ No newline at end of file
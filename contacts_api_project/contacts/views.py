@@ -1,34 +1,397 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from rest_framework import viewsets, permissions
-from rest_framework import filters
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.generic import CreateView, DeleteView, TemplateView, UpdateView
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import mixins, status, viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
 
+from contacts_api.db_routing import ReplicaReadMixin
+from contacts_api.projection import FieldProjectionMixin
+from contacts_api.renderers import FastJSONRenderer
+
+from .autocomplete import DEFAULT_LIMIT, MAX_LIMIT, autocomplete as autocomplete_contacts
+from .caching import CachedResponseMixin, bump_generation, cached_fragment
+from .conditional import ConditionalRequestMixin
+from .dedup import duplicate_groups, merge_contacts
+from .exporters import EXPORT_FORMATS, VCARD_VERSIONS, accepts_gzip, export_stream, gzip_stream
+from .filters import ContactFilter
 from .forms import ContactForm
-from .models import Contact
-from .serializers import ContactSerializer
+from .importers import guess_format, run_import
+from .models import Contact, ContactImport
+from .pagination import ContactCursorPagination
+from .rows import RowSerializer, ValuesListMixin
+from .search import ContactSearchFilter
+from .serializers import ContactImportSerializer, ContactSerializer
+from .sharding import db_for_user
+from .sync import CursorExpired, InvalidCursor, changes_since, delete_contacts
+
+LOOKUP_LIMIT = 50
+
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(ReplicaReadMixin, CachedResponseMixin, ConditionalRequestMixin, ValuesListMixin,
+                     FieldProjectionMixin, viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    pagination_class = ContactCursorPagination
+    filter_backends = [ContactSearchFilter, DjangoFilterBackend]
     search_fields = ['name', 'email', 'phone']
+    filterset_class = ContactFilter
+    # Detail ETags are built from updated_at.
+    projection_required_columns = ('updated_at',)
 
     def get_queryset(self):
-        user = self.request.user
-        return self.queryset.filter(user=user)
+        # Filter on the id so token-authenticated requests never load the user row.
+        return super().get_queryset().for_user(self.request.user.pk)
 
+    def perform_create(self, serializer):
+        serializer.save(user_id=self.request.user.pk)
 
-class ContactListView(LoginRequiredMixin, ListView):
-    """HTML view showing the authenticated user's contacts."""
+    def perform_destroy(self, instance):
+        delete_contacts(self.get_queryset().filter(pk=instance.pk))
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Return the top ``limit`` ``(id, name, email)`` matches for the ``q`` prefix."""
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        limit = max(1, min(limit, MAX_LIMIT))
+        matches = autocomplete_contacts(request.user.pk, request.query_params.get('q', ''), limit)
+        return Response(matches)
+
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """
+        Reverse lookup, e.g. caller ID: the contacts whose phone or email equals ``?phone=``/``?email=``.
+
+        Both sides are normalized first, so ``+1 555 010 0199`` finds a
+        contact saved as ``(555) 010-0199``. Returns at most ``LOOKUP_LIMIT`` matches.
+        """
+        if not request.query_params.get('phone') and not request.query_params.get('email'):
+            return Response({'detail': 'Pass phone or email.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = ContactFilter(request.query_params, queryset=self.get_queryset()).qs
+        rows = RowSerializer.for_serializer(ContactSerializer)
+        return Response(rows.to_representation(queryset.order_by('name', 'id').values(*rows.columns)[:LOOKUP_LIMIT]))
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """
+        Create (POST), update (PATCH) or delete (DELETE) many contacts at once.
+
+        POST and PATCH take a list of contacts (PATCH items must include ``id``),
+        DELETE takes ``{"ids": [...]}``. All items are validated first; if any
+        fails nothing is written and the per-item errors are returned.
+        """
+        payload = request.data.get('ids') if request.method == 'DELETE' and isinstance(request.data, dict) else request.data
+        if not isinstance(payload, list):
+            return Response({'detail': 'Expected a list.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_items = getattr(settings, 'CONTACTS_BULK_MAX_ITEMS', 10000)
+        if len(payload) > max_items:
+            return Response(
+                {'detail': f'At most {max_items} items can be sent in one request.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        handler = {
+            'POST': self._bulk_create,
+            'PATCH': self._bulk_update,
+            'DELETE': self._bulk_delete,
+        }[request.method]
+        return handler(payload)
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Return contacts changed and ids deleted since ``?cursor=``.
+
+        Omit the cursor for a full sync. Keep requesting with the returned
+        cursor while ``has_more`` is true, and store the last one for next time.
+        """
+        try:
+            limit = int(request.query_params.get('limit', 500))
+        except ValueError:
+            limit = 500
+        try:
+            changes = changes_since(
+                self.get_queryset(),
+                request.user.pk,
+                cursor=request.query_params.get('cursor'),
+                limit=max(1, min(limit, 1000)),
+            )
+        except CursorExpired as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_410_GONE)
+        except InvalidCursor as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        changes['changed'] = self.get_serializer(changes['changed'], many=True).data
+        return Response(changes)
+
+    # Scores are floats, which orjson formats differently from json; see contacts_api/renderers.py.
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, BrowsableAPIRenderer])
+    def duplicates(self, request):
+        """
+        List groups of contacts that look like the same person.
+
+        Groups are ordered by their lowest contact id and paged with
+        ``?offset=`` and ``?limit=``. Each one carries its best pair ``score``
+        and the ``reasons`` (``name``, ``email``, ``phone``) its pairs matched on.
+        """
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 500))
+        except ValueError:
+            return Response({'detail': 'offset and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        groups = duplicate_groups(request.user.pk)
+        page = groups[offset:offset + limit]
+        rows = RowSerializer.for_serializer(ContactSerializer)
+        ids = [pk for group in page for pk in group['ids']]
+        contacts = {
+            contact['id']: contact
+            for contact in rows.to_representation(self.get_queryset().filter(id__in=ids).values(*rows.columns))
+        }
+        results = []
+        for group in page:
+            members = [contacts[pk] for pk in group['ids'] if pk in contacts]
+            if len(members) > 1:
+                results.append({'score': group['score'], 'reasons': group['reasons'], 'contacts': members})
+        return Response({
+            'count': len(groups),
+            'next_offset': offset + limit if offset + limit < len(groups) else None,
+            'results': results,
+        })
+
+    @action(detail=False, methods=['post'])
+    def merge(self, request):
+        """
+        Merge groups of duplicates: ``[{"keep": id, "duplicates": [id, ...]}, ...]``.
+
+        Empty fields of each kept contact are filled from its duplicates (in
+        the order given), then the duplicates are deleted. All items are
+        validated first; if any fails nothing is written.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected a list.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_items = getattr(settings, 'CONTACTS_BULK_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return Response(
+                {'detail': f'At most {max_items} items can be sent in one request.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = [
+            pk
+            for item in items if isinstance(item, dict)
+            for pk in (item.get('keep'), *(item.get('duplicates') if isinstance(item.get('duplicates'), list) else ()))
+            if isinstance(pk, int)
+        ]
+        existing = set(self.get_queryset().filter(id__in=ids).values_list('id', flat=True))
+        errors, merges, seen = [], [], set()
+        for index, item in enumerate(items):
+            keep = item.get('keep') if isinstance(item, dict) else None
+            duplicates = item.get('duplicates') if isinstance(item, dict) else None
+            item_errors = {}
+            if not isinstance(keep, int):
+                item_errors['keep'] = ['Expected a contact id.']
+            if not isinstance(duplicates, list) or not duplicates or not all(isinstance(pk, int) for pk in duplicates):
+                item_errors['duplicates'] = ['Expected a non-empty list of contact ids.']
+            if not item_errors:
+                group = [keep, *duplicates]
+                if any(pk not in existing for pk in group):
+                    item_errors['duplicates' if keep in existing else 'keep'] = ['Not found.']
+                elif len(set(group)) != len(group) or seen.intersection(group):
+                    item_errors['duplicates'] = ['Each contact can only appear once.']
+                seen.update(group)
+            if item_errors:
+                errors.append({'index': index, 'errors': item_errors})
+            else:
+                merges.append((keep, duplicates))
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        kept = merge_contacts(request.user.pk, merges)
+        return Response(self.get_serializer(kept, many=True).data)
+
+    def _bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.item_errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic(using=db_for_user(self.request.user.pk)):
+            serializer.save(user_id=self.request.user.pk)
+        bump_generation(self.request.user.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _bulk_update(self, items):
+        ids = [item.get('id') for item in items if isinstance(item, dict)]
+        instances = self.get_queryset().in_bulk([pk for pk in ids if isinstance(pk, int)])
+        errors, valid, seen = [], [], set()
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if pk in seen:
+                errors.append({'index': index, 'errors': {'id': ['Duplicate id.']}})
+                continue
+            seen.add(pk)
+            if pk not in instances:
+                errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+                continue
+            serializer = self.get_serializer(instances[pk], data=item, partial=True)
+            if not serializer.is_valid():
+                errors.append({'index': index, 'errors': serializer.errors})
+                continue
+            valid.append(serializer)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        fields = {'updated_at'}
+        for serializer in valid:
+            for attr, value in serializer.validated_data.items():
+                setattr(serializer.instance, attr, value)
+                fields.add(attr)
+            # bulk_update() bypasses auto_now.
+            serializer.instance.updated_at = now
+        contacts = [serializer.instance for serializer in valid]
+        with transaction.atomic(using=db_for_user(self.request.user.pk)):
+            Contact.objects.for_user(self.request.user.pk).bulk_update(
+                contacts,
+                sorted(fields),
+                batch_size=getattr(settings, 'CONTACTS_BULK_BATCH_SIZE', 500),
+            )
+        bump_generation(self.request.user.pk)
+        return Response(self.get_serializer(contacts, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all of the user's contacts as CSV, vCard or NDJSON.
+
+        ``?type=`` picks the format (default ``csv``) and ``?version=`` the vCard
+        version. The body is gzip-compressed on the fly when the client's
+        ``Accept-Encoding`` allows gzip (``q`` above 0).
+        """
+        export_format = request.query_params.get('type', 'csv')
+        version = request.query_params.get('version', '3.0')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'detail': f'type must be one of: {", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if export_format == 'vcard' and version not in VCARD_VERSIONS:
+            return Response(
+                {'detail': f'version must be one of: {", ".join(VCARD_VERSIONS)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        content_type, extension = EXPORT_FORMATS[export_format]
+        chunks = export_stream(
+            self.get_queryset(),
+            export_format,
+            version=version,
+            chunk_size=getattr(settings, 'CONTACTS_EXPORT_CHUNK_SIZE', 2000),
+        )
+        compress = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = StreamingHttpResponse(gzip_stream(chunks) if compress else chunks, content_type=content_type)
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="contacts.{extension}"'
+        return response
+
+    def _bulk_delete(self, ids):
+        if not all(isinstance(pk, int) for pk in ids):
+            return Response({'detail': 'ids must be a list of integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        deleted = delete_contacts(self.get_queryset().filter(id__in=ids))
+        return Response({'deleted': deleted})
+
+
+class ContactImportViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.ListModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Upload a CSV or vCard file for import and poll its progress.
+
+    Uploads are queued and processed by ``manage.py import_contacts --pending``
+    unless ``CONTACTS_IMPORT_RUN_INLINE`` is set.
+    """
+
+    queryset = ContactImport.objects.all()
+    serializer_class = ContactImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(user_id=self.request.user.pk)
+
+    def perform_create(self, serializer):
+        upload = serializer.validated_data['file']
+        job = serializer.save(
+            user_id=self.request.user.pk,
+            format=serializer.validated_data.get('format') or guess_format(upload.name),
+            bytes_total=upload.size,
+        )
+        if getattr(settings, 'CONTACTS_IMPORT_RUN_INLINE', False):
+            try:
+                run_import(job)
+            except Exception:
+                pass  # recorded on the job as status/last_error
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if response.data['status'] == ContactImport.PENDING:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class ContactListView(LoginRequiredMixin, TemplateView):
+    """
+    HTML view of the authenticated user's contacts, one keyset page at a time.
+
+    Each page's rows are rendered once and cached until the user's contacts
+    change, so a repeat visit runs no contact query and a page costs the
+    same however many contacts come before it. Requests sent with
+    ``X-Requested-With: XMLHttpRequest`` (the infinite-scroll script) get
+    only the rows, with the next page's URL in ``X-Next-Page``.
+    """
 
-    model = Contact
     template_name = 'contacts/contact_list.html'
-    context_object_name = 'contacts'
+    rows_template_name = 'contacts/contact_rows.html'
+    pagination_class = ContactCursorPagination
 
     def get_queryset(self):
-        return Contact.objects.filter(user=self.request.user).order_by('name')
+        return Contact.objects.for_user(self.request.user.pk).only('id', 'name', 'email', 'phone', 'address')
+
+    def render_page(self):
+        paginator = self.pagination_class()
+        try:
+            contacts = paginator.paginate_queryset(self.get_queryset(), Request(self.request))
+        except NotFound:
+            raise Http404('Invalid cursor')
+        # Relative links, so a cached page does not depend on the host it was built for.
+        paginator.base_url = self.request.get_full_path()
+        return {
+            'rows': render_to_string(self.rows_template_name, {'contacts': contacts}),
+            'next_url': paginator.get_next_link(),
+            'previous_url': paginator.get_previous_link(),
+        }
+
+    def get(self, request, *args, **kwargs):
+        page = cached_fragment(request.user.pk, f'contact-list:{request.get_full_path()}', self.render_page)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            response = HttpResponse(page['rows'])
+            if page['next_url']:
+                response['X-Next-Page'] = page['next_url']
+        else:
+            response = self.render_to_response(self.get_context_data(page=page))
+        patch_vary_headers(response, ('X-Requested-With',))
+        return response
 
 
 class ContactCreateView(LoginRequiredMixin, CreateView):
@@ -53,7 +416,7 @@ class ContactUpdateView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy('contact-list')
 
     def get_queryset(self):
-        return Contact.objects.filter(user=self.request.user)
+        return Contact.objects.for_user(self.request.user.pk)
 
 
 class ContactDeleteView(LoginRequiredMixin, DeleteView):
@@ -64,4 +427,9 @@ class ContactDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('contact-list')
 
     def get_queryset(self):
-        return Contact.objects.filter(user=self.request.user)
\ No newline at end of file
+        return Contact.objects.for_user(self.request.user.pk)
+
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        delete_contacts(self.get_queryset().filter(pk=self.object.pk))
+        return HttpResponseRedirect(self.get_success_url())
\ No newline at end of file
@@ -10,6 +10,6 @@ https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api_project.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'contacts_api.settings')
 
 application = get_asgi_application()
@@ -0,0 +1,52 @@
+"""
+Database access from async views.
+
+Django 3.2 has no async ORM: querying from the event loop raises
+``SynchronousOnlyOperation``. ``run_orm`` runs a block of ORM code on a
+dedicated pool of ``ASYNC_DB_THREADS`` threads and awaits the result, so an
+async view holds a thread only while it talks to the database, not while a
+slow client sends its request or reads the response. The pool size also
+caps how many queries run at once, whatever the number of open connections.
+
+The caller's context (read-replica routing state, ``wrap_queries`` hooks)
+is copied into each call. Pool threads keep their own database connections
+and close them after a call as Django does after a request, according to
+``CONN_MAX_AGE``.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_DB_THREADS', 8),
+                thread_name_prefix='orm',
+            )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_orm(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the database thread pool and return its result."""
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), context.run, _call, func, args, kwargs)
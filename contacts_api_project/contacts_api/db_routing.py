@@ -0,0 +1,177 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Only views that opt in through ``ReplicaReadMixin`` read from a replica, and
+only for safe methods. Everything else, including every write, goes to the
+primary.
+
+After a request writes anything, ``ReadReplicaMiddleware`` pins that client
+to the primary for ``DATABASE_REPLICA_STICKY_SECONDS``. The pin is stored in
+a cookie and, for authenticated users, also in the cache under their id, so
+token clients that ignore cookies are covered too. This keeps users from
+reading their own changes back from a replica that has not caught up yet.
+
+A replica that cannot be connected to is skipped for
+``DATABASE_REPLICA_RETRY_SECONDS``. When no replica is available, reads fall
+back to the primary.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.utils.functional import empty
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary_until'
+STICKY_KEY = 'db:primary-until:{user_id}'
+
+_state = ContextVar('db_routing_state', default=None)
+# alias -> monotonic time before which the replica is not retried.
+_down_until = {}
+
+
+class RoutingState:
+    def __init__(self, sticky_until=0.0):
+        self.sticky_until = sticky_until
+        self.use_replica = False
+        self.wrote = False
+
+
+def _replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def _is_available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as exc:
+        logger.warning('Read replica %s is unavailable: %s', alias, exc)
+        _down_until[alias] = time.monotonic() + getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+        return False
+    _down_until.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Return a reachable replica alias, or ``None`` to use the primary."""
+
+    replicas = _replicas()
+    random.shuffle(replicas)
+    for alias in replicas:
+        if _is_available(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """Send opted-in reads to a replica and record writes for stickiness."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication.
+        if db in _replicas():
+            return False
+        return None
+
+
+def _sticky_seconds():
+    return getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5)
+
+
+def _resolved_user_id(request):
+    # Don't trigger a session/user lookup just to pin the client.
+    user = request.__dict__.get('user')
+    if user is None or getattr(user, '_wrapped', None) is empty:
+        return None
+    return user.pk if user.is_authenticated else None
+
+
+class ReadReplicaMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        try:
+            sticky_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            sticky_until = 0.0
+        state = RoutingState(sticky_until)
+        return state, _state.set(state)
+
+    def finish(self, request, response, state):
+        if state.wrote and _sticky_seconds() > 0:
+            until = time.time() + _sticky_seconds()
+            response.set_cookie(STICKY_COOKIE, str(until), max_age=_sticky_seconds(), httponly=True, samesite='Lax')
+            user_id = _resolved_user_id(request)
+            if user_id is not None:
+                cache.set(STICKY_KEY.format(user_id=user_id), until, _sticky_seconds())
+        return response
+
+
+def read_from_replica(request, user_id=None):
+    """Let this request read from a replica, unless the client wrote recently."""
+
+    state = _state.get()
+    if state is None or request.method not in SAFE_METHODS or not _replicas():
+        return
+    now = time.time()
+    if state.sticky_until > now:
+        return
+    if user_id is not None:
+        pinned = cache.get(STICKY_KEY.format(user_id=user_id))
+        if pinned is not None and pinned > now:
+            return
+    state.use_replica = True
+
+
+class ReplicaReadMixin:
+    """Let a DRF view read from a replica for safe requests once the client is authenticated."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        read_from_replica(request, request.user.pk if request.user.is_authenticated else None)
@@ -0,0 +1,199 @@
+"""
+Per-endpoint request metrics in Prometheus format.
+
+``MetricsMiddleware`` records for every request: total latency, the number of
+SQL queries and the time spent in them (across all database aliases), and
+the time spent rendering the response body (DRF renderers and templates).
+Requests are labelled with the resolved URL name (``contact-api-list``,
+``user-list``, ``verify-email``...). Values are aggregated into in-process
+histograms and served at ``/metrics/``. Each worker process keeps its own
+histograms, so scrape every worker or run a single process per target.
+Queries a streaming response runs while it is being sent are not counted.
+Under ASGI, queries that sync views or ``run_orm`` run on other threads are
+counted too (see ``contacts_api.query_context``).
+
+``QUERY_BUDGETS`` maps URL names to the most queries a request may issue.
+A request over budget raises ``QueryBudgetExceeded`` when
+``QUERY_BUDGETS_STRICT`` is on (``contacts_api.test_runner`` turns it on for ``manage.py test``), so a
+test that adds an N+1 query fails instead of silently slowing the endpoint.
+Otherwise the overrun is logged.
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .query_context import wrap_queries
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+UNMATCHED = '<unmatched>'
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    """Cumulative histogram per label set, in the Prometheus data model."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        with self._lock:
+            series = {key: ([*counts], total) for key, (counts, total) in self._series.items()}
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = _format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                bucket_labels = _format_labels([*zip(self.labels, label_values), ('le', bound)])
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def _format_labels(pairs):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Total time to handle the request.',
+    ('view', 'method', 'status'), LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries issued while handling the request.',
+    ('view', 'method'), QUERY_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL queries while handling the request.',
+    ('view', 'method'), LATENCY_BUCKETS,
+)
+REQUEST_SERIALIZATION_TIME = Histogram(
+    'http_request_serialization_duration_seconds', 'Time spent rendering the response body.',
+    ('view', 'method'), LATENCY_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_SERIALIZATION_TIME)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that counts and times queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def query_budget(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+class MetricsMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function, as MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with wrap_queries(recorder):
+            response = self.get_response(request)
+        return self.record(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with wrap_queries(recorder):
+            response = await self.get_response(request)
+        return self.record(request, response, recorder, started)
+
+    def record(self, request, response, recorder, started):
+        latency = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else UNMATCHED
+        render_started = getattr(request, '_metrics_render_started', None)
+        serialization = time.perf_counter() - render_started if render_started is not None else 0.0
+
+        REQUEST_LATENCY.observe(latency, view, request.method, str(response.status_code))
+        REQUEST_QUERIES.observe(recorder.count, view, request.method)
+        REQUEST_DB_TIME.observe(recorder.duration, view, request.method)
+        REQUEST_SERIALIZATION_TIME.observe(serialization, view, request.method)
+
+        budget = query_budget(view)
+        if budget is not None and recorder.count > budget:
+            message = f'{request.method} {request.path} ({view}) issued {recorder.count} queries; budget is {budget}.'
+            if getattr(settings, 'QUERY_BUDGETS_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs after the view returns and right before the response is rendered.
+        mark_render_started(request)
+        return response
+
+
+def mark_render_started(request):
+    """Start the serialization timer; views that render their own body call this first."""
+
+    request._metrics_render_started = time.perf_counter()
+
+
+def render_metrics():
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.collect()) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires ``Authorization: Bearer <METRICS_TOKEN>`` when set."""
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,108 @@
+"""
+Sparse fieldsets: ``?fields=id,name`` and ``?exclude=address``.
+
+``FieldProjectionMixin`` narrows a DRF view's serializer to the requested
+fields and its queryset to the columns behind them (``.only()``), so
+omitted columns are neither read from the database nor encoded. It only
+applies to safe requests (and, on viewsets, to ``projection_actions``);
+writes always see the full serializer. Unknown field names are a ``400``.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+_field_names = {}
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def readable_field_names(serializer_class):
+    """The names of ``serializer_class``'s output fields, in order."""
+
+    if serializer_class not in _field_names:
+        serializer = serializer_class()
+        _field_names[serializer_class] = [field.field_name for field in serializer._readable_fields]
+    return _field_names[serializer_class]
+
+
+def model_columns(model, serializer_class, names):
+    """Model fields to pass to ``.only()`` for ``names``, or ``None`` if one is not a plain column."""
+
+    fields = serializer_class().fields
+    columns = []
+    for name in names:
+        source = fields[name].source
+        if source == '*' or '.' in source:
+            return None
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        columns.append(model_field.name)
+    return columns
+
+
+def requested_fields(query_params, serializer_class, fields_param='fields', exclude_param='exclude'):
+    """Output field names selected by the query string, or ``None`` when it selects all of them."""
+
+    only = _split(query_params.get(fields_param, ''))
+    exclude = _split(query_params.get(exclude_param, ''))
+    if not only and not exclude:
+        return None
+    available = readable_field_names(serializer_class)
+    unknown = [name for name in only + exclude if name not in available]
+    if unknown:
+        raise ValidationError({
+            'fields': [f'Unknown field(s): {", ".join(unknown)}. Available: {", ".join(available)}.'],
+        })
+    selected = [name for name in available if name in only] if only else available
+    return [name for name in selected if name not in exclude]
+
+
+class FieldProjectionMixin:
+
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+    projection_actions = ('list', 'retrieve')
+    # Columns the view itself reads from instances (ETags, for example).
+    projection_required_columns = ()
+
+    def projected_fields(self):
+        """The requested subset of output field names, or ``None`` for all of them."""
+
+        if not hasattr(self, '_projected_fields'):
+            self._projected_fields = self._parse_projection()
+        return self._projected_fields
+
+    def _parse_projection(self):
+        request = self.request
+        action = getattr(self, 'action', None)
+        if request.method not in SAFE_METHODS or (action is not None and action not in self.projection_actions):
+            return None
+        return requested_fields(
+            request.query_params, self.get_serializer_class(), self.fields_query_param, self.exclude_query_param,
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        names = self.projected_fields()
+        if names is not None:
+            columns = model_columns(queryset.model, self.get_serializer_class(), names)
+            if columns is not None:
+                queryset = queryset.only(*columns, *self.projection_required_columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        names = self.projected_fields()
+        if names is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in names:
+                    target.fields.pop(name)
+        return serializer
@@ -0,0 +1,52 @@
+"""
+Per-request SQL hooks that follow the request across threads.
+
+``connection.execute_wrapper()`` only affects the calling thread's
+connections, but under ASGI a request's queries run elsewhere: sync views in
+asgiref's executor, async views on the ``contacts_api.asyncdb`` pool. Every
+connection therefore gets one permanent dispatcher that calls the wrappers
+registered with ``wrap_queries`` in the *current context*. asgiref and
+``run_orm`` copy the request's context into the threads they use, so
+request metrics and profiles see every query no matter where it runs.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_wrappers = ContextVar('query_wrappers', default=())
+
+
+def dispatch(execute, sql, params, many, context):
+    for wrapper in reversed(_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, dispatch)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """Call ``wrapper`` (an ``execute_wrapper`` callable) around every query of this context."""
+
+    # Connections opened before this module was imported have no dispatcher yet.
+    for connection in connections.all():
+        install(connection)
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
@@ -0,0 +1,53 @@
+"""
+A drop-in ``JSONRenderer`` that encodes with orjson when it is installed.
+
+The output is byte-for-byte what DRF's renderer produces with the default
+``UNICODE_JSON``/``COMPACT_JSON`` settings: same separators, same escaping
+(including U+2028/U+2029), and dates, decimals, lazy strings and the other
+types orjson does not handle are passed to DRF's own encoder. Indented
+output, non-default settings and anything orjson refuses (integers beyond
+64 bits, for example) go through the stock renderer.
+
+orjson formats float exponents differently (``1e16`` rather than
+``1e+16``) and writes NaN as ``null``, so use this renderer for views whose
+responses contain no floats.
+"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+LINE_SEPARATOR = '\u2028'.encode('utf-8')
+PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Valid JSON, but not valid JavaScript; DRF escapes them, so do we.
+        if LINE_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+        if PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
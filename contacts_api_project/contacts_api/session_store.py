@@ -0,0 +1,113 @@
+"""
+Cache-backed session engine with database write-behind for expiry updates.
+
+Behaves like Django's ``cached_db`` engine: sessions are read from the cache
+and fall back to the database on a miss, and any change to session *data* is
+written through to both. A save that only moves the expiry (the common case
+with ``SESSION_SAVE_EVERY_REQUEST`` or a view re-assigning an unchanged
+value) updates the cache immediately but only queues the new
+``expire_date``. Queued expiries are written in one ``bulk_update`` once
+``SESSION_WRITE_BEHIND_BATCH_SIZE`` keys are waiting or
+``SESSION_WRITE_BEHIND_INTERVAL`` seconds have passed.
+
+The queue is per process; expiries still queued when a worker stops are lost,
+which at worst lets ``clearsessions`` drop a session a little early.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.db import router
+
+logger = logging.getLogger(__name__)
+
+_pending = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def defer_expiry_update(session_key, expire_date):
+    """Queue ``expire_date`` for ``session_key``, flushing the queue when due."""
+
+    with _lock:
+        _pending[session_key] = expire_date
+        due = (
+            len(_pending) >= getattr(settings, 'SESSION_WRITE_BEHIND_BATCH_SIZE', 500)
+            or time.monotonic() - _last_flush >= getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 60)
+        )
+    if due:
+        flush_expiry_updates()
+
+
+def discard_expiry_update(session_key):
+    with _lock:
+        _pending.pop(session_key, None)
+
+
+def flush_expiry_updates():
+    """Write all queued expiries to the database; returns how many were written."""
+
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    model = SessionStore.get_model_class()
+    sessions = [model(session_key=key, expire_date=expire_date) for key, expire_date in pending.items()]
+    try:
+        model.objects.using(router.db_for_write(model)).bulk_update(
+            sessions,
+            ['expire_date'],
+            batch_size=getattr(settings, 'SESSION_WRITE_BEHIND_BATCH_SIZE', 500),
+        )
+    except Exception:
+        logger.exception('Could not write %s queued session expiries', len(sessions))
+        return 0
+    return len(sessions)
+
+
+class SessionStore(CachedDBStore):
+
+    def __init__(self, session_key=None):
+        self._loaded_state = None
+        super().__init__(session_key)
+
+    def _state_of(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._loaded_state = self._state_of(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and self._loaded_state is not None
+            and self._state_of(self._session) == self._loaded_state
+        ):
+            # Only the expiry moved: refresh the cache now, the database later.
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+            defer_expiry_update(self.session_key, self.get_expiry_date())
+            return
+        super().save(must_create)
+        discard_expiry_update(self.session_key)
+        self._loaded_state = self._state_of(self._session)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        if key is not None:
+            discard_expiry_update(key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        flush_expiry_updates()
+        super().clear_expired()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,18 +42,23 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'contacts',
     'users',
+    'profiling',
 ]
 
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'contacts_api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'contacts_api.db_routing.ReadReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'profiling.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,9 +90,104 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '0')),
     }
 }
 
+# Production SQLite: WAL, tuned pragmas, writers serialized through a lock,
+# and persistent connections. See contacts_api/sqlite_backend/base.py.
+if os.getenv('SQLITE_PRODUCTION_MODE', 'False') == 'True':
+    DATABASES['default'].update({
+        'ENGINE': 'contacts_api.sqlite_backend',
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '600')),
+        'OPTIONS': {
+            'pragmas': {
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+                'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+                'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),
+            },
+        },
+    })
+
+# Read replicas: DATABASE_REPLICAS is a comma-separated list of SQLite files,
+# or of hosts for other engines; the rest of each replica's config is copied
+# from the primary. Only views using ReplicaReadMixin read from them.
+DATABASE_REPLICAS = []
+for index, location in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    replica['NAME' if replica['ENGINE'].endswith(('sqlite3', 'sqlite_backend')) else 'HOST'] = location.strip()
+    DATABASES[alias] = replica
+    DATABASE_REPLICAS.append(alias)
+
+# Contact shards: CONTACT_SHARD_DATABASES adds shard aliases the same way.
+# Users are spread over 'default' and these by consistent hashing; each
+# shard allocates ids from its own range. See contacts/sharding.py.
+CONTACT_SHARDS = ['default']
+for index, location in enumerate(filter(None, os.getenv('CONTACT_SHARD_DATABASES', '').split(',')), start=1):
+    alias = f'shard_{index}'
+    shard = dict(DATABASES['default'])
+    shard['NAME' if shard['ENGINE'].endswith(('sqlite3', 'sqlite_backend')) else 'HOST'] = location.strip()
+    DATABASES[alias] = shard
+    CONTACT_SHARDS.append(alias)
+CONTACT_SHARD_ID_STRIDE = 10 ** 12
+
+DATABASE_ROUTERS = ['contacts.sharding.ShardRouter', 'contacts_api.db_routing.ReplicaRouter']
+# Seconds a client reads from the primary after writing; and before a
+# replica that failed to connect is tried again.
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '5'))
+DATABASE_REPLICA_RETRY_SECONDS = int(os.getenv('DATABASE_REPLICA_RETRY_SECONDS', '30'))
+
+# Cache
+# Local memory by default (one cache per process, fine for development and
+# tests). Production deployments with several workers should point this at a
+# shared cache, e.g. CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+# or django_redis.cache.RedisCache, so invalidation reaches every worker.
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'contacts-api'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '300')),
+    }
+}
+if CACHE_BACKEND.endswith('LocMemCache'):
+    # Size bound for the in-process cache; shared caches evict on their own.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))}
+# Whether every worker sees the same cache. Per-user cache generations (see
+# contacts/caching.py) only invalidate other workers' cached responses, pages,
+# duplicate groups, typeahead indexes and list ETags through a shared cache, so
+# those are off by default without one. Set CACHE_IS_SHARED=True to keep them
+# on with a local cache when the site runs a single worker process.
+CACHE_IS_SHARED = os.getenv(
+    'CACHE_IS_SHARED', str(not CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache'))),
+) == 'True'
+
+# API authentication. Bearer JWTs are checked from their claims alone (no
+# session or user lookup); sessions still work for the browsable API.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.StatelessJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '5'))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', '1'))),
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
+}
+
+# Sessions live in the database. SESSION_ENGINE=contacts_api.session_store
+# keeps them in the cache instead, writing data changes through to the database
+# and batching expiry-only refreshes (see contacts_api/session_store.py); it
+# needs a shared CACHE_BACKEND, or each worker sees its own copy of a session.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+SESSION_WRITE_BEHIND_INTERVAL = int(os.getenv('SESSION_WRITE_BEHIND_INTERVAL', '60'))
+SESSION_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('SESSION_WRITE_BEHIND_BATCH_SIZE', '500'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -123,6 +224,10 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploaded files (contact imports).
+MEDIA_URL = '/media/'
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -133,5 +238,98 @@ LOGIN_REDIRECT_URL = 'contact-list'
 LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@example.com')
+
+# Number of per-user typeahead indexes each process keeps in memory.
+CONTACTS_AUTOCOMPLETE_MAX_USERS = int(os.getenv('CONTACTS_AUTOCOMPLETE_MAX_USERS', '256'))
+
+# Limits for the bulk contact endpoints (/contacts/api/bulk/).
+CONTACTS_BULK_MAX_ITEMS = int(os.getenv('CONTACTS_BULK_MAX_ITEMS', '10000'))
+CONTACTS_BULK_BATCH_SIZE = int(os.getenv('CONTACTS_BULK_BATCH_SIZE', '500'))
+
+# Rows fetched per database round trip by the streaming contact export.
+CONTACTS_EXPORT_CHUNK_SIZE = int(os.getenv('CONTACTS_EXPORT_CHUNK_SIZE', '2000'))
+
+# Contact imports (/contacts/api/imports/). Uploads are queued for
+# `manage.py import_contacts --pending` unless processed inline.
+CONTACTS_IMPORT_BATCH_SIZE = int(os.getenv('CONTACTS_IMPORT_BATCH_SIZE', '1000'))
+CONTACTS_IMPORT_RUN_INLINE = os.getenv('CONTACTS_IMPORT_RUN_INLINE', 'False') == 'True'
+# A running import that has not checkpointed for this long is presumed dead
+# and can be resumed with `import_contacts --job`.
+CONTACTS_IMPORT_LEASE_SECONDS = int(os.getenv('CONTACTS_IMPORT_LEASE_SECONDS', '600'))
+
+# Delta sync (/contacts/api/sync/). Cursors older than the tombstone
+# retention get 410 Gone and must do a full sync.
+CONTACTS_SYNC_LAG = int(os.getenv('CONTACTS_SYNC_LAG', '2'))
+CONTACTS_TOMBSTONE_RETENTION_DAYS = int(os.getenv('CONTACTS_TOMBSTONE_RETENTION_DAYS', '90'))
+
+# Seconds a cached contact API list/retrieve response is kept; 0 disables it.
+# Both default to 0 without a shared cache (see CACHE_IS_SHARED).
+CONTACTS_RESPONSE_CACHE_TIMEOUT = int(os.getenv('CONTACTS_RESPONSE_CACHE_TIMEOUT', '300' if CACHE_IS_SHARED else '0'))
+# Seconds a rendered page of the HTML contact list is kept; 0 disables it.
+CONTACTS_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('CONTACTS_FRAGMENT_CACHE_TIMEOUT', '300' if CACHE_IS_SHARED else '0'))
+
+# Country calling code (digits, e.g. '1' or '44') assumed for phone numbers
+# written without one when normalizing them for exact lookups.
+CONTACTS_DEFAULT_COUNTRY_CODE = os.getenv('CONTACTS_DEFAULT_COUNTRY_CODE', '')
+
+# Duplicate detection (/contacts/api/duplicates/). Pairs scoring below the
+# minimum are ignored; blocking keys shared by more contacts than the maximum
+# block are not compared. Groups are cached until the user's next write.
+CONTACTS_DEDUP_MIN_SCORE = float(os.getenv('CONTACTS_DEDUP_MIN_SCORE', '0.7'))
+CONTACTS_DEDUP_MAX_BLOCK = int(os.getenv('CONTACTS_DEDUP_MAX_BLOCK', '100'))
+CONTACTS_DEDUP_CACHE_TIMEOUT = int(os.getenv('CONTACTS_DEDUP_CACHE_TIMEOUT', '3600' if CACHE_IS_SHARED else '0'))
+
+# Email outbox worker (`manage.py send_queued_email --loop`).
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '60'))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('OUTBOX_RETRY_MAX_SECONDS', '3600'))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+
+# Request metrics served at /metrics/ (see contacts_api/metrics.py). When
+# METRICS_TOKEN is set, scrapers must send it as a Bearer token.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Most SQL queries a request to each URL name may issue. Over-budget requests
+# raise with QUERY_BUDGETS_STRICT=True (always under `manage.py test`, see
+# contacts_api/test_runner.py) and are logged otherwise. Bearer-token
+# requests include one query against the token revocation table.
+QUERY_BUDGETS = {
+    'contact-api-list': 4,
+    'contact-api-detail': 10,
+    'contact-api-autocomplete': 2,
+    'contact-api-sync': 4,
+    'contact-api-duplicates': 3,
+    'contact-api-lookup': 2,
+    'contact-async-list': 3,
+    'contact-async-detail': 3,
+    'contact-list': 4,
+    'user-list': 4,
+    'verify-email': 4,
+    'token-obtain': 2,
+    'token-refresh': 2,
+    'token-logout': 3,
+}
+QUERY_BUDGETS_STRICT = os.getenv('QUERY_BUDGETS_STRICT', 'False') == 'True'
+# Switches QUERY_BUDGETS_STRICT on for the test suite.
+TEST_RUNNER = 'contacts_api.test_runner.TestRunner'
+
+# Request profiling (see profiling/middleware.py). Staff can profile one
+# request by sending an X-Profile header; PROFILING_SAMPLE_RATE profiles that
+# fraction of all requests. Profiles are listed in the admin.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile')
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '5'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', '200'))
+PROFILING_MAX_QUERIES = int(os.getenv('PROFILING_MAX_QUERIES', '1000'))
+
+# Async contact API (contacts/async_views.py): ORM work from async views runs
+# on a pool of this many threads, which also caps its concurrent queries.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', '8'))
+
+# Rows fetched per database round trip by the staff NDJSON export of the
+# user list (users/directory.py).
+USERS_EXPORT_CHUNK_SIZE = int(os.getenv('USERS_EXPORT_CHUNK_SIZE', '2000'))
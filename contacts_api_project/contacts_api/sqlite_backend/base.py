@@ -0,0 +1,147 @@
+"""
+SQLite backend tuned for serving production traffic.
+
+Use ``'ENGINE': 'contacts_api.sqlite_backend'``. On top of Django's SQLite
+backend it:
+
+* puts the database in WAL mode and applies the ``pragmas`` from ``OPTIONS``
+  (``synchronous=NORMAL``, ``busy_timeout``, ``mmap_size``, ``cache_size``...)
+  to every new connection, so readers never wait for the writer;
+* starts ``atomic()`` transactions with ``BEGIN IMMEDIATE``, so a transaction
+  takes the write lock up front instead of failing with "database is locked"
+  when it tries to upgrade its read lock half-way through;
+* serializes writers inside the process with one lock per database file, so
+  threads queue in Python rather than spinning in SQLite's busy handler, and
+  retries a write that still hits "database is locked" (another process held
+  the lock past ``busy_timeout``) with exponential backoff.
+
+Combine it with ``CONN_MAX_AGE`` so each thread keeps its connection, pragmas
+and page cache between requests.
+"""
+
+import random
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    """The in-process lock writers to the database file ``name`` share."""
+
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.RLock())
+
+
+def _is_locked_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def _is_write(query):
+    words = query.split(None, 1)
+    return bool(words) and words[0].upper() in WRITE_STATEMENTS
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+    """Take the write lock for statements that write outside a transaction."""
+
+    wrapper = None
+
+    def execute(self, query, params=None):
+        if self.wrapper is None or self.connection.in_transaction or not _is_write(query):
+            return super().execute(query, params)
+        with self.wrapper.write_lock:
+            return self.wrapper.retry_locked(base.SQLiteCursorWrapper.execute, self, query, params)
+
+    def executemany(self, query, param_list):
+        if self.wrapper is None or self.connection.in_transaction or not _is_write(query):
+            return super().executemany(query, param_list)
+        with self.wrapper.write_lock:
+            return self.wrapper.retry_locked(base.SQLiteCursorWrapper.executemany, self, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = dict(self.settings_dict.get('OPTIONS') or {})
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.lock_retries = options.get('lock_retries', 5)
+        self.lock_retry_delay = options.get('lock_retry_delay', 0.05)
+        self.write_lock = write_lock(self.settings_dict['NAME'])
+        self._holds_write_lock = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in ('pragmas', 'lock_retries', 'lock_retry_delay'):
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.wrapper = self
+        return cursor
+
+    def retry_locked(self, func, *args):
+        """Call ``func``, retrying with backoff while the database is locked."""
+
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return func(*args)
+            except base.Database.OperationalError as exc:
+                if attempt == self.lock_retries or not _is_locked_error(exc):
+                    raise
+            time.sleep(self.lock_retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def _start_transaction_under_autocommit(self):
+        self.write_lock.acquire()
+        self._holds_write_lock = True
+        try:
+            with self.wrap_database_errors:
+                self.retry_locked(self.connection.execute, 'BEGIN IMMEDIATE')
+        except BaseException:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self.write_lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
@@ -0,0 +1,20 @@
+"""
+Test runner that enforces ``QUERY_BUDGETS``.
+
+``QUERY_BUDGETS_STRICT`` is off in settings so production only logs an
+over-budget request; under ``manage.py test`` it is switched on, so a test
+that adds a query to a budgeted endpoint fails. Setting the
+``QUERY_BUDGETS_STRICT`` environment variable overrides this either way.
+"""
+
+import os
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGETS_STRICT = os.getenv('QUERY_BUDGETS_STRICT', 'True') == 'True'
@@ -1,6 +1,8 @@
+from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.urls import path, include
 
+from .metrics import metrics_view
 from .views import HomeView
 from users.views import CustomLoginView
 
@@ -10,4 +12,6 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('contacts/', include('contacts.urls')),
     path('users/', include('users.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('admin/', admin.site.urls),
 ]
\ No newline at end of file
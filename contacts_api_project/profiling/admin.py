@@ -0,0 +1,56 @@
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'query_count', 'mode', 'trigger')
+    list_filter = ('mode', 'trigger', 'view_name')
+    search_fields = ('path', 'view_name')
+    fields = (
+        'created_at', 'method', 'path', 'view_name', 'status_code', 'user', 'mode', 'trigger',
+        'duration_ms', 'query_count', 'query_ms', 'download', 'formatted_report', 'formatted_queries',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='profiling_requestprofile_download'),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.data), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{profile.download_name}"'
+        return response
+
+    @admin.display(description='Download')
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>', reverse('admin:profiling_requestprofile_download', args=[obj.pk]), obj.download_name,
+        )
+
+    @admin.display(description='Report')
+    def formatted_report(self, obj):
+        return format_html('<pre>{}</pre>', obj.report)
+
+    @admin.display(description='SQL')
+    def formatted_queries(self, obj):
+        return format_html(
+            '<pre>{}</pre>',
+            format_html_join('\n', '{} ms  [{}]  {}', ((f'{q["ms"]:>9.3f}', q['alias'], q['sql']) for q in obj.queries)),
+        )
@@ -0,0 +1,121 @@
+"""
+Opt-in request profiling.
+
+A request is profiled when either:
+
+* it sends ``X-Profile`` and comes from a staff user (session, or a bearer
+  token whose ``is_staff`` claim is set). ``X-Profile: cprofile`` or
+  ``X-Profile: sample`` picks the mode, any other value uses
+  ``PROFILING_MODE``; or
+* it falls in the ``PROFILING_SAMPLE_RATE`` fraction of all requests.
+
+Profiles are stored as ``RequestProfile`` rows, viewable and downloadable in
+the admin. Only the newest ``PROFILING_MAX_PROFILES`` are kept. Under ASGI
+the middleware runs async and profiles in ``sql`` mode (see ``profiler``).
+"""
+
+import asyncio
+import logging
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+
+from contacts_api.asyncdb import run_orm
+from users.authentication import StatelessJWTAuthentication
+
+from .models import RequestProfile
+from .profiler import RequestProfiler
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        authenticated = StatelessJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def store_profile(request, response, profiler, trigger):
+    report, data = profiler.report()
+    user = getattr(request, 'user', None)
+    match = getattr(request, 'resolver_match', None)
+    # Written to the primary explicitly so a profiled read does not count as
+    # a write for replica stickiness.
+    profile = RequestProfile.objects.using(DEFAULT_DB_ALIAS).create(
+        method=request.method,
+        path=request.get_full_path(),
+        view_name=match.view_name if match is not None else '',
+        status_code=response.status_code,
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        mode=profiler.mode,
+        trigger=trigger,
+        duration_ms=profiler.duration * 1000,
+        query_count=profiler.query_count,
+        query_ms=profiler.query_time * 1000,
+        report=report,
+        data=data,
+        queries=profiler.queries,
+    )
+    keep = getattr(settings, 'PROFILING_MAX_PROFILES', 200)
+    RequestProfile.objects.using(DEFAULT_DB_ALIAS).filter(pk__lte=profile.pk - keep).delete()
+    return profile
+
+
+class ProfilingMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def _trigger(self, request):
+        if HEADER in request.headers and _is_staff(request):
+            return RequestProfile.HEADER
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if rate > 0 and random.random() < rate:
+            return RequestProfile.SAMPLED
+        return None
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        mode = getattr(settings, 'PROFILING_MODE', RequestProfile.CPROFILE)
+        if trigger == RequestProfile.HEADER and request.headers[HEADER] in dict(RequestProfile.MODE_CHOICES):
+            mode = request.headers[HEADER]
+        with RequestProfiler(mode) as profiler:
+            response = self.get_response(request)
+        try:
+            store_profile(request, response, profiler, trigger)
+        except Exception:
+            logger.exception('Could not store the profile of %s %s', request.method, request.path)
+        return response
+
+    async def __acall__(self, request):
+        # Checking for staff may load the session user, which needs the ORM.
+        trigger = await run_orm(self._trigger, request) if HEADER in request.headers else self._trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+
+        with RequestProfiler(RequestProfile.SQL) as profiler:
+            response = await self.get_response(request)
+        try:
+            await run_orm(store_profile, request, response, profiler, trigger)
+        except Exception:
+            logger.exception('Could not store the profile of %s %s', request.method, request.path)
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField()),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Stack sampling')], max_length=10)),
+                ('trigger', models.CharField(choices=[('sampled', 'Sampled'), ('header', 'Requested by header')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('query_ms', models.FloatField(default=0)),
+                ('report', models.TextField(blank=True)),
+                ('data', models.BinaryField(blank=True)),
+                ('queries', models.JSONField(blank=True, default=list)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
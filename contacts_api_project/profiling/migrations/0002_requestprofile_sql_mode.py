@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='requestprofile',
+            name='mode',
+            field=models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Stack sampling'), ('sql', 'SQL only')], max_length=10),
+        ),
+    ]
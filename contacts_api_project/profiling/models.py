@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class RequestProfile(models.Model):
+    """Profile of one request, kept in a ring buffer of the most recent ones."""
+
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    # Async requests under ASGI: timings and the SQL trace only.
+    SQL = 'sql'
+    MODE_CHOICES = [(CPROFILE, 'cProfile'), (SAMPLE, 'Stack sampling'), (SQL, 'SQL only')]
+
+    SAMPLED = 'sampled'
+    HEADER = 'header'
+    TRIGGER_CHOICES = [(SAMPLED, 'Sampled'), (HEADER, 'Requested by header')]
+
+    created_at = models.DateTimeField(default=timezone.now)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    # Human-readable summary: pstats output or the heaviest sampled stacks.
+    report = models.TextField(blank=True)
+    # Download: marshalled pstats (open with pstats/snakeviz) or collapsed
+    # stacks (flamegraph.pl / speedscope).
+    data = models.BinaryField(blank=True)
+    queries = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+    @property
+    def download_name(self):
+        if self.mode == self.CPROFILE:
+            return f'profile-{self.pk}.prof'
+        if self.mode == self.SQL:
+            return f'profile-{self.pk}.sql.json'
+        return f'profile-{self.pk}.collapsed.txt'
+
+    class Meta:
+        ordering = ['-id']
@@ -0,0 +1,148 @@
+"""
+Collectors used to profile a single request.
+
+``RequestProfiler`` wraps the request in either ``cProfile`` (deterministic,
+exact call counts, roughly doubles the request time) or a ``StackSampler``
+(a background thread that records the request thread's stack every few
+milliseconds; cheap enough for production sampling). Both modes also trace
+every SQL statement on every database alias. Under ASGI the middleware
+runs on the event loop, which every in-flight request shares, so requests
+are profiled in ``sql`` mode there: timings and the SQL trace only.
+"""
+
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+
+from contacts_api.query_context import wrap_queries
+
+from .models import RequestProfile
+
+REPORT_LINES = 60
+
+
+def _short_filename(filename):
+    for marker in ('site-packages' + os.sep, str(settings.BASE_DIR) + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+class StackSampler:
+    """Count the stacks of one thread, sampled every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({_short_filename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Stacks in the "collapsed" format understood by flame graph tools."""
+
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        total = sum(self.stacks.values())
+        if not total:
+            return 'No samples; the request finished within one sampling interval.'
+        functions = Counter()
+        for stack, count in self.stacks.items():
+            # Inclusive counts: every function on the stack was running.
+            for function in set(stack.split(';')):
+                functions[function] += count
+        lines = [f'{total} samples every {self.interval * 1000:g} ms', '', '  % incl  function']
+        lines += [f'{count / total:7.1%}  {function}' for function, count in functions.most_common(REPORT_LINES)]
+        return '\n'.join(lines)
+
+
+class RequestProfiler:
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL_MS', 5) / 1000
+        self.max_queries = getattr(settings, 'PROFILING_MAX_QUERIES', 1000)
+        self.queries = []
+        self.query_count = 0
+        self.query_time = 0.0
+        self.duration = 0.0
+        self._profile = None
+        self._sampler = None
+
+    def _trace(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_count += 1
+            self.query_time += elapsed
+            if len(self.queries) < self.max_queries:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'ms': round(elapsed * 1000, 3),
+                    'many': many,
+                })
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self._stack.enter_context(wrap_queries(self._trace))
+        if self.mode == RequestProfile.CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.mode == RequestProfile.SAMPLE:
+            self._sampler = StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        elif self._sampler is not None:
+            self._sampler.stop()
+        self._stack.close()
+
+    def report(self):
+        """``(text summary, downloadable bytes)`` for the finished request."""
+
+        if self._profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+            return stream.getvalue(), marshal.dumps(stats.stats)
+        if self._sampler is not None:
+            return self._sampler.summary(), self._sampler.collapsed().encode()
+        summary = f'{self.duration * 1000:.1f} ms, {self.query_count} queries in {self.query_time * 1000:.1f} ms'
+        return summary, json.dumps(self.queries, indent=2).encode()
@@ -0,0 +1,91 @@
+import marshal
+
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from contacts.models import Contact
+from users.authentication import ClaimsRefreshToken
+from users.models import User
+from .models import RequestProfile
+
+
+@override_settings(QUERY_BUDGETS={}, PROFILING_SAMPLE_RATE=0)
+class RequestProfilingTests(APITestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass', is_staff=True, is_superuser=True)
+        self.user = User.objects.create_user(username='plain', password='testpass', email_confirmed=True)
+        Contact.objects.create(user=self.staff, name='Ann')
+
+    def test_staff_header_profiles_one_request(self):
+        self.client.login(username='staff', password='testpass')
+        response = self.client.get(reverse('contact-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.view_name, profile.trigger, profile.mode), ('contact-list', 'header', 'cprofile'))
+        self.assertEqual(profile.user, self.staff)
+        self.assertIn('cumulative', profile.report)
+        self.assertTrue(marshal.loads(bytes(profile.data)))
+        self.assertGreater(profile.query_count, 0)
+        self.assertTrue(any('contacts_contact' in query['sql'] for query in profile.queries))
+
+        # Without the header nothing is recorded.
+        self.client.get(reverse('contact-list'))
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_header_is_ignored_for_non_staff(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(reverse('contact-api-list'), HTTP_X_PROFILE='1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_staff_bearer_token_can_request_stack_sampling(self):
+        token = ClaimsRefreshToken.for_user(self.staff).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(reverse('contact-api-list'), HTTP_X_PROFILE='sample')
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.view_name, profile.mode), ('contact-api-list', 'sample'))
+        self.assertIn('samples', profile.report)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2)
+    def test_sampled_profiles_are_kept_in_a_ring_buffer(self):
+        for _ in range(3):
+            self.client.get(reverse('home'))
+        profiles = list(RequestProfile.objects.all())
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(all(profile.trigger == 'sampled' for profile in profiles))
+
+    def test_admin_shows_and_downloads_profiles(self):
+        self.client.login(username='staff', password='testpass')
+        self.client.get(reverse('contact-list'), HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+
+        page = self.client.get(reverse('admin:profiling_requestprofile_change', args=[profile.pk]))
+        self.assertContains(page, 'contacts_contact')
+        download = self.client.get(reverse('admin:profiling_requestprofile_download', args=[profile.pk]))
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="profile-{profile.pk}.prof"')
+        self.assertEqual(download.content, bytes(profile.data))
+
+
+@override_settings(QUERY_BUDGETS={}, PROFILING_SAMPLE_RATE=0, CONTACTS_RESPONSE_CACHE_TIMEOUT=0)
+class AsyncRequestProfilingTests(TransactionTestCase):
+
+    def setUp(self):
+        staff = User.objects.create_user(username='staff', password='testpass', is_staff=True)
+        Contact.objects.create(user=staff, name='Ann')
+        self.token = str(ClaimsRefreshToken.for_user(staff).access_token)
+
+    async def test_async_requests_get_sql_only_profiles(self):
+        response = await self.async_client.get(
+            reverse('contact-async-list'), **{'authorization': f'Bearer {self.token}', 'x-profile': '1'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        profile = await sync_to_async(RequestProfile.objects.get)()
+        self.assertEqual((profile.view_name, profile.mode), ('contact-async-list', 'sql'))
+        self.assertTrue(any('contacts_contact' in query['sql'] for query in profile.queries))
@@ -1,4 +1,11 @@
 from django.contrib import admin
-from .models import User
+from .models import OutgoingEmail, User
 
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
@@ -0,0 +1,104 @@
+"""
+Stateless JWT authentication for the API.
+
+Access tokens carry the user's id, username and ``email_confirmed`` and
+``is_staff`` flags, and ``StatelessJWTAuthentication`` turns a valid token
+into a ``ClaimsUser`` built from those claims alone. An authenticated API
+request therefore needs neither a session-table read nor a ``users.User``
+SELECT.
+
+Logout works through a small revocation list (``TokenRevocation``) kept in
+the database, so every worker sees it: single tokens are revoked by ``jti``
+until they would have expired anyway, and ``revoke_user_tokens`` rejects
+every token issued to a user before a given moment (used after a password
+reset). Checking it costs one indexed query per authenticated request.
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTTokenUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenRevocation
+
+REVOKED_TOKEN_KEY = 'jti:{jti}'
+REVOKED_BEFORE_KEY = 'user:{user_id}'
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the claims the API authorizes on."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['iat'] = time.time()
+        token['username'] = user.get_username()
+        token['email_confirmed'] = user.email_confirmed
+        token['is_staff'] = user.is_staff
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """Request user backed by token claims instead of a database row."""
+
+    @property
+    def email_confirmed(self):
+        return self.token.get('email_confirmed', False)
+
+
+def _purge_expired(now):
+    TokenRevocation.objects.filter(expires_at__lte=now).delete()
+
+
+def revoke_tokens(tokens):
+    """Reject each of ``tokens`` from now until its expiry."""
+
+    now = timezone.now()
+    rows = []
+    for token in tokens:
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        if expires_at > now:
+            rows.append(TokenRevocation(
+                key=REVOKED_TOKEN_KEY.format(jti=token[api_settings.JTI_CLAIM]), expires_at=expires_at,
+            ))
+    _purge_expired(now)
+    # A jti is revoked for good, so an existing row is already the right one.
+    TokenRevocation.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def revoke_user_tokens(user_id):
+    """Reject every token issued to ``user_id`` before now."""
+
+    now = timezone.now()
+    _purge_expired(now)
+    TokenRevocation.objects.update_or_create(
+        key=REVOKED_BEFORE_KEY.format(user_id=user_id),
+        defaults={'expires_at': now + api_settings.REFRESH_TOKEN_LIFETIME, 'revoked_before': time.time()},
+    )
+
+
+def is_revoked(token):
+    jti_key = REVOKED_TOKEN_KEY.format(jti=token.get(api_settings.JTI_CLAIM))
+    before_key = REVOKED_BEFORE_KEY.format(user_id=token.get(api_settings.USER_ID_CLAIM))
+    found = dict(TokenRevocation.objects.filter(
+        key__in=[jti_key, before_key], expires_at__gt=timezone.now(),
+    ).values_list('key', 'revoked_before'))
+    if jti_key in found:
+        return True
+    revoked_before = found.get(before_key)
+    return revoked_before is not None and token.get('iat', 0) < revoked_before
+
+
+class StatelessJWTAuthentication(JWTTokenUserAuthentication):
+    """``Authorization: Bearer <access>`` authentication without a user lookup."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken({'detail': 'Token has been revoked.', 'code': 'token_revoked'})
+        return token
@@ -0,0 +1,97 @@
+"""
+Paging, searching and exporting the user directory.
+
+``UserListView`` pages with ``UserCursorPagination`` (keyset pagination on
+the unique ``username``, so deep pages cost the same as the first) and
+serves rows from ``values()`` through a ``RowSerializer``: only the
+``UserSerializer`` columns are selected, never the password hash or the
+confirmation and reset codes.
+
+``?search=`` is a case-insensitive prefix match on username or email. It
+is written as a range on ``LOWER(column)`` (``lower('Ann') <=
+lower(username) < lower('Ann') || U+10FFFF``), which the functional indexes
+on ``User`` can answer; a ``LIKE``/``icontains`` would scan the whole table.
+The term is lowercased by the database too, so both sides fold case the
+same way (SQLite's ``LOWER()`` only folds ASCII letters).
+
+Staff can stream the whole (searched, projected) directory as
+newline-delimited JSON with ``?format=ndjson`` or
+``Accept: application/x-ndjson``. Rows are read in chunks of
+``USERS_EXPORT_CHUNK_SIZE`` and written as they arrive.
+"""
+
+import json
+
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Lower
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.renderers import JSONRenderer
+
+from contacts.exporters import buffered
+from contacts.pagination import KeysetPagination
+
+# Sorts after every other character: ``prefix + PREFIX_END`` bounds the strings starting with ``prefix``.
+PREFIX_END = chr(0x10FFFF)
+
+
+class UserCursorPagination(KeysetPagination):
+    """Keyset pagination for users, backed by the unique index on ``username``."""
+
+    page_size = 100
+    max_page_size = 1000
+    # Usernames are unique, so they alone give a total ordering.
+    ordering = ('username',)
+
+
+class UserSearchFilter(BaseFilterBackend):
+    """``?search=`` prefix match on username or email over the ``LOWER()`` indexes."""
+
+    search_param = 'search'
+    columns = ('username', 'email')
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        low = Lower(Value(term))
+        high = Concat(low, Value(PREFIX_END))
+        condition = Q()
+        for column in self.columns:
+            condition |= Q(**{f'{column}_lower__gte': low, f'{column}_lower__lt': high})
+        return queryset.alias(**{f'{column}_lower': Lower(column) for column in self.columns}).filter(condition)
+
+
+class NDJSONRenderer(JSONRenderer):
+    """One JSON document per line; a list becomes one line per item."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        encode = super().render
+        return b''.join(encode(item) + b'\n' for item in items)
+
+
+def ndjson_stream(rows, queryset, ordering, chunk_size):
+    """``bytes`` chunks of ``queryset`` as NDJSON, serialized by the ``RowSerializer`` ``rows``."""
+
+    values = queryset.order_by(*ordering).values(*rows.columns).iterator(chunk_size=chunk_size)
+
+    def lines():
+        batch = []
+        for row in values:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield from _encode(rows, batch)
+                batch = []
+        yield from _encode(rows, batch)
+
+    return buffered(lines())
+
+
+def _encode(rows, batch):
+    for item in rows.to_representation(batch):
+        yield json.dumps(item, ensure_ascii=False) + '\n'
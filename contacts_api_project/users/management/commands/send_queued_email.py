@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox, once or continuously with --loop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages sent per SMTP connection.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}.')
+            if not options['loop']:
+                break
+            if not (sent or failed):
+                time.sleep(options['interval'])
@@ -2,6 +2,7 @@ import secrets
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -30,3 +31,63 @@ class User(AbstractUser):
         self.password_reset_code = code
         self.password_reset_requested_at = timezone.now()
         return code
+
+    class Meta(AbstractUser.Meta):
+        # Case-insensitive prefix search on the user list (users/directory.py).
+        indexes = [
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    """An email queued by a view and delivered later by the outbox worker."""
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the message is next due; while sending, when the worker's lease runs out.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipient} ({self.status})'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+
+class TokenRevocation(models.Model):
+    """
+    A revoked JWT (``key`` ``jti:<jti>``) or a user's cut-off (``key``
+    ``user:<id>``) before which all of their tokens are rejected.
+
+    Kept in the database rather than the cache so that every worker sees a
+    logout or password reset. Rows are useless once ``expires_at`` passes.
+    """
+
+    key = models.CharField(max_length=300, unique=True)
+    revoked_before = models.FloatField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
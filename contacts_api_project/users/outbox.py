@@ -0,0 +1,125 @@
+"""
+Persistent email outbox.
+
+Views call ``enqueue_email`` instead of ``send_mail``, which only inserts an
+``OutgoingEmail`` row, so no request waits on an SMTP handshake. The
+``send_queued_email`` management command runs ``deliver_pending`` in a loop:
+it claims a batch of due messages, sends them all over one reused SMTP
+connection and records the outcome of each. Failed messages are retried with
+exponential backoff until ``OUTBOX_MAX_ATTEMPTS`` is reached.
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, body, recipient, from_email=None):
+    """Queue a plain-text email for delivery by the outbox worker."""
+
+    return OutgoingEmail.objects.create(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        from_email=from_email or _setting('DEFAULT_FROM_EMAIL', 'no-reply@example.com'),
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next try after ``attempts`` failed deliveries."""
+
+    base = _setting('OUTBOX_RETRY_BASE_SECONDS', 60)
+    cap = _setting('OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def claim_batch(batch_size):
+    """Atomically take up to ``batch_size`` due messages for this worker."""
+
+    now = timezone.now()
+    # Messages whose worker died mid-batch become due again once the lease expires.
+    OutgoingEmail.objects.filter(status=OutgoingEmail.SENDING, next_attempt_at__lte=now).update(
+        status=OutgoingEmail.PENDING, claim_token='',
+    )
+    due = list(
+        OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not due:
+        return []
+    token = uuid.uuid4().hex
+    lease = timedelta(seconds=_setting('OUTBOX_LEASE_SECONDS', 300))
+    OutgoingEmail.objects.filter(id__in=due, status=OutgoingEmail.PENDING).update(
+        status=OutgoingEmail.SENDING, claim_token=token, next_attempt_at=now + lease,
+    )
+    return list(OutgoingEmail.objects.filter(claim_token=token, status=OutgoingEmail.SENDING).order_by('id'))
+
+
+def deliver_pending(batch_size=None, connection=None):
+    """
+    Send one batch of due messages over a single connection.
+
+    Returns ``(sent, failed)`` counts for the batch.
+    """
+
+    emails = claim_batch(batch_size or _setting('OUTBOX_BATCH_SIZE', 100))
+    if not emails:
+        return 0, 0
+
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 5)
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        connection.open()
+        for email in emails:
+            email.attempts += 1
+            email.claim_token = ''
+            try:
+                EmailMessage(
+                    email.subject, email.body, email.from_email, [email.recipient], connection=connection,
+                ).send()
+            except Exception as exc:
+                failed += 1
+                email.last_error = str(exc)
+                if email.attempts >= max_attempts:
+                    email.status = OutgoingEmail.FAILED
+                else:
+                    email.status = OutgoingEmail.PENDING
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                logger.warning('Delivery of email #%s failed (attempt %s): %s', email.pk, email.attempts, exc)
+            else:
+                sent += 1
+                email.status = OutgoingEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+    except Exception as exc:
+        # Could not connect at all: put the whole batch back with backoff.
+        logger.warning('Could not open email connection: %s', exc)
+        for email in emails:
+            if email.status == OutgoingEmail.SENDING:
+                failed += 1
+                email.attempts += 1
+                email.claim_token = ''
+                email.last_error = str(exc)
+                email.status = OutgoingEmail.FAILED if email.attempts >= max_attempts else OutgoingEmail.PENDING
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    finally:
+        connection.close()
+        OutgoingEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'claim_token', 'last_error', 'next_attempt_at', 'sent_at'],
+        )
+    return sent, failed
@@ -1,9 +1,52 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from .authentication import ClaimsRefreshToken, is_revoked
 from .models import User
 
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone']
+
+class TokenObtainSerializer(TokenObtainPairSerializer):
+    """Issue an access/refresh pair to users who have confirmed their email."""
+
+    default_error_messages = {
+        'email_not_confirmed': 'Please confirm your email address before logging in.',
+    }
+
+    @classmethod
+    def get_token(cls, user):
+        return ClaimsRefreshToken.for_user(user)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if not self.user.email_confirmed:
+            raise exceptions.AuthenticationFailed(
+                self.error_messages['email_not_confirmed'], 'email_not_confirmed',
+            )
+        return data
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Refuse to mint access tokens from a revoked refresh token."""
+
+    def validate(self, attrs):
+        if is_revoked(RefreshToken(attrs['refresh'])):
+            raise InvalidToken({'detail': 'Token has been revoked.', 'code': 'token_revoked'})
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as exc:
+            raise serializers.ValidationError(str(exc))
@@ -1,7 +1,25 @@
+import io
+import json
+import socketserver
+import threading
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from users.models import User
+from contacts_api import session_store
+from contacts_api.session_store import SessionStore, flush_expiry_updates
+from users.authentication import revoke_user_tokens
+from users.models import OutgoingEmail, TokenRevocation, User
+from users.outbox import deliver_pending, enqueue_email
+from users.utils import get_request_user
 from contacts.models import Contact
 
 class ContactTests(APITestCase):
@@ -56,4 +74,355 @@ class ContactTests(APITestCase):
         url = reverse('contact-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Should only return contacts for the logged-in user
\ No newline at end of file
+        self.assertEqual(len(response.data), 1)  # Should only return contacts for the logged-in user
+
+class _SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server that records connections and messages."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        self.reject = set()
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode('utf-8').rstrip('\r\n')
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip('<> ')
+                if address in self.server.reject:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline().decode('utf-8')
+                    if chunk in ('.\r\n', '.\n'):
+                        break
+                    data.append(chunk)
+                self.server.messages.append((recipients, ''.join(data)))
+                self.reply('250 OK queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        self.server = _SMTPStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server.server_address[1],
+            EMAIL_TIMEOUT=5,
+        )
+        smtp.enable()
+        self.addCleanup(smtp.disable)
+
+    def test_registration_only_enqueues(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'newbie',
+            'email': 'newbie@example.com',
+            'password1': 'a-Strong-passw0rd',
+            'password2': 'a-Strong-passw0rd',
+        })
+        self.assertRedirects(response, reverse('verify-email'))
+        self.assertEqual(self.server.connections, 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.recipient, email.status), ('newbie@example.com', OutgoingEmail.PENDING))
+        self.assertIn(User.objects.get(username='newbie').email_confirmation_code, email.body)
+
+    def test_worker_sends_batch_over_one_connection(self):
+        for index in range(3):
+            enqueue_email('Hello', f'Message {index}', f'user{index}@example.com')
+        call_command('send_queued_email', stdout=io.StringIO())
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_SECONDS=60)
+    def test_failures_back_off_then_give_up(self):
+        self.server.reject.add('bounce@example.com')
+        email = enqueue_email('Hello', 'Body', 'bounce@example.com')
+        enqueue_email('Hello', 'Body', 'fine@example.com')
+        self.assertEqual(deliver_pending(), (1, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        self.assertEqual(deliver_pending(), (0, 0))  # not due yet
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertIn('550', email.last_error)
+
+    def test_unreachable_server_requeues_batch(self):
+        email = enqueue_email('Hello', 'Body', 'someone@example.com')
+        with override_settings(EMAIL_PORT=1):
+            self.assertEqual(deliver_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.PENDING, 1))
+
+
+class JWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jwtuser', email='jwt@example.com', password='testpass', email_confirmed=True,
+        )
+        Contact.objects.create(user=self.user, name='Ada', email='ada@example.com', phone='123', address='')
+
+    def obtain(self, username='jwtuser', password='testpass'):
+        return self.client.post(reverse('token-obtain'), {'username': username, 'password': password})
+
+    def bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_obtain_requires_confirmed_email(self):
+        User.objects.create_user(username='pending', password='testpass')
+        self.assertEqual(self.obtain('pending').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.obtain(password='wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.obtain()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+
+    def test_contact_queries_skip_session_and_user_lookups(self):
+        self.bearer(self.obtain().data['access'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('contact-api-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Ada'])
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('users_user', tables)
+        self.assertNotIn('django_session', tables)
+
+    def test_refresh_issues_access_token_with_claims(self):
+        response = self.client.post(reverse('token-refresh'), {'refresh': self.obtain().data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.bearer(response.data['access'])
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        tokens = self.obtain().data
+        self.bearer(tokens['access'])
+        response = self.client.post(reverse('token-logout'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocations_do_not_depend_on_the_cache(self):
+        tokens = self.obtain().data
+        self.bearer(tokens['access'])
+        self.client.post(reverse('token-logout'), {'refresh': tokens['refresh']})
+        # Another worker has its own cache; the revocation must still apply there.
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(TokenRevocation.objects.count(), 2)
+
+    def test_revoking_purges_expired_revocations(self):
+        TokenRevocation.objects.create(key='jti:old', expires_at=timezone.now() - timedelta(seconds=1))
+        revoke_user_tokens(self.user.pk)
+        self.assertEqual(list(TokenRevocation.objects.values_list('key', flat=True)), [f'user:{self.user.pk}'])
+
+    def test_revoking_user_tokens_rejects_earlier_tokens(self):
+        old = self.obtain().data['access']
+        revoke_user_tokens(self.user.pk)
+        new = self.obtain().data['access']
+        self.bearer(old)
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.bearer(new)
+        self.assertEqual(self.client.get(reverse('contact-api-list')).status_code, status.HTTP_200_OK)
+
+
+@override_settings(SESSION_WRITE_BEHIND_INTERVAL=3600, SESSION_WRITE_BEHIND_BATCH_SIZE=3)
+class SessionStoreTests(TestCase):
+
+    def setUp(self):
+        flush_expiry_updates()
+
+    def create_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        return session.session_key
+
+    def test_data_changes_are_written_through(self):
+        key = self.create_session(step=1)
+        session = SessionStore(key)
+        session['step'] = 2
+        session.save()
+        self.assertEqual(Session.objects.get(pk=key).get_decoded(), {'step': 2})
+
+    def test_expiry_only_saves_are_batched(self):
+        keys = [self.create_session(step=index) for index in range(2)]
+        Session.objects.update(expire_date=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            for key in keys:
+                session = SessionStore(key)
+                session['step'] = session['step']
+                session.save()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(session_store._pending), 2)
+
+        third = self.create_session(step=2)
+        session = SessionStore(third)
+        session.load()
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(session_store._pending)
+        for stored in Session.objects.all():
+            self.assertGreater(stored.expire_date, timezone.now() + timedelta(days=1))
+
+    def test_delete_drops_queued_expiry(self):
+        key = self.create_session(step=1)
+        session = SessionStore(key)
+        session.load()
+        session.save()
+        session.delete()
+        self.assertNotIn(key, session_store._pending)
+        self.assertFalse(Session.objects.filter(pk=key).exists())
+
+
+class RequestUserCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached', password='testpass')
+
+    def test_user_loaded_once_per_request(self):
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_request_user(request, self.user.pk), self.user)
+            self.assertEqual(get_request_user(request, self.user.pk), self.user)
+
+    def test_reset_view_reuses_logged_in_user(self):
+        self.client.login(username='cached', password='testpass')
+        session = self.client.session
+        session['password_reset_user_id'] = self.user.pk
+        session.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reset-password-confirm'))
+        self.assertEqual(response.status_code, 200)
+        user_queries = [query for query in queries if 'FROM "users_user"' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+
+
+class UserFieldProjectionTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sparse', password='testpass', email='s@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_list_and_detail_narrow_serializer_and_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            listed = self.client.get(reverse('user-list'), {'fields': 'id,username'})
+        self.assertEqual(listed.data['results'], [{'id': self.user.id, 'username': 'sparse'}])
+        select = next(query['sql'] for query in queries if 'FROM "users_user"' in query['sql'])
+        self.assertNotIn('"phone"', select)
+
+        detail = self.client.get(reverse('user-detail', args=[self.user.id]), {'exclude': 'phone,email'})
+        self.assertEqual(list(detail.data), ['id', 'username', 'first_name', 'last_name'])
+
+    def test_unknown_field_is_a_bad_request(self):
+        response = self.client.get(reverse('user-list'), {'exclude': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserDirectoryTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        for username, email in [
+            ('anna', 'anna@example.com'),
+            ('Annabel', 'bel@example.com'),
+            ('bob', 'ANNIE@example.com'),
+            ('joanne', 'jo@example.com'),
+        ]:
+            User.objects.create_user(username=username, email=email, password='testpass')
+        self.user = User.objects.get(username='bob')
+        self.url = reverse('user-list')
+
+    def test_list_is_cursor_paginated_without_secret_columns(self):
+        self.client.force_authenticate(self.user)
+        usernames = []
+        url = self.url + '?page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url).data
+                usernames += [row['username'] for row in page['results']]
+                url = page['next']
+        self.assertEqual(usernames, sorted(User.objects.values_list('username', flat=True)))
+        self.assertEqual(list(page['results'][0]), ['id', 'username', 'email', 'first_name', 'last_name', 'phone'])
+        selects = ' '.join(query['sql'] for query in queries if 'FROM "users_user"' in query['sql'])
+        for column in ('password', 'email_confirmation_code', 'password_reset_code'):
+            self.assertNotIn(f'"{column}"', selects)
+
+    def test_search_is_an_indexed_case_insensitive_prefix_match(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'search': 'ANN'})
+        self.assertEqual([row['username'] for row in response.data['results']], ['Annabel', 'anna', 'bob'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {queries[-1]["sql"]}')
+            plan = str(cursor.fetchall())
+        self.assertIn('user_username_lower_idx', plan)
+        self.assertIn('user_email_lower_idx', plan)
+
+    def test_search_folds_the_term_like_the_indexed_columns(self):
+        User.objects.create_user(username='Émile', email='Zoë@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+        for term in ('ÉM', 'zo', 'ZOë@'):
+            response = self.client.get(self.url, {'search': term})
+            self.assertEqual([row['username'] for row in response.data['results']], ['Émile'], term)
+
+    def test_staff_can_stream_ndjson(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, {'format': 'ndjson', 'search': 'ann', 'fields': 'username,email'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'username': 'Annabel', 'email': 'bel@example.com'},
+            {'username': 'anna', 'email': 'anna@example.com'},
+            {'username': 'bob', 'email': 'ANNIE@example.com'},
+        ])
+        response = self.client.get(self.url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), User.objects.count())
+
+    def test_ndjson_export_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -4,6 +4,9 @@ from .views import (
     ForgotPasswordView,
     RegisterView,
     ResetPasswordConfirmView,
+    TokenLogoutView,
+    TokenObtainView,
+    TokenRefreshView,
     UserDetailView,
     UserListView,
     VerifyEmailView,
@@ -15,5 +18,8 @@ urlpatterns = [
     path('password/forgot/', ForgotPasswordView.as_view(), name='forgot-password'),
     path('password/reset/', ResetPasswordConfirmView.as_view(), name='reset-password-confirm'),
     path('api/', UserListView.as_view(), name='user-list'),
+    path('api/token/', TokenObtainView.as_view(), name='token-obtain'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/token/logout/', TokenLogoutView.as_view(), name='token-logout'),
     path('api/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
 ]
\ No newline at end of file
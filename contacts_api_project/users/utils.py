@@ -0,0 +1,33 @@
+from typing import Optional
+
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.http import HttpRequest
+from django.utils.functional import empty
+
+from .models import User as UserModel
+
+
+def get_request_user(request: HttpRequest, pk: Optional[int]) -> Optional[UserModel]:
+    """
+    Return the user with ``pk``, loading it at most once per request.
+
+    Resolves through ``request.user`` when it is (or will be) the same
+    account, so a view that looks a user up by a session-stored id does not
+    repeat the SELECT the auth middleware makes for the logged-in user.
+    """
+
+    if pk is None:
+        return None
+    users = request.__dict__.setdefault('_users_by_pk', {})
+    if pk not in users:
+        current = getattr(request, 'user', None)
+        session = getattr(request, 'session', None)
+        same_account = current is not None and (
+            getattr(current, '_wrapped', None) is not empty
+            or (session is not None and session.get(SESSION_KEY) == str(pk))
+        )
+        if same_account and current.pk == pk:
+            users[pk] = current
+        else:
+            users[pk] = get_user_model().objects.filter(pk=pk).first()
+    return users[pk]
@@ -3,16 +3,25 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth import views as auth_views
-from django.core.mail import send_mail
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, FormView
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from rest_framework_simplejwt import views as jwt_views
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 from typing import Optional, cast
 
+from contacts_api.db_routing import ReplicaReadMixin
+from contacts_api.projection import FieldProjectionMixin
+from contacts.rows import RowSerializer, ValuesListMixin
+
 from .forms import (
     CustomUserCreationForm,
     EmailAwareAuthenticationForm,
@@ -20,30 +29,93 @@ from .forms import (
     PasswordResetConfirmForm,
     PasswordResetRequestForm,
 )
-from .serializers import UserSerializer
+from .authentication import revoke_tokens, revoke_user_tokens
+from .directory import NDJSONRenderer, UserCursorPagination, UserSearchFilter, ndjson_stream
+from .outbox import enqueue_email
+from .serializers import LogoutSerializer, TokenObtainSerializer, TokenRefreshSerializer, UserSerializer
+from .utils import get_request_user
 from .models import User as UserModel
 
 User = get_user_model()
 
 
-class UserListView(generics.ListCreateAPIView):
-    """List users (authenticated) or create a new user (open registration)."""
+class UserListView(ReplicaReadMixin, FieldProjectionMixin, ValuesListMixin, generics.ListCreateAPIView):
+    """
+    List users (authenticated) or create a new user (open registration).
+
+    The list is cursor-paginated and searchable with ``?search=``; staff can
+    stream all of it as NDJSON (see ``users.directory``).
+    """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
+    filter_backends = [UserSearchFilter]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get_permissions(self):
         if self.request.method == 'POST':
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return self.export(request)
+        return super().list(request, *args, **kwargs)
+
+    def export(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied('Only staff can export the user directory.')
+        rows = RowSerializer.for_serializer(self.get_serializer_class())
+        if self.projected_fields() is not None:
+            rows = rows.project(self.projected_fields())
+        queryset = self.filter_queryset(self.get_queryset())
+        # The body is read after the view returns; keep the database chosen for this request.
+        queryset = queryset.using(queryset.db)
+        chunks = ndjson_stream(
+            rows,
+            queryset,
+            self.paginator.ordering,
+            chunk_size=getattr(settings, 'USERS_EXPORT_CHUNK_SIZE', 2000),
+        )
+        response = StreamingHttpResponse(chunks, content_type=NDJSONRenderer.media_type)
+        response['Content-Disposition'] = 'attachment; filename="users.ndjson"'
+        return response
+
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(FieldProjectionMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a user. Requires authentication."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
 
+class TokenObtainView(jwt_views.TokenObtainPairView):
+    """Exchange a username and password for an access/refresh token pair."""
+    serializer_class = TokenObtainSerializer
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    """Exchange a refresh token for a new access token."""
+    serializer_class = TokenRefreshSerializer
+
+
+class TokenLogoutView(APIView):
+    """Revoke the access token used for the request and, if given, its refresh token."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        refresh = serializer.validated_data.get('refresh')
+        tokens = []
+        if refresh is not None and refresh.get(jwt_settings.USER_ID_CLAIM) == request.user.pk:
+            tokens.append(refresh)
+        if request.auth is not None and jwt_settings.JTI_CLAIM in request.auth:
+            tokens.append(request.auth)
+        revoke_tokens(tokens)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RegisterView(CreateView):
     """HTML endpoint for creating a user account and collecting email confirmation."""
 
@@ -65,12 +137,11 @@ class RegisterView(CreateView):
             f'Use the code {user.email_confirmation_code} to confirm your email address.\n'
             'Enter it on the confirmation page to finish setting up your account.'
         )
-        send_mail(
+        enqueue_email(
             subject,
             message,
+            user.email,
             getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@example.com'),
-            [user.email],
-            fail_silently=True,
         )
 
 
@@ -94,10 +165,7 @@ class VerifyEmailView(FormView):
             confirmed_user = cast(UserModel, self.request.user)
             if not confirmed_user.email_confirmed:
                 return confirmed_user
-        user_id = self.request.session.get('pending_verification_user_id')
-        if user_id:
-            return cast(Optional[UserModel], User.objects.filter(pk=user_id).first())
-        return None
+        return get_request_user(self.request, self.request.session.get('pending_verification_user_id'))
 
     def form_valid(self, form: EmailVerificationForm) -> HttpResponse:
         code = form.cleaned_data['code']
@@ -146,12 +214,11 @@ class ForgotPasswordView(FormView):
             f'Use the code {user.password_reset_code} to choose a new password.\n'
             'If you did not make this request, you can ignore this email.'
         )
-        send_mail(
+        enqueue_email(
             subject,
             message,
+            user.email,
             getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@example.com'),
-            [user.email],
-            fail_silently=True,
         )
 
 
@@ -171,10 +238,7 @@ class ResetPasswordConfirmView(FormView):
         return super().dispatch(request, *args, **kwargs)
 
     def _get_reset_user(self) -> Optional[UserModel]:
-        user_id = self.request.session.get('password_reset_user_id')
-        if user_id:
-            return cast(Optional[UserModel], User.objects.filter(pk=user_id).first())
-        return None
+        return get_request_user(self.request, self.request.session.get('password_reset_user_id'))
 
     def get_form_kwargs(self) -> dict[str, object]:
         kwargs = super().get_form_kwargs()
@@ -187,6 +251,7 @@ class ResetPasswordConfirmView(FormView):
         self.reset_user.password_reset_code = ''
         self.reset_user.password_reset_requested_at = None
         self.reset_user.save()
+        revoke_user_tokens(self.reset_user.pk)
         self.request.session.pop('password_reset_user_id', None)
         login(self.request, self.reset_user)
         messages.success(self.request, 'Password updated successfully. You are now signed in.')